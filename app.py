@@ -1,16 +1,38 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner_utils.exceptions import RerunException, StopException
+from streamlit.runtime.scriptrunner_utils.script_run_context import get_script_run_ctx
 import sqlite3
 import random
 import time
 import threading
 from datetime import datetime, timedelta
 import hashlib
-from typing import List, Dict, Tuple, Optional
-from contextlib import contextmanager
-from functools import lru_cache
+import secrets
+import functools
+import os
+import heapq
+import math
+import html
+import sys
+from typing import List, Dict, Tuple, Optional, Callable, Sequence
+from contextlib import contextmanager, nullcontext
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, OrderedDict
+from pathlib import Path
 import weakref
+import smtplib
+import json
+import csv
+import io
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from email.message import EmailMessage
+import tracemalloc
+from array import array
 import bcrypt
 
+_RERUN_INICIO = time.perf_counter()
+
 # Configuração da página
 st.set_page_config(
     page_title="Sorteio Eletrônico",
@@ -19,191 +41,336 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS otimizado
-st.markdown("""
-<style>
-    .big-winner {
-        font-size: 3.5rem;
-        font-weight: bold;
-        text-align: center;
-        color: #FF6B35;
-        background: linear-gradient(45deg, #FFE66D, #FF6B35);
-        background-clip: text;
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        padding: 30px;
-        border-radius: 20px;
-        box-shadow: 0 10px 40px rgba(255,107,53,0.3);
-        margin: 30px 0;
-        animation: pulse 2s infinite;
-    }
+# CSS global (minificado) em static/app.css, lido uma vez por processo
+ESTILO_ARQUIVO = Path(__file__).with_name("static") / "app.css"
+
+@st.cache_resource
+def estilo_global() -> str:
+    """Bloco `<style>` do CSS global, idêntico em todo rerun.
     
-    @keyframes pulse {
-        0% { transform: scale(1); }
-        50% { transform: scale(1.02); }
-        100% { transform: scale(1); }
-    }
+    Vai inline de propósito: o Streamlit serve .css estáticos como text/plain
+    com nosniff (um `<link>` não os aplica), e um carregador via iframe
+    dependeria do baseUrlPath e deixaria cabeçalho e rodapé visíveis até o
+    download terminar. Com `minCachedMessageSize` abaixo do tamanho do bloco
+    (.streamlit/config.toml), o navegador guarda a mensagem no seu cache e,
+    do segundo rerun da sessão em diante, o servidor manda só o hash dela.
+    """
+    return f"<style>{ESTILO_ARQUIVO.read_text(encoding='utf-8').strip()}</style>"
+
+def injetar_estilo_global() -> int:
+    """Injeta o CSS global; retorna quantos bytes do estilo seguiram neste rerun (0 se foi só a referência)"""
+    estilo = estilo_global()
+    tamanho = len(estilo.encode())
+    ctx = get_script_run_ctx()
+    # O navegador devolve no pedido de rerun os hashes que tem em cache; sem nenhum
+    # (primeiro rerun da sessão, página recarregada) a mensagem vai inteira
+    em_cache = (ctx is not None and bool(ctx.cached_message_hashes)
+                and tamanho >= st.get_option("global.minCachedMessageSize"))
+    st.markdown(estilo, unsafe_allow_html=True)
+    return 0 if em_cache else tamanho
+
+_BYTES_ESTILO = injetar_estilo_global()
+_CSS_GLOBAL_S = time.perf_counter() - _RERUN_INICIO
+
+def get_config(chave: str, padrao=None):
+    """Lê uma configuração de st.secrets, sem falhar quando não há secrets.toml"""
+    try:
+        return st.secrets.get(chave, padrao)
+    except Exception:
+        return padrao
+
+def get_config_bool(chave: str, padrao: bool = False) -> bool:
+    """Configuração booleana; aceita bool do TOML ou texto ("true", "false", "sim", "não", "1", "0"...)"""
+    valor = get_config(chave, padrao)
+    if isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in ("1", "true", "sim", "yes", "on"):
+        return True
+    if texto in ("0", "false", "não", "nao", "no", "off", ""):
+        return False
+    raise ValueError(f"{chave}: valor booleano inválido {valor!r}")
+
+class StackSampler:
+    """Amostrador de pilha de uma thread, gerando pilhas no formato 'folded'"""
     
-    .winner-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 25px;
-        border-radius: 15px;
-        margin: 15px 0;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.15);
-        color: white;
-        text-align: center;
-    }
+    def __init__(self, thread_id: int, intervalo: float = 0.005):
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
     
-    .podium-card {
-        border-radius: 15px;
-        padding: 25px;
-        text-align: center;
-        font-weight: bold;
-        margin: 15px 0;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.2);
-        color: #333;
-    }
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._loop, name="sorteio-sampler", daemon=True)
+        self._thread.start()
     
-    .student-item {
-        background: rgba(255,255,255,0.1);
-        border-radius: 8px;
-        padding: 12px;
-        margin: 8px 0;
-        border-left: 4px solid #4CAF50;
-    }
+    def parar(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
     
-    .admin-panel {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 25px;
-        border-radius: 15px;
-        margin: 20px 0;
-    }
+    def _loop(self):
+        while not self._stop.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            pilha = []
+            while frame is not None:
+                code = frame.f_code
+                pilha.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            chave = ";".join(reversed(pilha))
+            self.pilhas[chave] = self.pilhas.get(chave, 0) + 1
     
-    .security-panel {
-        background: linear-gradient(135deg, #e74c3c 0%, #c0392b 100%);
-        color: white;
-        padding: 20px;
-        border-radius: 15px;
-        margin: 20px 0;
-        border: 2px solid #a93226;
-    }
+    def folded(self) -> List[str]:
+        return [f"{pilha} {n}" for pilha, n in self.pilhas.items()]
+
+class RenderProfiler:
+    """Perfil opcional de um rerun: tempo por seção da página e por chamada ao motor.
     
-    .status-badge {
-        padding: 8px 16px;
-        border-radius: 20px;
-        display: inline-block;
-        font-weight: bold;
-    }
+    Ativado por `PROFILING = true` em st.secrets. `PROFILING_MODE` pode ser
+    "cprofile" ou "sampler" para amostragem adicional. Ao final do rerun,
+    grava em `PROFILING_DIR` um arquivo .folded (compatível com flamegraph.pl
+    e speedscope) e, no modo cprofile, o .prof correspondente.
+    """
     
-    .status-active { background: #4CAF50; color: white; }
-    .status-inactive { background: #f44336; color: white; }
+    # Guardado na própria thread: o módulo é reexecutado a cada rerun, mas o
+    # sistema em cache_resource mantém os métodos decorados do primeiro
+    ATRIBUTO_THREAD = "_sorteio_perfil_rerun"
     
-    .main {
-        background-color: #ffffff;
-        color: #333333;
-    }
-    .block-container {
-        padding-top: 1rem;
-        padding-bottom: 0rem;
-        max-width: 1200px;
-    }
-    /* Performance - esconde elementos desnecessários */
-    header {display: none !important;}
-    footer {display: none !important;}
-    #MainMenu {display: none !important;}
-    .stDeployButton {display: none !important;}
-    
-    /* Otimizações de renderização */
-    div[data-testid="stAppViewBlockContainer"] {
-        padding-top: 0 !important;
-        padding-bottom: 0 !important;
-    }
-    div[data-testid="stVerticalBlock"] {
-        gap: 0.5rem !important;
-        padding-top: 0 !important;
-        padding-bottom: 0 !important;
-    }
-    .element-container {
-        margin-top: 0.25rem !important;
-        margin-bottom: 0.25rem !important;
-    }
+    def __init__(self, modo: str = "", diretorio: str = "profiles", inicio: Optional[float] = None):
+        self.modo = modo
+        self.diretorio = diretorio
+        self.inicio = inicio if inicio is not None else time.perf_counter()
+        self.duracao = 0.0
+        self.arquivos: List[str] = []
+        # Árvore de seções: caminho (tupla) -> [total_s, chamadas]
+        self._secoes: Dict[Tuple[str, ...], List] = {}
+        self._pilha: List[str] = []
+        self._cprofile = None
+        self._sampler: Optional[StackSampler] = None
     
-    /* Scrolling suave para listas grandes */
-    .student-item {
-        scroll-behavior: smooth;
-    }
+    @classmethod
+    def atual(cls) -> Optional["RenderProfiler"]:
+        return getattr(threading.current_thread(), cls.ATRIBUTO_THREAD, None)
     
-    /* Animações otimizadas */
-    @media (prefers-reduced-motion: reduce) {
-        .big-winner {
-            animation: none;
-        }
-    }
+    @classmethod
+    def iniciar_rerun(cls, modo: str = "", diretorio: str = "profiles",
+                      inicio: Optional[float] = None) -> "RenderProfiler":
+        anterior = cls.atual()
+        if anterior is not None:
+            # Rerun anterior interrompido (ex.: st.rerun): encerra amostradores
+            anterior._parar_amostragem()
+        perfil = cls(modo, diretorio, inicio)
+        setattr(threading.current_thread(), cls.ATRIBUTO_THREAD, perfil)
+        if modo == "cprofile":
+            import cProfile
+            perfil._cprofile = cProfile.Profile()
+            perfil._cprofile.enable()
+        elif modo == "sampler":
+            perfil._sampler = StackSampler(threading.get_ident())
+            perfil._sampler.iniciar()
+        return perfil
     
-    /* Responsividade melhorada */
-    @media (max-width: 768px) {
-        .big-winner {
-            font-size: 2.5rem;
-            padding: 20px;
-        }
-        .podium-card {
-            padding: 15px;
-            margin: 10px 0;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+    def adicionar_secao(self, nome: str, segundos: float):
+        """Registra uma seção medida antes do profiler existir"""
+        entry = self._secoes.setdefault((nome,), [0.0, 0])
+        entry[0] += segundos
+        entry[1] += 1
+    
+    @contextmanager
+    def secao(self, nome: str):
+        self._pilha.append(nome)
+        caminho = tuple(self._pilha)
+        # Criada na entrada para manter a ordem de execução (pai antes dos filhos)
+        entry = self._secoes.setdefault(caminho, [0.0, 0])
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry[0] += time.perf_counter() - inicio
+            entry[1] += 1
+            self._pilha.pop()
+    
+    def _parar_amostragem(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.parar()
+    
+    def finalizar(self):
+        self.duracao = time.perf_counter() - self.inicio
+        self._parar_amostragem()
+        if RenderProfiler.atual() is self:
+            setattr(threading.current_thread(), self.ATRIBUTO_THREAD, None)
+        try:
+            self._gravar()
+        except OSError:
+            pass
+    
+    def breakdown(self) -> List[Dict]:
+        """Linhas (em ordem de árvore) com tempo total e próprio por seção"""
+        filhos: Dict[Tuple[str, ...], float] = {}
+        for caminho, (total, _) in self._secoes.items():
+            if len(caminho) > 1:
+                filhos[caminho[:-1]] = filhos.get(caminho[:-1], 0.0) + total
+        
+        linhas = []
+        for caminho, (total, chamadas) in self._secoes.items():
+            linhas.append({
+                "secao": "  " * (len(caminho) - 1) + caminho[-1],
+                "total_ms": round(total * 1000, 2),
+                "proprio_ms": round(max(total - filhos.get(caminho, 0.0), 0.0) * 1000, 2),
+                "chamadas": chamadas
+            })
+        return linhas
+    
+    def folded(self) -> List[str]:
+        """Seções no formato 'a;b;c <microssegundos próprios>'"""
+        filhos: Dict[Tuple[str, ...], float] = {}
+        for caminho, (total, _) in self._secoes.items():
+            if len(caminho) > 1:
+                filhos[caminho[:-1]] = filhos.get(caminho[:-1], 0.0) + total
+        linhas = []
+        for caminho, (total, _) in self._secoes.items():
+            proprio = max(total - filhos.get(caminho, 0.0), 0.0)
+            linhas.append(f"rerun;{';'.join(caminho)} {int(proprio * 1_000_000)}")
+        return linhas
+    
+    def _gravar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        base = os.path.join(self.diretorio, f"rerun-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}")
+        
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            f.write("\n".join(self.folded()) + "\n")
+        self.arquivos.append(base + ".folded")
+        
+        if self._sampler is not None:
+            with open(base + ".sampled.folded", "w", encoding="utf-8") as f:
+                f.write("\n".join(self._sampler.folded()) + "\n")
+            self.arquivos.append(base + ".sampled.folded")
+        
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(base + ".prof")
+            self.arquivos.append(base + ".prof")
+
+def secao_perfil(nome: str):
+    """Seção do profiler de rerun, ou contexto vazio quando desativado"""
+    perfil = RenderProfiler.atual()
+    return perfil.secao(nome) if perfil is not None else nullcontext()
+
+def cronometrado(nome: str):
+    """Registra a duração do método decorado em self.metrics e no profiler do rerun"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                with secao_perfil(nome):
+                    return func(self, *args, **kwargs)
+            finally:
+                metrics = getattr(self, "metrics", None)
+                if metrics is not None:
+                    metrics.registrar_tempo(nome, time.perf_counter() - inicio)
+        return wrapper
+    return decorator
 
 class SecurityManager:
-    """Gerenciador de segurança para autenticação"""
+    """Gerenciador de segurança para autenticação
     
-    def __init__(self, db_path: str):
-        self.db_path = db_path
+    O custo do bcrypt é calibrado na inicialização para que uma verificação leve
+    cerca de `alvo_ms` nesta máquina; hashes com outro custo são refeitos de
+    forma transparente no próximo login correto. As verificações rodam num pool
+    pequeno de threads (o bcrypt libera o GIL), com fila limitada, e o login é
+    limitado por cliente, o que põe um teto no CPU gasto com tentativas.
+    """
+    
+    CUSTO_MIN = 10
+    CUSTO_MAX = 16
+    
+    def __init__(self, storage: "SorteioStorage", metrics: Optional["MetricsRegistry"] = None,
+                 alvo_ms: Optional[float] = None, max_workers: int = 2, max_pendentes: int = 8):
+        self.storage = storage
+        self.metrics = metrics
+        alvo_ms = float(alvo_ms if alvo_ms is not None else get_config("BCRYPT_ALVO_MS", 250))
+        self.custo = self.calibrar_custo(alvo_ms / 1000.0)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self.limite_login = RateLimiter(capacidade=5, por_minuto=5)
+        self._padrao: Optional[Tuple[str, bool]] = None
+        if self.metrics:
+            self.metrics.definir("seguranca.custo_bcrypt", self.custo)
         self._init_security_db()
     
+    @classmethod
+    def calibrar_custo(cls, alvo_s: float) -> int:
+        """Custo cuja verificação estimada fica mais perto de `alvo_s` (cada +1 dobra o tempo)"""
+        base = 8
+        inicio = time.perf_counter()
+        bcrypt.hashpw(b"calibracao", bcrypt.gensalt(base))
+        decorrido = max(time.perf_counter() - inicio, 1e-6)
+        custo = base + round(math.log2(max(alvo_s / decorrido, 1.0)))
+        return max(cls.CUSTO_MIN, min(cls.CUSTO_MAX, custo))
+    
+    @staticmethod
+    def custo_do_hash(password_hash: str) -> int:
+        """Custo gravado no hash ($2b$<custo>$...)"""
+        return int(password_hash.split("$")[2])
+    
+    def _hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.custo)).decode('utf-8')
+    
     def _init_security_db(self):
-        """Inicializa tabela de segurança"""
-        conn = sqlite3.connect(self.db_path)
+        """Garante que exista uma senha configurada"""
+        if self.storage.get_password_hash() is None:
+            # Cria senha padrão hasheada
+            default_password = "admin123"
+            self.storage.init_password_hash(self._hash(default_password))
+    
+    def _checkpw(self, password: str, stored_hash: str) -> bool:
+        """bcrypt.checkpw no pool limitado; sem vaga na fila, recusa em vez de empilhar"""
+        if not self._vagas.acquire(blocking=False):
+            if self.metrics:
+                self.metrics.incrementar("seguranca.fila_cheia")
+            raise RuntimeError("Servidor ocupado verificando senhas. Tente novamente.")
         try:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS admin_security (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    password_hash TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Verifica se já existe senha configurada
-            cursor = conn.cursor()
-            existing = cursor.execute("SELECT password_hash FROM admin_security WHERE id = 1").fetchone()
-            
-            if not existing:
-                # Cria senha padrão hasheada
-                default_password = "admin123"
-                password_hash = bcrypt.hashpw(default_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-                cursor.execute(
-                    "INSERT INTO admin_security (id, password_hash) VALUES (1, ?)",
-                    (password_hash,)
-                )
-                conn.commit()
+            return self._executor.submit(
+                bcrypt.checkpw, password.encode('utf-8'), stored_hash.encode('utf-8')
+            ).result()
         finally:
-            conn.close()
+            self._vagas.release()
     
+    @cronometrado("seguranca.verify_password")
     def verify_password(self, password: str) -> bool:
         """Verifica senha do administrador"""
-        conn = sqlite3.connect(self.db_path)
+        stored_hash = self.storage.get_password_hash()
+        
+        if stored_hash:
+            return self._checkpw(password, stored_hash)
+        return False
+    
+    def autenticar(self, password: str, cliente: str) -> Tuple[bool, str]:
+        """Login do administrador: limite por cliente, verificação e rehash se o custo mudou"""
+        if not self.limite_login.permitir(cliente):
+            if self.metrics:
+                self.metrics.incrementar("seguranca.tentativas_bloqueadas")
+            espera = self.limite_login.espera(cliente)
+            return False, f"Muitas tentativas. Aguarde {espera:.0f} s."
+        
+        stored_hash = self.storage.get_password_hash()
         try:
-            cursor = conn.cursor()
-            result = cursor.execute("SELECT password_hash FROM admin_security WHERE id = 1").fetchone()
-            
-            if result:
-                stored_hash = result[0].encode('utf-8')
-                return bcrypt.checkpw(password.encode('utf-8'), stored_hash)
-            return False
-        finally:
-            conn.close()
+            valida = bool(stored_hash) and self._checkpw(password, stored_hash)
+        except RuntimeError as e:
+            return False, str(e)
+        if not valida:
+            return False, "Senha incorreta!"
+        
+        if self.custo_do_hash(stored_hash) != self.custo:
+            self.storage.set_password_hash(self._hash(password))
+            if self.metrics:
+                self.metrics.incrementar("seguranca.rehash")
+        return True, "Login realizado!"
     
     def change_password(self, current_password: str, new_password: str) -> Tuple[bool, str]:
         """Altera senha do administrador"""
@@ -211,84 +378,174 @@ class SecurityManager:
         if len(new_password) < 6:
             return False, "Nova senha deve ter pelo menos 6 caracteres"
         
-        if not self.verify_password(current_password):
-            return False, "Senha atual incorreta"
+        try:
+            if not self.verify_password(current_password):
+                return False, "Senha atual incorreta"
+        except RuntimeError as e:
+            return False, str(e)
         
         if current_password == new_password:
             return False, "A nova senha deve ser diferente da atual"
         
         # Gerar novo hash
-        new_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        new_hash = self._hash(new_password)
         
-        conn = sqlite3.connect(self.db_path)
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE admin_security SET password_hash = ?, updated_at = CURRENT_TIMESTAMP WHERE id = 1",
-                (new_hash,)
-            )
-            conn.commit()
+            self.storage.set_password_hash(new_hash)
             return True, "Senha alterada com sucesso!"
         except Exception as e:
             return False, f"Erro ao alterar senha: {str(e)}"
-        finally:
-            conn.close()
     
     def is_default_password(self) -> bool:
-        """Verifica se ainda está usando a senha padrão"""
-        return self.verify_password("admin123")
+        """Verifica se ainda está usando a senha padrão (um bcrypt por hash, não por rerun)
+        
+        Com a fila de verificações cheia responde False sem guardar o resultado;
+        o próximo rerun tenta de novo.
+        """
+        stored_hash = self.storage.get_password_hash()
+        padrao = self._padrao
+        if padrao is None or padrao[0] != stored_hash:
+            try:
+                padrao = (stored_hash, self.verify_password("admin123"))
+            except RuntimeError:
+                return False
+            self._padrao = padrao
+        return padrao[1]
+
+class _ConexaoContada(sqlite3.Connection):
+    """Conexão que acompanha o cache de statements do módulo sqlite3.
+    
+    O sqlite3 mantém por conexão um LRU de `cached_statements` statements
+    compilados, indexado pelo texto SQL. Esta classe reproduz o mesmo LRU só
+    com os textos para contar acertos (statement reaproveitado) e falhas
+    (texto novo ou despejado, que o SQLite precisa compilar de novo).
+    """
+    
+    def __init__(self, *args, cached_statements: int = 128, **kwargs):
+        super().__init__(*args, cached_statements=cached_statements, **kwargs)
+        self.capacidade_statements = cached_statements
+        self._statements: "OrderedDict[str, None]" = OrderedDict()
+        self.acertos = 0
+        self.falhas = 0
+    
+    def execute(self, sql, parametros=()):
+        if sql in self._statements:
+            self._statements.move_to_end(sql)
+            self.acertos += 1
+        else:
+            self._statements[sql] = None
+            if len(self._statements) > self.capacidade_statements:
+                self._statements.popitem(last=False)
+            self.falhas += 1
+        return super().execute(sql, parametros)
 
 class ConnectionPool:
-    """Pool de conexões SQLite otimizado"""
+    """Pool de conexões SQLite otimizado
     
-    def __init__(self, db_path: str, max_connections: int = 10):
+    Com `somente_leitura`, as conexões abrem com `mode=ro` e `PRAGMA query_only`
+    e servem apenas consultas; no WAL elas leem em paralelo com o escritor. Quando
+    o pool está cheio, o pedido aguarda uma conexão livre em vez de compartilhar
+    uma conexão em uso.
+    """
+    
+    def __init__(self, db_path: str, max_connections: int = 10, somente_leitura: bool = False, 
+                 timeout: float = 30.0):
         self.db_path = db_path
         self.max_connections = max_connections
+        self.somente_leitura = somente_leitura
+        self.timeout = timeout
         self._connections = []
         self._lock = threading.Lock()
+        self._livre = threading.Condition(self._lock)
         self._in_use = set()
-        
+        self._local = threading.local()  # conexões deste pool em uso pela thread atual
+    
+    @staticmethod
+    def tamanho_cache_statements() -> int:
+        """Todas as consultas do registro SQL, com folga para PRAGMAs e BEGIN"""
+        return len(SQL) + 16
+    
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre e configura uma nova conexão do pool"""
+        if self.somente_leitura:
+            conn = sqlite3.connect(
+                f"{Path(self.db_path).absolute().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+                timeout=self.timeout,
+                factory=_ConexaoContada,
+                cached_statements=self.tamanho_cache_statements()
+            )
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                timeout=self.timeout,
+                factory=_ConexaoContada,
+                cached_statements=self.tamanho_cache_statements()
+            )
+            # auto_vacuum só tem efeito em bancos novos (antes do WAL e das tabelas)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # Configurar WAL mode para melhor concorrência
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=10000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
     @contextmanager
     def get_connection(self):
         """Context manager para conexões reutilizáveis"""
         conn = None
         try:
-            with self._lock:
-                # Procurar conexão disponível
-                for c in self._connections:
-                    if c not in self._in_use:
-                        conn = c
-                        self._in_use.add(conn)
-                        break
-                
-                # Criar nova se necessário
-                if conn is None and len(self._connections) < self.max_connections:
-                    conn = sqlite3.connect(
-                        self.db_path,
-                        check_same_thread=False,
-                        timeout=30.0
-                    )
-                    # Configurar WAL mode para melhor concorrência
-                    conn.execute("PRAGMA journal_mode=WAL")
-                    conn.execute("PRAGMA synchronous=NORMAL")
-                    conn.execute("PRAGMA cache_size=10000")
-                    conn.execute("PRAGMA temp_store=MEMORY")
+            with self._livre:
+                limite = time.monotonic() + self.timeout
+                while conn is None:
+                    # Procurar conexão disponível
+                    for c in self._connections:
+                        if c not in self._in_use:
+                            conn = c
+                            break
+                    
+                    # Criar nova se necessário
+                    if conn is None and len(self._connections) < self.max_connections:
+                        conn = self._conectar()
+                        self._connections.append(conn)
                     
-                    self._connections.append(conn)
-                    self._in_use.add(conn)
+                    # Pool cheio: aguardar devolução
+                    if conn is None:
+                        if getattr(self._local, "em_uso", 0):
+                            # A própria thread segura uma conexão: esperar seria um deadlock até o timeout
+                            raise RuntimeError(f"Uso reentrante do pool de {self.db_path} (limite {self.max_connections})")
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            raise sqlite3.OperationalError("Tempo esgotado aguardando conexão do pool")
+                        self._livre.wait(restante)
                 
-                # Usar conexão existente se pool cheio
-                if conn is None:
-                    conn = self._connections[0]
-                    if conn not in self._in_use:
-                        self._in_use.add(conn)
+                self._in_use.add(conn)
+            self._local.em_uso = getattr(self._local, "em_uso", 0) + 1
             
             yield conn
             
         finally:
             if conn:
-                with self._lock:
+                self._local.em_uso -= 1
+                # Não devolver ao pool uma transação esquecida aberta
+                if conn.in_transaction:
+                    conn.rollback()
+                with self._livre:
                     self._in_use.discard(conn)
+                    self._livre.notify()
+    
+    def estatisticas_statements(self) -> Dict[str, int]:
+        """Acertos e falhas do cache de statements somados entre as conexões abertas"""
+        with self._lock:
+            conexoes = list(self._connections)
+        return {
+            "acertos": sum(conn.acertos for conn in conexoes),
+            "falhas": sum(conn.falhas for conn in conexoes)
+        }
     
     def close_all(self):
         """Fecha todas as conexões"""
@@ -302,30 +559,36 @@ class ConnectionPool:
             self._in_use.clear()
 
 class CacheManager:
-    """Gerenciador de cache com TTL"""
+    """Gerenciador de cache com TTL e validação por geração dos dados"""
     
     def __init__(self):
         self._cache = {}
         self._timestamps = {}
+        self._geracoes = {}
         self._lock = threading.Lock()
     
-    def get(self, key: str, ttl_seconds: int = 300) -> Optional[any]:
-        """Recupera item do cache se válido"""
+    def get(self, key: str, ttl_seconds: int = 300, geracao: Optional[int] = None) -> Optional[any]:
+        """Recupera item do cache se válido (TTL e, se informada, mesma geração)"""
         with self._lock:
             if key in self._cache:
-                if datetime.now() - self._timestamps[key] < timedelta(seconds=ttl_seconds):
+                expirado = datetime.now() - self._timestamps[key] >= timedelta(seconds=ttl_seconds)
+                obsoleto = geracao is not None and self._geracoes.get(key) != geracao
+                if not expirado and not obsoleto:
                     return self._cache[key]
                 else:
-                    # Expirou
+                    # Expirou ou os dados mudaram em outro processo
                     del self._cache[key]
                     del self._timestamps[key]
+                    self._geracoes.pop(key, None)
             return None
     
-    def set(self, key: str, value: any):
-        """Define item no cache"""
+    def set(self, key: str, value: any, geracao: Optional[int] = None):
+        """Define item no cache, opcionalmente marcado com a geração dos dados"""
         with self._lock:
             self._cache[key] = value
             self._timestamps[key] = datetime.now()
+            if geracao is not None:
+                self._geracoes[key] = geracao
     
     def invalidate(self, pattern: str = None):
         """Invalida cache por padrão"""
@@ -335,9 +598,11 @@ class CacheManager:
                 for key in keys_to_remove:
                     del self._cache[key]
                     del self._timestamps[key]
+                    self._geracoes.pop(key, None)
             else:
                 self._cache.clear()
                 self._timestamps.clear()
+                self._geracoes.clear()
     
     def cleanup_expired(self, max_age_seconds: int = 3600):
         """Limpa entradas expiradas"""
@@ -350,59 +615,2775 @@ class CacheManager:
             for key in expired:
                 del self._cache[key]
                 del self._timestamps[key]
+                self._geracoes.pop(key, None)
 
-class OptimizedSorteioSystem:
-    """Sistema otimizado de sorteio com pooling e cache"""
+class MetricsRegistry:
+    """Métricas simples em memória: contadores, tempos e valores instantâneos"""
     
-    def __init__(self, db_path="sorteio.db"):
-        self.db_path = db_path
-        self.pool = ConnectionPool(db_path)
-        self.cache = CacheManager()
-        self.security = SecurityManager(db_path)
-        self._prepared_statements = {}
-        self._last_action_time = {}
-        self._debounce_delay = 1.0  # segundos
-        self._init_db()
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, int] = {}
+        self._tempos: Dict[str, Dict[str, float]] = {}
+        self._amostras: Dict[str, deque] = {}
+        self._valores: Dict[str, float] = {}
     
-    def _init_db(self):
-        """Inicializa banco com índices otimizados"""
-        with self.pool.get_connection() as conn:
-            conn.executescript("""
-                CREATE TABLE IF NOT EXISTS alunos (
-                    id INTEGER PRIMARY KEY,
-                    nome TEXT NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    numero_sorte INTEGER UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE IF NOT EXISTS sorteios (
-                    id INTEGER PRIMARY KEY,
-                    sessao_id TEXT NOT NULL,
-                    aluno_id INTEGER,
-                    numero_sorte INTEGER,
-                    posicao INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (aluno_id) REFERENCES alunos (id)
-                );
-                
-                CREATE TABLE IF NOT EXISTS sessao (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    ativa BOOLEAN DEFAULT FALSE,
-                    sessao_id TEXT,
-                    sorteios_count INTEGER DEFAULT 0,
-                    created_at TIMESTAMP,
-                    ended_at TIMESTAMP
-                );
-                
-                -- Índices para performance
-                CREATE INDEX IF NOT EXISTS idx_alunos_email ON alunos(email);
-                CREATE INDEX IF NOT EXISTS idx_alunos_numero ON alunos(numero_sorte);
-                CREATE INDEX IF NOT EXISTS idx_sorteios_sessao ON sorteios(sessao_id);
-                CREATE INDEX IF NOT EXISTS idx_sorteios_posicao ON sorteios(sessao_id, posicao);
-                
-                INSERT OR IGNORE INTO sessao (id) VALUES (1);
-            """)
+    def incrementar(self, nome: str, n: int = 1):
+        with self._lock:
+            self._contadores[nome] = self._contadores.get(nome, 0) + n
+    
+    def definir(self, nome: str, valor: float):
+        with self._lock:
+            self._valores[nome] = valor
+    
+    def registrar_tempo(self, nome: str, segundos: float):
+        with self._lock:
+            t = self._tempos.get(nome)
+            if t is None:
+                t = self._tempos[nome] = {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+            t["count"] += 1
+            t["total"] += segundos
+            t["last"] = segundos
+            if segundos > t["max"]:
+                t["max"] = segundos
+            amostras = self._amostras.get(nome)
+            if amostras is None:
+                amostras = self._amostras[nome] = deque(maxlen=512)
+            amostras.append((time.time(), segundos))
+    
+    def amostras(self, nome: str, desde: float = 0.0, ate: Optional[float] = None) -> List[float]:
+        """Durações recentes registradas no intervalo [desde, ate]"""
+        ate = ate if ate is not None else time.time()
+        with self._lock:
+            return [d for t, d in self._amostras.get(nome, ()) if desde <= t <= ate]
+    
+    @contextmanager
+    def cronometrar(self, nome: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_tempo(nome, time.perf_counter() - inicio)
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "contadores": dict(self._contadores),
+                "tempos": {k: dict(v) for k, v in self._tempos.items()},
+                "valores": dict(self._valores)
+            }
+    
+    def exportar(self, prefixo: str = "sorteio") -> str:
+        """Métricas no formato texto do Prometheus"""
+        dados = self.snapshot()
+        nome = lambda chave: f"{prefixo}_" + "".join(c if c.isalnum() else "_" for c in chave)
+        linhas = []
+        for chave, valor in sorted(dados["contadores"].items()):
+            linhas += [f"# TYPE {nome(chave)}_total counter", f"{nome(chave)}_total {valor}"]
+        for chave, valor in sorted(dados["valores"].items()):
+            linhas += [f"# TYPE {nome(chave)} gauge", f"{nome(chave)} {valor}"]
+        for chave, tempo in sorted(dados["tempos"].items()):
+            linhas += [
+                f"# TYPE {nome(chave)}_seconds summary",
+                f"{nome(chave)}_seconds_count {tempo['count']}",
+                f"{nome(chave)}_seconds_sum {tempo['total']:.6f}",
+                f"# TYPE {nome(chave)}_seconds_max gauge",
+                f"{nome(chave)}_seconds_max {tempo['max']:.6f}"
+            ]
+        return "\n".join(linhas) + "\n"
+
+class RenderCache:
+    """Fragmentos HTML renderizados uma única vez e servidos a todos os espectadores
+    
+    A chave é (tipo, sessão) mais a versão dos dados; o fragmento é refeito só
+    quando a versão muda, e renderizações concorrentes da mesma chave esperam
+    a primeira terminar em vez de repetir o trabalho.
+    """
+    
+    def __init__(self, cache: CacheManager, metrics: Optional[MetricsRegistry] = None, ttl_seconds: int = 3600):
+        self.cache = cache
+        self.metrics = metrics
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+    
+    def obter(self, tipo: str, sessao_id: str, versao: int, renderizar: Callable[[], str]) -> str:
+        """Retorna o HTML em cache ou chama `renderizar` uma vez para esta versão"""
+        key = f"html_{tipo}_{sessao_id}"
+        fragmento = self.cache.get(key, ttl_seconds=self.ttl_seconds, geracao=versao)
+        if fragmento is None:
+            with self._lock:
+                fragmento = self.cache.get(key, ttl_seconds=self.ttl_seconds, geracao=versao)
+                if fragmento is None:
+                    fragmento = renderizar()
+                    self.cache.set(key, fragmento, geracao=versao)
+                    if self.metrics:
+                        self.metrics.incrementar("render.misses")
+                    return fragmento
+        if self.metrics:
+            self.metrics.incrementar("render.hits")
+        return fragmento
+
+class RateLimiter:
+    """Token bucket por cliente: rajada de `capacidade` e reposição contínua
+    
+    Guarda no máximo `max_clientes` baldes; os menos recentes são descartados
+    (um cliente descartado volta com o balde cheio, o que só afrouxa o limite
+    para quem está inativo há mais tempo).
+    """
+    
+    def __init__(self, capacidade: int = 5, por_minuto: float = 5, max_clientes: int = 4096):
+        self.capacidade = capacidade
+        self.reposicao_s = por_minuto / 60.0
+        self.max_clientes = max_clientes
+        self._baldes: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def permitir(self, cliente: str, now: Optional[float] = None) -> bool:
+        """Consome uma ficha do cliente; False se o balde está vazio"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            fichas, ultimo = self._baldes.pop(cliente, (float(self.capacidade), now))
+            fichas = min(self.capacidade, fichas + (now - ultimo) * self.reposicao_s)
+            permitido = fichas >= 1
+            if permitido:
+                fichas -= 1
+            self._baldes[cliente] = (fichas, now)
+            while len(self._baldes) > self.max_clientes:
+                self._baldes.popitem(last=False)
+            return permitido
+    
+    def espera(self, cliente: str) -> float:
+        """Segundos até o cliente ter uma ficha disponível"""
+        with self._lock:
+            fichas, ultimo = self._baldes.get(cliente, (float(self.capacidade), time.monotonic()))
+        fichas = min(self.capacidade, fichas + (time.monotonic() - ultimo) * self.reposicao_s)
+        return max(0.0, (1 - fichas) / self.reposicao_s)
+
+class MemoryAccountant:
+    """Contabilidade de memória das estruturas em processo, com orçamento global
+    
+    Cada estrutura é registrada com uma função de medida e, opcionalmente, uma
+    de liberação. `verificar()` mede tudo, publica em `memoria.*` nas métricas
+    e, se o total passar do orçamento, libera as estruturas em ordem de
+    prioridade (menor primeiro) até voltar ao limite. Opcionalmente guarda os
+    `top_n` maiores pontos de alocação do tracemalloc.
+    """
+    
+    def __init__(self, metrics: Optional[MetricsRegistry] = None, orcamento_bytes: int = 256 * 1024 * 1024,
+                 tracemalloc_top: int = 0):
+        self.metrics = metrics
+        self.orcamento_bytes = orcamento_bytes
+        self.tracemalloc_top = tracemalloc_top
+        self.sessoes: "weakref.WeakSet[ManagedStateStore]" = weakref.WeakSet()
+        self.ultima_medicao: Dict[str, int] = {}
+        self.top_alocacoes: List[Dict] = []
+        self._estruturas: Dict[str, Tuple[Callable[[], int], Optional[Callable[[], None]], int]] = {}
+        self._lock = threading.Lock()
+        if tracemalloc_top and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+    
+    @staticmethod
+    def tamanho_profundo(obj, vistos: Optional[set] = None) -> int:
+        """Tamanho aproximado em bytes de `obj` e de tudo que ele referencia (sem contar duas vezes)"""
+        vistos = set() if vistos is None else vistos
+        pendentes = [obj]
+        total = 0
+        while pendentes:
+            atual = pendentes.pop()
+            if id(atual) in vistos or isinstance(atual, (type, threading.Thread)) or callable(atual):
+                continue
+            vistos.add(id(atual))
+            total += sys.getsizeof(atual)
+            if isinstance(atual, dict):
+                pendentes.extend(atual.keys())
+                pendentes.extend(atual.values())
+            elif isinstance(atual, (list, tuple, set, frozenset, deque)):
+                pendentes.extend(atual)
+            elif hasattr(atual, "__dict__"):
+                pendentes.append(vars(atual))
+            elif hasattr(atual, "__slots__"):
+                pendentes.extend(getattr(atual, s) for s in atual.__slots__ if hasattr(atual, s))
+        return total
+    
+    def registrar(self, nome: str, medir: Callable[[], int], liberar: Optional[Callable[[], None]] = None,
+                  prioridade: int = 100):
+        """Registra uma estrutura; `liberar` é chamada quando o orçamento estoura"""
+        with self._lock:
+            self._estruturas[nome] = (medir, liberar, prioridade)
+    
+    def medir(self) -> Dict[str, int]:
+        """Tamanho atual de cada estrutura registrada e das sessões do navegador"""
+        with self._lock:
+            estruturas = list(self._estruturas.items())
+        medicao = {nome: medir() for nome, (medir, _, _) in estruturas}
+        medicao["sessoes_navegador"] = sum(store.total_bytes for store in list(self.sessoes))
+        return medicao
+    
+    def _liberar_sessoes(self):
+        # Cada sessão aplica o limite menor no seu próprio rerun (sem disputar o heap dela)
+        for store in list(self.sessoes):
+            store.max_bytes = max(16 * 1024, store.max_bytes // 2)
+    
+    def verificar(self) -> Dict[str, int]:
+        """Mede, publica as métricas e aplica o orçamento; executada pelo agendador"""
+        medicao = self.medir()
+        total = sum(medicao.values())
+        
+        if total > self.orcamento_bytes:
+            with self._lock:
+                liberaveis = sorted(
+                    ((prioridade, nome, liberar) for nome, (_, liberar, prioridade) in self._estruturas.items() if liberar),
+                    key=lambda item: item[0]
+                )
+            liberaveis.append((float("inf"), "sessoes_navegador", self._liberar_sessoes))
+            for _, nome, liberar in liberaveis:
+                if total <= self.orcamento_bytes:
+                    break
+                liberar()
+                if self.metrics:
+                    self.metrics.incrementar("memoria.despejos")
+                medido = self._estruturas[nome][0]() if nome in self._estruturas else medicao[nome]
+                total -= medicao[nome] - medido
+                medicao[nome] = medido
+        
+        self.ultima_medicao = medicao
+        if self.metrics:
+            for nome, tamanho in medicao.items():
+                self.metrics.definir(f"memoria.{nome}_bytes", tamanho)
+            self.metrics.definir("memoria.total_bytes", total)
+            self.metrics.definir("memoria.orcamento_bytes", self.orcamento_bytes)
+        
+        if self.tracemalloc_top and tracemalloc.is_tracing():
+            estatisticas = tracemalloc.take_snapshot().statistics("lineno")[:self.tracemalloc_top]
+            self.top_alocacoes = [
+                {"local": str(e.traceback[0]), "kb": round(e.size / 1024, 1), "blocos": e.count}
+                for e in estatisticas
+            ]
+        return medicao
+
+class ActivityMonitor:
+    """Mede a taxa de requisições para detectar períodos de calmaria"""
+    
+    def __init__(self, janela_segundos: float = 10.0, limite_calmaria: int = 5):
+        self.janela_segundos = janela_segundos
+        self.limite_calmaria = limite_calmaria
+        self._eventos = deque()
+        self._lock = threading.Lock()
+        self._operacoes_criticas = 0
+    
+    def registrar(self):
+        now = time.time()
+        with self._lock:
+            self._eventos.append(now)
+            self._descartar_antigos(now)
+    
+    def _descartar_antigos(self, now: float):
+        limite = now - self.janela_segundos
+        while self._eventos and self._eventos[0] < limite:
+            self._eventos.popleft()
+    
+    @contextmanager
+    def operacao_critica(self):
+        """Marca um trecho (ex.: sorteio) durante o qual a manutenção não roda"""
+        with self._lock:
+            self._operacoes_criticas += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._operacoes_criticas -= 1
+    
+    def taxa(self) -> float:
+        """Requisições por segundo na janela"""
+        with self._lock:
+            self._descartar_antigos(time.time())
+            return len(self._eventos) / self.janela_segundos
+    
+    def em_calmaria(self) -> bool:
+        with self._lock:
+            self._descartar_antigos(time.time())
+            return self._operacoes_criticas == 0 and len(self._eventos) <= self.limite_calmaria
+
+class MaintenanceScheduler:
+    """Thread única de manutenção com tarefas nomeadas.
+    
+    Cada tarefa tem um intervalo; tarefas marcadas com `exige_calmaria`
+    esperam um período calmo, mas rodam mesmo assim após `max_adiamento`
+    segundos de atraso para não ficarem paradas em eventos longos.
+    """
+    
+    def __init__(self, atividade: ActivityMonitor, metrics: MetricsRegistry, tick_segundos: float = 1.0):
+        self.atividade = atividade
+        self.metrics = metrics
+        self.tick_segundos = tick_segundos
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def adicionar(self, nome: str, funcao, intervalo: float, exige_calmaria: bool = True,
+                  max_adiamento: float = 600.0):
+        with self._lock:
+            self._jobs[nome] = {
+                "funcao": funcao,
+                "intervalo": intervalo,
+                "exige_calmaria": exige_calmaria,
+                "max_adiamento": max_adiamento,
+                "proxima": time.time() + intervalo,
+                "execucoes": 0,
+                "erros": 0,
+                "ultimo_erro": None,
+                "ultima_duracao": 0.0,
+                "ultima_execucao": None
+            }
+    
+    def iniciar(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sorteio-manutencao", daemon=True)
+        self._thread.start()
+    
+    def parar(self):
+        self._stop.set()
+    
+    def _loop(self):
+        while not self._stop.wait(self.tick_segundos):
+            self.executar_pendentes()
+    
+    def executar_pendentes(self, now: Optional[float] = None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            pendentes = [(nome, job) for nome, job in self._jobs.items() if job["proxima"] <= now]
+        
+        for nome, job in pendentes:
+            atrasado = now - job["proxima"] >= job["max_adiamento"]
+            if job["exige_calmaria"] and not atrasado and not self.atividade.em_calmaria():
+                continue
+            self.executar(nome)
+    
+    def executar(self, nome: str):
+        """Executa uma tarefa agora (também usado sob demanda)"""
+        job = self._jobs[nome]
+        inicio = time.perf_counter()
+        try:
+            job["funcao"]()
+        except Exception as e:
+            job["erros"] += 1
+            job["ultimo_erro"] = str(e)
+            self.metrics.incrementar(f"manutencao.{nome}.erros")
+        finally:
+            duracao = time.perf_counter() - inicio
+            job["execucoes"] += 1
+            job["ultima_duracao"] = duracao
+            job["ultima_execucao"] = datetime.now()
+            job["proxima"] = time.time() + job["intervalo"]
+            self.metrics.registrar_tempo(f"manutencao.{nome}", duracao)
+    
+    def status(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "tarefa": nome,
+                    "intervalo_s": job["intervalo"],
+                    "execucoes": job["execucoes"],
+                    "erros": job["erros"],
+                    "ultima_duracao_ms": round(job["ultima_duracao"] * 1000, 2),
+                    "ultima_execucao": job["ultima_execucao"].strftime("%H:%M:%S") if job["ultima_execucao"] else "-",
+                    "ultimo_erro": job["ultimo_erro"] or ""
+                }
+                for nome, job in self._jobs.items()
+            ]
+
+class _BackupReiniciado(Exception):
+    """Cópia paginada reiniciada vezes demais por escritas concorrentes"""
+
+class BackupManager:
+    """Backups a quente do SQLite via API de backup, em passos com pausa.
+    
+    A cópia roda em thread própria e em blocos de `paginas_por_passo`
+    páginas, liberando o banco entre os passos para que cadastros e
+    sorteios concorrentes não fiquem bloqueados.
+    
+    Cada backup é um conjunto com um arquivo por banco de `db_paths`: o
+    principal (`sorteio-<data>.db`) e, com shards, `sorteio-<data>.shard<i>.db`.
+    O principal é copiado primeiro: os shards, copiados depois, já contêm todo
+    participante referenciado pelos sorteios da cópia. O principal só recebe o
+    nome final depois dos shards, então sua presença marca um conjunto completo.
+    """
+    
+    OPERACOES_MONITORADAS = ("motor.cadastrar_aluno", "motor.sortear")
+    MAX_REINICIOS = 3
+    
+    def __init__(self, db_paths: Sequence[str], metrics: MetricsRegistry, diretorio: Optional[str] = None,
+                 manter: int = 5, paginas_por_passo: int = 256, pausa: float = 0.01):
+        self.db_paths = list(db_paths)
+        db_path = self.db_paths[0]
+        self.metrics = metrics
+        self.diretorio = diretorio or os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups")
+        self.manter = manter
+        self.paginas_por_passo = paginas_por_passo
+        self.pausa = pausa
+        self.historico = deque(maxlen=20)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def em_andamento(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def iniciar_assincrono(self) -> bool:
+        """Dispara um backup em background; False se já houver um em andamento"""
+        with self._lock:
+            if self.em_andamento:
+                return False
+            self._thread = threading.Thread(target=self._executar_seguro, name="sorteio-backup", daemon=True)
+            self._thread.start()
+            return True
+    
+    def executar_agendado(self):
+        """Backup síncrono na thread do agendador, que assim cronometra a cópia inteira"""
+        with self._lock:
+            if self.em_andamento:
+                return
+            self._thread = threading.current_thread()
+        try:
+            self._executar_seguro()
+        finally:
+            with self._lock:
+                self._thread = None
+    
+    def _executar_seguro(self):
+        try:
+            self.executar()
+        except Exception as e:
+            self.metrics.incrementar("backup.erros")
+            self.historico.appendleft({"arquivo": None, "erro": str(e), "inicio": datetime.now()})
+    
+    def executar(self) -> Dict:
+        """Executa um backup completo (todos os bancos) e aplica a rotação"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        prefixo = f"sorteio-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        base = os.path.splitext(os.path.basename(self.db_paths[0]))[0]
+        destinos = []
+        for caminho in self.db_paths:
+            # sorteio.shard0.db -> sorteio-<data>.shard0.db
+            nome_origem = os.path.splitext(os.path.basename(caminho))[0]
+            sufixo = nome_origem[len(base):] if nome_origem.startswith(base) else f".{nome_origem}"
+            destinos.append(os.path.join(self.diretorio, f"{prefixo}{sufixo}.db"))
+        temporarios = [destino + ".partial" for destino in destinos]
+        totais = {"passos": 0, "reinicios": 0}
+        
+        inicio_wall = time.time()
+        inicio = time.perf_counter()
+        try:
+            for caminho, temporario in zip(self.db_paths, temporarios):
+                passos, reinicios = self._copiar(caminho, temporario)
+                totais["passos"] += passos
+                totais["reinicios"] += reinicios
+            duracao = time.perf_counter() - inicio
+            fim_wall = time.time()
+            
+            # Renomeação atômica, shards antes do principal: nunca existe um conjunto
+            # "pela metade" com o nome final do principal
+            for temporario, destino in reversed(list(zip(temporarios, destinos))):
+                os.replace(temporario, destino)
+        finally:
+            # Qualquer falha no meio (disco cheio, banco travado) não deixa .partial para trás
+            for temporario in temporarios:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+        self._rotacionar()
+        
+        relatorio = {
+            "arquivo": os.path.basename(destinos[0]),
+            "arquivos": len(destinos),
+            "inicio": datetime.fromtimestamp(inicio_wall),
+            "duracao_s": round(duracao, 3),
+            "passos": totais["passos"],
+            "reinicios": totais["reinicios"],
+            "tamanho_kb": round(sum(os.path.getsize(destino) for destino in destinos) / 1024, 1),
+            "impacto": self._medir_impacto(inicio_wall, fim_wall)
+        }
+        self.metrics.registrar_tempo("backup", duracao)
+        self.historico.appendleft(relatorio)
+        return relatorio
+    
+    def _copiar(self, origem: str, temporario: str) -> Tuple[int, int]:
+        """Copia um banco em passos para `temporario`; retorna (passos, reinícios)"""
+        passos = 0
+        reinicios = 0
+        ultimo_restante = None
+        
+        def progresso(status, restantes, total):
+            nonlocal passos, reinicios, ultimo_restante
+            passos += 1
+            # A API reinicia a cópia quando outra conexão escreve no meio
+            if ultimo_restante is not None and restantes > ultimo_restante:
+                reinicios += 1
+                if reinicios > self.MAX_REINICIOS:
+                    raise _BackupReiniciado()
+            ultimo_restante = restantes
+            # Pausa entre passos: limita I/O e deixa escritores avançarem
+            time.sleep(self.pausa)
+        
+        src = sqlite3.connect(origem, timeout=30.0)
+        try:
+            dst = sqlite3.connect(temporario)
+            try:
+                src.backup(dst, pages=self.paginas_por_passo, progress=progresso)
+            except _BackupReiniciado:
+                # Escritas contínuas: copia em um único passo. Em WAL a leitura
+                # do snapshot não bloqueia os escritores.
+                dst.close()
+                os.remove(temporario)
+                dst = sqlite3.connect(temporario)
+                src.backup(dst, pages=-1)
+                self.metrics.incrementar("backup.passo_unico")
+            finally:
+                dst.close()
+        finally:
+            src.close()
+        return passos, reinicios
+    
+    def _medir_impacto(self, inicio: float, fim: float) -> Dict[str, Dict]:
+        """Compara a latência das operações durante o backup com a anterior a ele"""
+        impacto = {}
+        for operacao in self.OPERACOES_MONITORADAS:
+            durante = self.metrics.amostras(operacao, inicio, fim)
+            antes = self.metrics.amostras(operacao, 0, inicio)
+            impacto[operacao] = {
+                "durante_ms": round(1000 * sum(durante) / len(durante), 2) if durante else None,
+                "antes_ms": round(1000 * sum(antes) / len(antes), 2) if antes else None,
+                "amostras_durante": len(durante)
+            }
+        return impacto
+    
+    def _rotacionar(self):
+        # Conjuntos pelo prefixo sorteio-<data>: o principal e os shards saem juntos
+        arquivos = [f for f in os.listdir(self.diretorio) if f.startswith("sorteio-") and f.endswith(".db")]
+        conjuntos = sorted({f.split(".", 1)[0] for f in arquivos})
+        antigos = set(conjuntos[:-self.manter] if self.manter > 0 else [])
+        for arquivo in arquivos:
+            if arquivo.split(".", 1)[0] in antigos:
+                try:
+                    os.remove(os.path.join(self.diretorio, arquivo))
+                except OSError:
+                    pass
+    
+    def listar(self) -> List[str]:
+        """Backups completos (arquivo principal de cada conjunto), do mais recente ao mais antigo"""
+        if not os.path.isdir(self.diretorio):
+            return []
+        return sorted((f for f in os.listdir(self.diretorio) if f.endswith(".db") and f.count(".") == 1), reverse=True)
+
+class RetentionManager:
+    """Política de retenção: tira dados antigos das tabelas quentes.
+    
+    Sorteios de sessões encerradas há mais de `dias` e participantes
+    cadastrados antes disso (sem sorteio vivo) vão para as tabelas de arquivo
+    em transações pequenas, com pausa entre elas para não segurar o escritor.
+    Histórico, verificação e exportação continuam lendo o arquivo.
+    """
+    
+    def __init__(self, storage: "SorteioStorage", metrics: MetricsRegistry, dias: float,
+                 lote_sessoes: int = 50, lote_alunos: int = 500, pausa: float = 0.05):
+        self.storage = storage
+        self.metrics = metrics
+        self.dias = dias
+        self.lote_sessoes = lote_sessoes
+        self.lote_alunos = lote_alunos
+        self.pausa = pausa
+        self.historico = deque(maxlen=20)
+    
+    @classmethod
+    def from_config(cls, storage: "SorteioStorage", metrics: MetricsRegistry) -> Optional["RetentionManager"]:
+        """Política de RETENCAO_DIAS em st.secrets; None (desativada) se ausente ou zero"""
+        dias = float(get_config("RETENCAO_DIAS", 0))
+        if dias <= 0:
+            return None
+        return cls(storage, metrics, dias, lote_alunos=int(get_config("RETENCAO_LOTE", 500)))
+    
+    def corte(self, agora: Optional[float] = None) -> str:
+        """Instante limite no formato do CURRENT_TIMESTAMP do SQLite (UTC)"""
+        agora = time.time() if agora is None else agora
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(agora - self.dias * 86400))
+    
+    def executar(self, agora: Optional[float] = None) -> Dict:
+        corte = self.corte(agora)
+        inicio = time.perf_counter()
+        
+        sessoes = 0
+        while True:
+            arquivadas = self.storage.arquivar_sessoes(corte, self.lote_sessoes)
+            sessoes += arquivadas
+            if arquivadas < self.lote_sessoes:
+                break
+            time.sleep(self.pausa)
+        
+        alunos = 0
+        apos_id = 0
+        while True:
+            arquivados, apos_id = self.storage.arquivar_alunos(corte, apos_id, self.lote_alunos)
+            alunos += arquivados
+            if apos_id is None:
+                break
+            time.sleep(self.pausa)
+        
+        duracao = time.perf_counter() - inicio
+        self.metrics.incrementar("retencao.sessoes_arquivadas", sessoes)
+        self.metrics.incrementar("retencao.alunos_arquivados", alunos)
+        self.metrics.registrar_tempo("retencao", duracao)
+        relatorio = {
+            "inicio": datetime.now(), "corte_utc": corte, "sessoes": sessoes, "alunos": alunos,
+            "duracao_s": round(duracao, 3)
+        }
+        self.historico.appendleft(relatorio)
+        return relatorio
+
+class IntegrityMonitor:
+    """Verificação contínua dos invariantes do banco, com alerta no painel.
+    
+    `executar` confere só os sorteios gravados desde o último checkpoint
+    (participante existente, posições 1..n por sessão) e a contagem da sessão
+    aberta, em poucos milissegundos; roda a cada 30 s e após cada sorteio.
+    `executar_completa` roda o `PRAGMA quick_check` e procura órfãos em todos
+    os sorteios (participante removido depois de verificado); o agendador só
+    a chama em calmaria, e seus problemas valem até a próxima execução
+    completa. Nenhuma das duas segura o lock durante as consultas.
+    """
+    
+    def __init__(self, storage: "SorteioStorage", metrics: MetricsRegistry, intervalo_completo: float = 900):
+        self.storage = storage
+        self.metrics = metrics
+        self.intervalo_completo = intervalo_completo
+        self.ultimo: Optional[Dict] = None
+        self.problemas: List[str] = []
+        self._sessoes: set = set()
+        self._completos: List[str] = []
+        self._sessoes_completas: set = set()
+        self._lock = threading.Lock()
+    
+    @property
+    def alertas(self) -> List[str]:
+        return self._completos + self.problemas
+    
+    def afeta_sessao(self, sessao_id: str) -> bool:
+        """Algum problema aberto envolve sorteios desta sessão?"""
+        return sessao_id in self._sessoes or sessao_id in self._sessoes_completas
+    
+    def _registrar(self, completo: bool, linhas: int, duracao: float, anteriores: List[str]) -> Dict:
+        """Publica métricas e o resumo; chamada com _lock adquirido"""
+        novos = [p for p in self.alertas if p not in anteriores]
+        self.metrics.incrementar("integridade.alertas", len(novos))
+        self.metrics.registrar_tempo("integridade.completa" if completo else "integridade", duracao)
+        self.metrics.definir("integridade.problemas", len(self.alertas))
+        self.metrics.incrementar("integridade.linhas_verificadas", linhas)
+        self.ultimo = {
+            "quando": datetime.now(), "completo": completo, "linhas": linhas,
+            "problemas": len(self.alertas), "duracao_ms": round(duracao * 1000, 2)
+        }
+        return self.ultimo
+    
+    def executar(self) -> Dict:
+        """Verificação incremental: agendador, após cada sorteio e no painel"""
+        inicio = time.perf_counter()
+        resultado = self.storage.verificar_integridade()
+        duracao = time.perf_counter() - inicio
+        with self._lock:
+            anteriores = self.alertas
+            self.problemas = resultado["problemas"]
+            self._sessoes = set(resultado["sessoes"])
+            return self._registrar(False, resultado["linhas"], duracao, anteriores)
+    
+    def executar_completa(self) -> Dict:
+        """quick_check do banco inteiro e órfãos em todos os sorteios"""
+        inicio = time.perf_counter()
+        problemas = [f"quick_check: {linha}" for linha in self.storage.quick_check()]
+        orfaos = self.storage.verificar_orfaos()
+        duracao = time.perf_counter() - inicio
+        with self._lock:
+            anteriores = self.alertas
+            self._completos = problemas + [p for p in orfaos["problemas"] if p not in self.problemas]
+            self._sessoes_completas = set(orfaos["sessoes"])
+            return self._registrar(True, orfaos["linhas"], duracao, anteriores)
+
+class NotificationWorker:
+    """Entrega em background das notificações da caixa de saída persistente.
+    
+    O sorteio só grava a mensagem na tabela de saída; esta thread busca lotes
+    de mensagens vencidas e as envia por uma conexão SMTP reaproveitada entre
+    lotes (fechada após `ocioso_s` sem uso). Cada lote é reservado por
+    `reserva_s` segundos, então vários processos podem rodar o worker sem
+    enviar a mesma mensagem duas vezes; uma reserva vencida (worker que caiu
+    no meio do lote) volta para a fila. Falhas temporárias voltam com backoff
+    exponencial e jitter; recusas permanentes (5xx) e mensagens que esgotam
+    `max_tentativas` ficam marcadas como falha.
+    """
+    
+    def __init__(self, storage: "SorteioStorage", metrics: MetricsRegistry, host: str, port: int = 587,
+                 usuario: Optional[str] = None, senha: Optional[str] = None, remetente: Optional[str] = None,
+                 starttls: bool = True, lote: int = 20, intervalo: float = 5.0, max_tentativas: int = 6,
+                 backoff_s: float = 30.0, ocioso_s: float = 60.0, reserva_s: float = 300.0):
+        self.storage = storage
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.usuario = usuario
+        self.senha = senha
+        self.remetente = remetente or usuario or f"sorteio@{host}"
+        self.starttls = starttls
+        self.lote = lote
+        self.intervalo = intervalo
+        self.max_tentativas = max_tentativas
+        self.backoff_s = backoff_s
+        self.ocioso_s = ocioso_s
+        self.reserva_s = reserva_s
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._smtp_usado_em = 0.0
+        self._acordar = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @classmethod
+    def from_config(cls, storage: "SorteioStorage", metrics: MetricsRegistry) -> Optional["NotificationWorker"]:
+        """Worker configurado por SMTP_* em st.secrets; None se SMTP_HOST não estiver definido"""
+        host = get_config("SMTP_HOST")
+        if not host:
+            return None
+        return cls(
+            storage, metrics, host=str(host), port=int(get_config("SMTP_PORT", 587)),
+            usuario=get_config("SMTP_USER"), senha=get_config("SMTP_PASSWORD"),
+            remetente=get_config("SMTP_FROM"), starttls=get_config_bool("SMTP_STARTTLS", True)
+        )
+    
+    def iniciar(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sorteio-notificacoes", daemon=True)
+        self._thread.start()
+    
+    def parar(self):
+        self._stop.set()
+        self._acordar.set()
+    
+    def acordar(self):
+        """Sinaliza mensagem nova, para não esperar o próximo intervalo"""
+        self._acordar.set()
+    
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                processadas = self.processar_lote()
+            except Exception:
+                self.metrics.incrementar("notificacoes.erros_worker")
+                processadas = 0
+            if processadas < self.lote:
+                # Fila vazia (ou só mensagens aguardando backoff): dorme até o intervalo ou nova mensagem
+                if self._smtp is not None and time.time() - self._smtp_usado_em > self.ocioso_s:
+                    self._fechar_conexao()
+                self._acordar.wait(self.intervalo)
+                self._acordar.clear()
+        self._fechar_conexao()
+    
+    def _conexao(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=10)
+            if self.starttls:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.senha or "")
+            self._smtp = smtp
+            self._smtp_usado_em = time.time()
+            self.metrics.incrementar("notificacoes.conexoes")
+        return self._smtp
+    
+    def _fechar_conexao(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                pass
+    
+    @staticmethod
+    def _permanente(erro: Exception) -> bool:
+        if isinstance(erro, smtplib.SMTPRecipientsRefused):
+            return all(500 <= codigo < 600 for codigo, _ in erro.recipients.values())
+        codigo = getattr(erro, "smtp_code", None)
+        return isinstance(codigo, int) and 500 <= codigo < 600
+    
+    def processar_lote(self, now: Optional[float] = None) -> int:
+        """Envia um lote de mensagens vencidas; retorna quantas foram processadas"""
+        now = time.time() if now is None else now
+        mensagens = self.storage.reservar_notificacoes(self.lote, now, self.reserva_s)
+        for notificacao in mensagens:
+            mensagem = EmailMessage()
+            mensagem["From"] = self.remetente
+            mensagem["To"] = notificacao["destinatario"]
+            mensagem["Subject"] = notificacao["assunto"]
+            mensagem.set_content(notificacao["corpo"])
+            
+            inicio = time.perf_counter()
+            try:
+                self._conexao().send_message(mensagem)
+            except Exception as e:
+                tentativas = notificacao["tentativas"] + 1
+                if self._permanente(e) or tentativas >= self.max_tentativas:
+                    self.storage.finalizar_notificacao(notificacao["id"], enviada=False, erro=str(e))
+                    self.metrics.incrementar("notificacoes.falhas")
+                else:
+                    atraso = random.uniform(0.5, 1.0) * self.backoff_s * 2 ** (tentativas - 1)
+                    self.storage.adiar_notificacao(notificacao["id"], now + atraso, str(e))
+                    self.metrics.incrementar("notificacoes.retentativas")
+                if isinstance(e, smtplib.SMTPServerDisconnected) or not isinstance(e, smtplib.SMTPException):
+                    # Erro de rede: a conexão não é mais confiável, reabrir no próximo envio
+                    self._fechar_conexao()
+                continue
+            
+            self._smtp_usado_em = time.time()
+            self.storage.finalizar_notificacao(notificacao["id"], enviada=True)
+            self.metrics.incrementar("notificacoes.enviadas")
+            self.metrics.registrar_tempo("notificacoes.envio", time.perf_counter() - inicio)
+        if mensagens:
+            resumo = self.storage.resumo_notificacoes()
+            self.metrics.definir("notificacoes.pendentes", resumo.get("pendente", 0) + resumo.get("enviando", 0))
+        return len(mensagens)
+
+class SeededDrawOrder:
+    """Ordem de sorteio pré-comprometida de uma sessão.
+    
+    Na abertura da sessão a lista de participantes elegíveis é congelada
+    (pares id/número, ordenados por id) e uma semente secreta é sorteada;
+    apenas o SHA-256 da semente é publicado. A ordem é um Fisher–Yates
+    determinístico em que a troca do passo i usa
+    SHA-256("<semente>:<i>") mod (n - i). As trocas são calculadas sob
+    demanda, então a k-ésima posição custa O(1) amortizado e qualquer
+    pessoa pode refazer a ordem com a semente revelada.
+    """
+    
+    def __init__(self, seed: str, ids: array, numeros: array):
+        self.seed = seed
+        self.ids = ids
+        self.numeros = numeros
+        self._trocas: Dict[int, int] = {}
+        self._calculados = 0
+    
+    @staticmethod
+    def gerar_seed() -> str:
+        return secrets.token_hex(32)
+    
+    @staticmethod
+    def hash_seed(seed: str) -> str:
+        return hashlib.sha256(seed.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def codificar_participantes(ids: array, numeros: array) -> bytes:
+        """Pares (id, número) em int64 little-endian"""
+        pares = array('q')
+        for aluno_id, numero in zip(ids, numeros):
+            pares.append(aluno_id)
+            pares.append(numero)
+        if sys.byteorder == "big":
+            pares.byteswap()
+        return pares.tobytes()
+    
+    @staticmethod
+    def decodificar_participantes(blob: bytes) -> Tuple[array, array]:
+        pares = array('q')
+        pares.frombytes(blob)
+        if sys.byteorder == "big":
+            pares.byteswap()
+        return pares[0::2], pares[1::2]
+    
+    @classmethod
+    def from_compromisso(cls, compromisso: Dict) -> "SeededDrawOrder":
+        ids, numeros = cls.decodificar_participantes(compromisso["participantes"])
+        return cls(compromisso["seed"], ids, numeros)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def _indice(self, k: int) -> int:
+        """Índice na lista congelada do participante na posição k (0-based)"""
+        n = len(self.ids)
+        while self._calculados <= k:
+            i = self._calculados
+            digest = hashlib.sha256(f"{self.seed}:{i}".encode("utf-8")).digest()
+            j = i + int.from_bytes(digest, "big") % (n - i)
+            vi, vj = self._trocas.get(i, i), self._trocas.get(j, j)
+            self._trocas[i], self._trocas[j] = vj, vi
+            self._calculados += 1
+        return self._trocas.get(k, k)
+    
+    def vencedor(self, posicao: int) -> Optional[Tuple[int, int]]:
+        """(aluno_id, numero_sorte) da posição (1-based), ou None se acabaram os participantes"""
+        if posicao < 1 or posicao > len(self.ids):
+            return None
+        idx = self._indice(posicao - 1)
+        return self.ids[idx], self.numeros[idx]
+
+class ParticipantSnapshot:
+    """Snapshot compacto (colunar) dos participantes, compartilhado entre sessões.
+    
+    Ids e números ficam em `array`, nomes e emails em uma única tabela de
+    strings internadas. Leitores não usam lock: as colunas só crescem por
+    append, a ordem por nome é trocada inteira (copy-on-write) a cada
+    inclusão, e uma reconstrução completa troca o objeto inteiro.
+    """
+    
+    def __init__(self, versao: int = 0, particoes: int = 1):
+        self.versao = versao
+        # Maior id por partição (id % particoes), o cursor de alunos_desde
+        self.max_ids = [0] * particoes
+        self._ids = array('q')
+        self._numeros = array('q')
+        self._nomes = array('l')    # índices em _strings
+        self._emails = array('l')   # índices em _strings
+        self._ordem = array('l')    # posições ordenadas por nome
+        self._strings: List[str] = []
+        self._string_idx: Dict[str, int] = {}
+        self._por_email: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_rows(cls, rows, versao: int = 0, particoes: int = 1) -> "ParticipantSnapshot":
+        """Constrói snapshot a partir de linhas (id, nome, email, numero_sorte) ordenadas por nome"""
+        snapshot = cls(versao, particoes)
+        for pos, (aluno_id, nome, email, numero) in enumerate(rows):
+            snapshot._append(aluno_id, nome, email, numero)
+            snapshot._ordem.append(pos)
+        return snapshot
+    
+    def _intern(self, valor: str) -> int:
+        idx = self._string_idx.get(valor)
+        if idx is None:
+            idx = len(self._strings)
+            self._strings.append(valor)
+            self._string_idx[valor] = idx
+        return idx
+    
+    def _append(self, aluno_id: int, nome: str, email: str, numero: int) -> int:
+        pos = len(self._ids)
+        self._ids.append(aluno_id)
+        self._numeros.append(numero)
+        self._nomes.append(self._intern(nome))
+        email_idx = self._intern(email)
+        self._emails.append(email_idx)
+        self._por_email[self._strings[email_idx]] = pos
+        particao = aluno_id % len(self.max_ids)
+        if aluno_id > self.max_ids[particao]:
+            self.max_ids[particao] = aluno_id
+        return pos
+    
+    def _inserir(self, aluno_id: int, nome: str, email: str, numero: int):
+        """Inclui uma linha; chamada com _lock adquirido"""
+        if email in self._por_email:
+            return
+        pos = self._append(aluno_id, nome, email, numero)
+        
+        # Busca binária pela posição de inserção (mesma ordem do ORDER BY nome)
+        ordem = self._ordem
+        lo, hi = 0, len(ordem)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._strings[self._nomes[ordem[mid]]] <= nome:
+                lo = mid + 1
+            else:
+                hi = mid
+        # Nova ordem publicada de uma vez: um page() em andamento continua vendo a anterior
+        nova = ordem[:lo]
+        nova.append(pos)
+        nova.extend(ordem[lo:])
+        self._ordem = nova
+    
+    def adicionar(self, aluno_id: int, nome: str, email: str, numero: int, versao: Optional[int] = None) -> bool:
+        """Inclui participante incrementalmente mantendo a ordem por nome.
+        
+        Com `versao`, só aplica se o snapshot estiver na versão imediatamente
+        anterior (nenhuma outra escrita no meio); retorna se aplicou.
+        """
+        with self._lock:
+            if versao is not None and self.versao != versao - 1:
+                return False
+            self._inserir(aluno_id, nome, email, numero)
+            if versao is not None:
+                self.versao = versao
+            return True
+    
+    def aplicar(self, rows, versao: int):
+        """Inclui várias linhas (id, nome, email, numero_sorte) e avança para `versao`"""
+        with self._lock:
+            for row in rows:
+                self._inserir(*row)
+            self.versao = versao
+    
+    def __len__(self) -> int:
+        return len(self._ordem)
+    
+    def tamanho_aproximado(self, amostra: int = 256) -> int:
+        """Bytes aproximados sem percorrer cada objeto
+        
+        As colunas `array` são medidas pelo buffer; as strings, pela média de
+        uma amostra de até `amostra` itens multiplicada pelo total.
+        """
+        total = sys.getsizeof(self)
+        for coluna in (self._ids, self._numeros, self._nomes, self._emails, self._ordem):
+            total += sys.getsizeof(coluna)
+        strings = self._strings
+        total += sys.getsizeof(strings) + sys.getsizeof(self._string_idx) + sys.getsizeof(self._por_email)
+        # Valores dos dicionários: um int por entrada (as chaves são as strings já contadas)
+        total += (len(self._string_idx) + len(self._por_email)) * sys.getsizeof(1 << 30)
+        if strings:
+            indices = random.sample(range(len(strings)), min(amostra, len(strings)))
+            total += sum(sys.getsizeof(strings[i]) for i in indices) * len(strings) // len(indices)
+        return total
+    
+    def _row(self, pos: int) -> Dict:
+        return {
+            "id": self._ids[pos],
+            "nome": self._strings[self._nomes[pos]],
+            "email": self._strings[self._emails[pos]],
+            "numero_sorte": self._numeros[pos]
+        }
+    
+    def page(self, start: int, end: int) -> List[Dict]:
+        """Fatia da lista ordenada por nome materializada como dicts"""
+        return [self._row(pos) for pos in self._ordem[start:end]]
+    
+    def as_dicts(self) -> List[Dict]:
+        """Lista completa ordenada por nome (materializada sob demanda)"""
+        return self.page(0, len(self._ordem))
+    
+    def find_by_email(self, email: str) -> Optional[Dict]:
+        """Busca O(1) por email"""
+        pos = self._por_email.get(email)
+        return self._row(pos) if pos is not None else None
+    
+    def congelar(self) -> Tuple[array, array]:
+        """Cópia (ids, números) ordenada por id, para o compromisso da sessão"""
+        ordem = sorted(range(len(self._ordem)), key=self._ids.__getitem__)
+        return array('q', (self._ids[i] for i in ordem)), array('q', (self._numeros[i] for i in ordem))
+    
+    def sample(self, excluidos: set) -> Optional[Dict]:
+        """Sorteia participante uniformemente ignorando números já sorteados"""
+        total = len(self._ordem)
+        if total == 0:
+            return None
+        
+        # Amostragem por rejeição: poucos excluídos por sessão
+        for _ in range(32):
+            pos = random.randrange(total)
+            if self._numeros[pos] not in excluidos:
+                return self._row(pos)
+        
+        disponiveis = [pos for pos in range(total) if self._numeros[pos] not in excluidos]
+        return self._row(random.choice(disponiveis)) if disponiveis else None
+
+class SorteioStorage(ABC):
+    """Interface de armazenamento do motor de sorteio.
+    
+    Cobre participantes, sessão, sorteios e credenciais. Toda escrita avança
+    a geração do escopo afetado ('alunos', 'sorteios' ou 'sessao'), que é
+    a base da validação de caches do motor. Os métodos obrigatórios são
+    abstratos: um backend incompleto falha ao ser instanciado. O contrato
+    comum é verificado em tests/test_storage_contract.py.
+    """
+    
+    # Faixa dos números da sorte
+    FAIXA_NUMEROS = (1000, 9999)
+    
+    # Partições dos ids (`id % particoes_id`) com sequência própria; em cada uma os ids só crescem
+    particoes_id = 1
+    
+    # Métricas do motor, atribuídas por ele se o armazenamento não tiver as suas
+    metrics: Optional[MetricsRegistry] = None
+    
+    # Gerações
+    @abstractmethod
+    def get_geracoes(self) -> Dict[str, int]:
+        raise NotImplementedError
+    
+    # Participantes
+    def gerar_numero(self, email: str) -> int:
+        """Candidato a número da sorte do email; a unicidade é conferida com numero_em_uso"""
+        return random.randint(*self.FAIXA_NUMEROS)
+    
+    @abstractmethod
+    def email_cadastrado(self, email: str) -> bool:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def numero_em_uso(self, numero: int) -> bool:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def inserir_aluno(self, nome: str, email: str, numero: int) -> Tuple[int, int]:
+        """Insere participante e retorna (id, geração de 'alunos' após a escrita)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def listar_alunos(self) -> Tuple[int, List[Tuple]]:
+        """Retorna (geração, linhas (id, nome, email, numero_sorte) ordenadas por nome)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def alunos_desde(self, max_ids: Sequence[int]) -> Tuple[int, List[Tuple], int]:
+        """Retorna (geração, linhas novas ordenadas por id, total de participantes)
+        
+        `max_ids` traz o maior id já visto em cada partição (`particoes_id`
+        itens); linhas novas são as de id maior que o da sua partição.
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_estatisticas(self, minutos: int = 30, sessoes: int = 10) -> Dict:
+        """Totais, cadastros por minuto (últimos `minutos` com atividade) e sorteios por sessão"""
+        raise NotImplementedError
+    
+    # Sessão
+    @abstractmethod
+    def get_sessao(self) -> Dict:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def abrir_sessao(self, sessao_id: str, compromisso: Dict):
+        """Abre a sessão gravando junto o compromisso (semente, hash e participantes congelados)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def fechar_sessao(self):
+        """Encerra a sessão ativa e revela a semente do seu compromisso"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_compromisso(self, sessao_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def listar_sessoes_reveladas(self) -> List[str]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def listar_sessoes(self, limite: int = 20) -> List[Dict]:
+        """Sessões mais recentes primeiro: sessao_id, created_at, ended_at e participantes"""
+        raise NotImplementedError
+    
+    # Sorteios (vivos e arquivados)
+    @abstractmethod
+    def numeros_sorteados(self, sessao_id: str) -> List[int]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def exportar_sorteios(self) -> List[Tuple]:
+        """Todos os sorteios: (sessao_id, posicao, nome, email, numero_sorte, created_at, aluno_id)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def registrar_proximo_sorteio(self, sessao_id: str, escolher: Callable[[int, set], Optional[Tuple[int, int]]],
+                                  max_sorteios: int = 3,
+                                  aviso: Optional[Callable[[Dict, int], Tuple[str, str, str]]] = None
+                                  ) -> Optional[Tuple[int, int, int]]:
+        """Sorteia a próxima posição da sessão numa única transação exclusiva
+        
+        Relê a sessão dentro da transação, chama `escolher(posicao, números já
+        sorteados)` para obter (aluno_id, numero) e grava o sorteio e o contador.
+        Com `aviso(participante, posicao)`, a mensagem (destinatario, assunto,
+        corpo) entra na caixa de saída na mesma transação do sorteio.
+        Retorna (posicao, aluno_id, numero), ou None se a sessão não está ativa,
+        mudou, já tem `max_sorteios` sorteios ou não há quem sortear.
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def listar_vencedores(self, sessao_id: str) -> List[Dict]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def listar_sorteios(self, sessao_id: str) -> List[Tuple[int, int, int]]:
+        """(posicao, aluno_id, numero_sorte) da sessão, em ordem de posição"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_aluno(self, aluno_id: int) -> Optional[Dict]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def buscar_aluno_por_email(self, email: str) -> Optional[Dict]:
+        """Consulta pontual pelo email (índice único), sem carregar a lista"""
+        raise NotImplementedError
+    
+    # Caixa de saída de notificações
+    @abstractmethod
+    def enfileirar_notificacao(self, destinatario: str, assunto: str, corpo: str):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def reservar_notificacoes(self, limite: int, agora: float, prazo_s: float) -> List[Dict]:
+        """Reserva por `prazo_s` até `limite` mensagens vencidas, das mais antigas para as mais novas
+        
+        Pega as pendentes e as 'enviando' cuja reserva expirou, marcando-as
+        'enviando' de forma atômica: dois workers nunca recebem a mesma
+        mensagem dentro do prazo.
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def adiar_notificacao(self, notificacao_id: int, proxima_tentativa: float, erro: str):
+        """Conta uma tentativa e devolve a mensagem à fila para `proxima_tentativa`"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def finalizar_notificacao(self, notificacao_id: int, enviada: bool, erro: Optional[str] = None):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def resumo_notificacoes(self) -> Dict[str, int]:
+        """Quantidade de mensagens por status ('pendente', 'enviando', 'enviada', 'falha')"""
+        raise NotImplementedError
+    
+    # Credenciais
+    @abstractmethod
+    def get_password_hash(self) -> Optional[str]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def init_password_hash(self, password_hash: str):
+        """Grava o hash apenas se ainda não houver senha configurada"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def set_password_hash(self, password_hash: str):
+        raise NotImplementedError
+    
+    # Manutenção (no-op quando não se aplica ao armazenamento)
+    def checkpoint_wal(self):
+        pass
+    
+    def otimizar(self):
+        pass
+    
+    def vacuum_incremental(self, paginas: int = 200) -> int:
+        return 0
+    
+    def verificar_integridade(self) -> Dict:
+        """Confere os invariantes dos sorteios gravados desde o último checkpoint.
+        
+        Retorna {"problemas": [...], "sessoes": [sessões envolvidas], "linhas": n}.
+        """
+        return {"problemas": [], "sessoes": [], "linhas": 0}
+    
+    def verificar_orfaos(self) -> Dict:
+        """Sorteios de qualquer época cujo participante não existe mais; mesmo formato de verificar_integridade"""
+        return {"problemas": [], "sessoes": [], "linhas": 0}
+    
+    def quick_check(self) -> List[str]:
+        """Problemas de estrutura do arquivo (PRAGMA quick_check); vazio se está íntegro"""
+        return []
+    
+    def arquivar_sessoes(self, corte: str, lote: int = 50) -> int:
+        """Move para o arquivo os sorteios de até `lote` sessões encerradas antes de `corte`"""
+        return 0
+    
+    def podar_estatisticas(self, antes_de: str) -> int:
+        """Apaga os cadastros por minuto anteriores a `antes_de` ("%Y-%m-%d %H:%M", hora local)"""
+        return 0
+    
+    def arquivar_alunos(self, corte: str, apos_id: int = 0, lote: int = 500) -> Tuple[int, Optional[int]]:
+        """Arquiva participantes cadastrados antes de `corte` na próxima faixa de até `lote` ids.
+        
+        Retorna (arquivados, último id da faixa), ou (0, None) quando não há mais faixas.
+        """
+        return 0, None
+    
+    def close(self):
+        pass
+
+# Consultas do SQLiteStorage, todas com texto fixo, e o plano esperado de cada uma
+# (verificado por tests/test_planos_sql.py). `usa`: ao menos um destes índices aparece no
+# plano; `scan`: tabelas que podem ser percorridas por inteiro; `temp`: B-tree
+# temporária de ORDER BY/GROUP BY permitida. DDL e PRAGMAs ficam de fora.
+SQL: Dict[str, str] = {}
+PLANOS_SQL: Dict[str, Dict] = {}
+
+def registrar_sql(nome: str, sql: str, usa: Tuple[str, ...] = (), scan: Tuple[str, ...] = (),
+                  temp: bool = False):
+    SQL[nome] = " ".join(sql.split())
+    PLANOS_SQL[nome] = {"usa": usa, "scan": scan, "temp": temp}
+
+# Participantes
+registrar_sql("geracoes", "SELECT escopo, valor FROM geracao", scan=("geracao",))
+registrar_sql("geracao_alunos", "SELECT valor FROM geracao WHERE escopo = 'alunos'",
+              usa=("sqlite_autoindex_geracao_1",))
+registrar_sql("email_cadastrado", "SELECT 1 FROM alunos WHERE email = ? LIMIT 1",
+              usa=("sqlite_autoindex_alunos_1",))
+registrar_sql("numero_em_uso", "SELECT 1 FROM alunos WHERE numero_sorte = ? LIMIT 1",
+              usa=("sqlite_autoindex_alunos_2",))
+registrar_sql("inserir_aluno", "INSERT INTO alunos (nome, email, numero_sorte) VALUES (?, ?, ?)")
+# Lista completa para a barra lateral: o scan é o próprio objetivo da consulta
+registrar_sql("listar_alunos", "SELECT id, nome, email, numero_sorte FROM alunos ORDER BY nome",
+              scan=("alunos",), temp=True)
+registrar_sql("alunos_desde", "SELECT id, nome, email, numero_sorte FROM alunos WHERE id > ? ORDER BY id",
+              usa=("INTEGER PRIMARY KEY",))
+registrar_sql("aluno_por_id", "SELECT id, nome, email, numero_sorte FROM alunos WHERE id = ?",
+              usa=("INTEGER PRIMARY KEY",))
+registrar_sql("aluno_por_email", "SELECT id, nome, email, numero_sorte FROM alunos WHERE email = ?",
+              usa=("sqlite_autoindex_alunos_1",))
+# Amostragem dentro de um shard: id aleatório entre o menor e o maior, pela chave primária
+registrar_sql("faixa_ids_alunos", "SELECT (SELECT MIN(id) FROM alunos), (SELECT MAX(id) FROM alunos)",
+              usa=("SEARCH alunos",))
+registrar_sql("total_shards", "SELECT total FROM shards WHERE id = 1", usa=("INTEGER PRIMARY KEY",))
+
+# Estatísticas (tabelas pequenas, mantidas por triggers)
+registrar_sql("total_alunos", "SELECT valor FROM estatisticas WHERE chave = 'alunos_total'",
+              usa=("sqlite_autoindex_estatisticas_1",))
+registrar_sql("estatisticas", "SELECT chave, valor FROM estatisticas", scan=("estatisticas",))
+registrar_sql("cadastros_por_minuto", "SELECT minuto, total FROM cadastros_por_minuto ORDER BY minuto DESC LIMIT ?",
+              scan=("cadastros_por_minuto",))
+registrar_sql("podar_cadastros_por_minuto", "DELETE FROM cadastros_por_minuto WHERE minuto < ?",
+              usa=("sqlite_autoindex_cadastros_por_minuto_1",))
+registrar_sql("sorteios_por_sessao", """
+    SELECT p.sessao_id, p.total FROM sorteios_por_sessao p
+    LEFT JOIN sessoes_sorteio s ON s.sessao_id = p.sessao_id
+    ORDER BY s.created_at DESC LIMIT ?
+""", usa=("sqlite_autoindex_sessoes_sorteio_1",), scan=("p",), temp=True)
+
+# Sessões e compromissos
+registrar_sql("sessao_atual", "SELECT ativa, sessao_id, sorteios_count FROM sessao WHERE id = 1",
+              usa=("INTEGER PRIMARY KEY",))
+registrar_sql("inserir_compromisso", """
+    INSERT INTO sessoes_sorteio (sessao_id, seed, seed_hash, participantes, participantes_hash, total)
+    VALUES (?, ?, ?, ?, ?, ?)
+""")
+registrar_sql("abrir_sessao", """
+    UPDATE sessao SET ativa = TRUE, sessao_id = ?, sorteios_count = 0,
+    created_at = CURRENT_TIMESTAMP, ended_at = NULL WHERE id = 1
+""", usa=("INTEGER PRIMARY KEY",))
+registrar_sql("revelar_sessao", """
+    UPDATE sessoes_sorteio SET revelada = TRUE, ended_at = CURRENT_TIMESTAMP
+    WHERE sessao_id = (SELECT sessao_id FROM sessao WHERE id = 1 AND ativa)
+""", usa=("sqlite_autoindex_sessoes_sorteio_1",))
+registrar_sql("fechar_sessao", "UPDATE sessao SET ativa = FALSE, ended_at = CURRENT_TIMESTAMP WHERE id = 1",
+              usa=("INTEGER PRIMARY KEY",))
+registrar_sql("compromisso", """
+    SELECT seed, seed_hash, participantes, participantes_hash, total, revelada
+    FROM sessoes_sorteio WHERE sessao_id = ?
+""", usa=("sqlite_autoindex_sessoes_sorteio_1",))
+# Usada só pela verificação em lote, uma vez por auditoria
+registrar_sql("sessoes_reveladas", "SELECT sessao_id FROM sessoes_sorteio WHERE revelada ORDER BY created_at",
+              scan=("sessoes_sorteio",), temp=True)
+
+# Sorteios
+# Sorteios de uma sessão lidos das tabelas viva e de arquivo (parâmetros: sessao_id duas vezes)
+registrar_sql("numeros_sorteados", """
+    SELECT posicao, numero_sorte FROM sorteios WHERE sessao_id = ?
+    UNION ALL
+    SELECT posicao, numero_sorte FROM sorteios_arquivo WHERE sessao_id = ?
+    ORDER BY 1
+""", usa=("idx_sorteios_sessao_posicao",), temp=True)
+registrar_sql("maior_posicao_sessao", "SELECT MAX(posicao) FROM sorteios WHERE sessao_id = ?",
+              usa=("idx_sorteios_sessao_posicao",))
+registrar_sql("sorteados_sessao", "SELECT numero_sorte FROM sorteios WHERE sessao_id = ?",
+              usa=("idx_sorteios_sessao", "idx_sorteios_sessao_posicao"))
+registrar_sql("inserir_sorteio", "INSERT INTO sorteios (sessao_id, aluno_id, numero_sorte, posicao) VALUES (?, ?, ?, ?)")
+registrar_sql("atualizar_contagem", "UPDATE sessao SET sorteios_count = ? WHERE id = 1",
+              usa=("INTEGER PRIMARY KEY",))
+registrar_sql("vencedores", """
+    SELECT s.posicao, a.nome, s.numero_sorte
+    FROM sorteios s
+    INNER JOIN alunos a ON s.aluno_id = a.id
+    WHERE s.sessao_id = ?
+    UNION ALL
+    SELECT posicao, nome, numero_sorte FROM sorteios_arquivo WHERE sessao_id = ?
+    ORDER BY 1
+""", usa=("idx_sorteios_sessao_posicao",), temp=True)
+registrar_sql("listar_sorteios", """
+    SELECT posicao, aluno_id, numero_sorte FROM sorteios WHERE sessao_id = ?
+    UNION ALL
+    SELECT posicao, aluno_id, numero_sorte FROM sorteios_arquivo WHERE sessao_id = ?
+    ORDER BY 1
+""", usa=("idx_sorteios_sessao_posicao",), temp=True)
+
+# Histórico e retenção
+# Poucas linhas por sessão: listagem e exportação percorrem as tabelas por inteiro de propósito
+registrar_sql("sessoes_recentes", """
+    SELECT sessao_id, created_at, ended_at, total FROM sessoes_sorteio ORDER BY created_at DESC LIMIT ?
+""", scan=("sessoes_sorteio",), temp=True)
+registrar_sql("exportar_sorteios", """
+    SELECT s.sessao_id, s.posicao, a.nome, a.email, s.numero_sorte, s.created_at, s.aluno_id
+    FROM sorteios s LEFT JOIN alunos a ON a.id = s.aluno_id
+    UNION ALL
+    SELECT sessao_id, posicao, nome, email, numero_sorte, created_at, aluno_id FROM sorteios_arquivo
+    ORDER BY 6, 2
+""", scan=("s", "sorteios_arquivo"), temp=True)
+# Parte dos sorteios: sessões antigas não têm linha em sessoes_sorteio. O fim da sessão vem
+# de sessoes_sorteio, da tabela sessao (a última sessão) ou, na falta dos dois, do último sorteio
+registrar_sql("sessoes_para_arquivar", """
+    SELECT s.sessao_id FROM sorteios s
+    LEFT JOIN sessoes_sorteio ss ON ss.sessao_id = s.sessao_id
+    LEFT JOIN sessao atual ON atual.id = 1 AND atual.sessao_id = s.sessao_id
+    GROUP BY s.sessao_id
+    HAVING NOT COALESCE(MAX(atual.ativa), FALSE)
+    AND COALESCE(MAX(ss.ended_at), MAX(atual.ended_at), MAX(s.created_at)) < ?
+    LIMIT ?
+""", usa=("idx_sorteios_sessao",), scan=("s",))
+registrar_sql("sorteios_da_sessao", """
+    SELECT posicao, aluno_id, numero_sorte, created_at FROM sorteios WHERE sessao_id = ?
+""", usa=("idx_sorteios_sessao", "idx_sorteios_sessao_posicao"))
+registrar_sql("inserir_sorteio_arquivo", """
+    INSERT INTO sorteios_arquivo (sessao_id, aluno_id, nome, email, numero_sorte, posicao, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+""")
+registrar_sql("remover_sorteios_sessao", "DELETE FROM sorteios WHERE sessao_id = ?",
+              usa=("idx_sorteios_sessao", "idx_sorteios_sessao_posicao"))
+# Participantes em faixas de id: (apos_id, ate_id] com cadastro anterior ao corte e sem sorteio vivo
+registrar_sql("limite_alunos_para_arquivar", """
+    SELECT MAX(id) FROM (SELECT id FROM alunos WHERE id > ? AND created_at < ? ORDER BY id LIMIT ?)
+""", usa=("INTEGER PRIMARY KEY",))
+registrar_sql("arquivar_alunos", """
+    INSERT INTO alunos_arquivo (aluno_id, nome, email, numero_sorte, created_at)
+    SELECT id, nome, email, numero_sorte, created_at FROM alunos a
+    WHERE id > ? AND id <= ? AND created_at < ?
+    AND NOT EXISTS (SELECT 1 FROM sorteios s WHERE s.aluno_id = a.id)
+""", usa=("INTEGER PRIMARY KEY", "idx_sorteios_aluno"))
+registrar_sql("remover_alunos_arquivados", """
+    DELETE FROM alunos
+    WHERE id > ? AND id <= ? AND created_at < ?
+    AND NOT EXISTS (SELECT 1 FROM sorteios s WHERE s.aluno_id = alunos.id)
+""", usa=("INTEGER PRIMARY KEY", "idx_sorteios_aluno"))
+# Com shards: os sorteios ficam no arquivo principal e os participantes em cada shard,
+# então o lote vai por lista de ids (JSON) entre os dois bancos
+registrar_sql("ids_alunos_para_arquivar", """
+    SELECT id FROM alunos WHERE id > ? AND created_at < ? ORDER BY id LIMIT ?
+""", usa=("INTEGER PRIMARY KEY",))
+registrar_sql("alunos_com_sorteio", """
+    SELECT value FROM json_each(?) WHERE EXISTS (SELECT 1 FROM sorteios s WHERE s.aluno_id = value)
+""", usa=("idx_sorteios_aluno",), scan=("json_each",))
+registrar_sql("arquivar_alunos_ids", """
+    INSERT INTO alunos_arquivo (aluno_id, nome, email, numero_sorte, created_at)
+    SELECT id, nome, email, numero_sorte, created_at FROM alunos WHERE id IN (SELECT value FROM json_each(?))
+""", usa=("INTEGER PRIMARY KEY",), scan=("json_each",))
+registrar_sql("remover_alunos_ids", "DELETE FROM alunos WHERE id IN (SELECT value FROM json_each(?))",
+              usa=("INTEGER PRIMARY KEY",), scan=("json_each",))
+
+# Caixa de saída de notificações
+registrar_sql("enfileirar_notificacao", """
+    INSERT INTO notificacoes (destinatario, assunto, corpo, proxima_tentativa) VALUES (?, ?, ?, ?)
+""")
+# Em 'enviando', proxima_tentativa é o fim da reserva
+registrar_sql("reservar_notificacoes", """
+    UPDATE notificacoes SET status = 'enviando', proxima_tentativa = ?
+    WHERE id IN (
+        SELECT id FROM notificacoes
+        WHERE status IN ('pendente', 'enviando') AND proxima_tentativa <= ?
+        ORDER BY proxima_tentativa LIMIT ?
+    )
+    RETURNING id, destinatario, assunto, corpo, tentativas
+""", usa=("idx_notificacoes_fila",), temp=True)
+registrar_sql("adiar_notificacao", """
+    UPDATE notificacoes SET status = 'pendente', tentativas = tentativas + 1, proxima_tentativa = ?, ultimo_erro = ?
+    WHERE id = ?
+""", usa=("INTEGER PRIMARY KEY",))
+registrar_sql("finalizar_notificacao", """
+    UPDATE notificacoes SET status = ?, tentativas = tentativas + 1, ultimo_erro = ?,
+    finalizada_at = CURRENT_TIMESTAMP WHERE id = ?
+""", usa=("INTEGER PRIMARY KEY",))
+registrar_sql("resumo_notificacoes", "SELECT status, COUNT(*) FROM notificacoes GROUP BY status",
+              usa=("idx_notificacoes_fila",), scan=("notificacoes",))
+
+# Verificação de integridade: só as linhas na faixa (checkpoint, maior id]
+registrar_sql("checkpoint_integridade", "SELECT tabela, ultimo_id FROM integridade_checkpoint",
+              scan=("integridade_checkpoint",))
+registrar_sql("gravar_checkpoint_integridade", """
+    UPDATE integridade_checkpoint SET ultimo_id = ?, verificado_at = CURRENT_TIMESTAMP WHERE tabela = ?
+""", usa=("sqlite_autoindex_integridade_checkpoint_1",))
+registrar_sql("maior_id_sorteios", "SELECT MAX(id) FROM sorteios")
+registrar_sql("maior_id_sorteios_arquivo", "SELECT MAX(id) FROM sorteios_arquivo")
+registrar_sql("sorteios_orfaos", """
+    SELECT s.id, s.sessao_id, s.aluno_id FROM sorteios s
+    WHERE s.id > ? AND s.id <= ? AND NOT EXISTS (SELECT 1 FROM alunos a WHERE a.id = s.aluno_id)
+""", usa=("INTEGER PRIMARY KEY",))
+registrar_sql("sorteios_na_faixa", "SELECT id, sessao_id, aluno_id FROM sorteios WHERE id > ? AND id <= ?",
+              usa=("INTEGER PRIMARY KEY",))
+registrar_sql("sessoes_na_faixa", """
+    SELECT sessao_id FROM sorteios WHERE id > ? AND id <= ?
+    UNION
+    SELECT sessao_id FROM sorteios_arquivo WHERE id > ? AND id <= ?
+""", usa=("INTEGER PRIMARY KEY",), temp=True)
+registrar_sql("contagem_sessao_atual", """
+    SELECT sessao_id, sorteios_count, (SELECT COUNT(*) FROM sorteios s WHERE s.sessao_id = sessao.sessao_id)
+    FROM sessao WHERE id = 1 AND ativa
+""", usa=("INTEGER PRIMARY KEY", "idx_sorteios_sessao"))
+
+# Credenciais e manutenção
+registrar_sql("hash_senha", "SELECT password_hash FROM admin_security WHERE id = 1",
+              usa=("INTEGER PRIMARY KEY",))
+registrar_sql("iniciar_hash_senha", "INSERT OR IGNORE INTO admin_security (id, password_hash) VALUES (1, ?)")
+registrar_sql("trocar_hash_senha", """
+    UPDATE admin_security SET password_hash = ?, updated_at = CURRENT_TIMESTAMP WHERE id = 1
+""", usa=("INTEGER PRIMARY KEY",))
+registrar_sql("estatisticas_planejador", "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'",
+              scan=("sqlite_master",))
+
+class SQLiteStorage(SorteioStorage):
+    """Armazenamento em arquivo SQLite com pools separados de leitura e escrita
+    
+    Todas as escritas passam por uma única conexão (`writer`), serializadas no
+    processo; as consultas usam o pool somente leitura (`readers`) e, graças ao
+    WAL, nunca disputam o lock de escrita. Checkpoint, ANALYZE e vacuum
+    usam uma terceira conexão (`manutencao`), com espera curta pelo lock,
+    para não ocupar o escritor de cadastros e sorteios.
+    """
+    
+    # Espera máxima da manutenção pelo lock do banco: desiste em vez de enfileirar escritas
+    MANUTENCAO_TIMEOUT_S = 1.0
+    
+    # Sorteio sob disputa entre processos: tentativas de BEGIN IMMEDIATE e backoff
+    SORTEIO_MAX_TENTATIVAS = 8
+    SORTEIO_BACKOFF_S = 0.01
+    SORTEIO_BUSY_TIMEOUT_MS = 50
+    
+    def __init__(self, db_path: str = "sorteio.db", max_connections: int = 10):
+        self.db_path = db_path
+        self.writer = ConnectionPool(db_path, max_connections=1)
+        self._init_db()
+        self._registrar_total_shards()
+        # Leitores só depois do schema: mode=ro não cria o arquivo
+        self.readers = ConnectionPool(db_path, max_connections, somente_leitura=True)
+        self.manutencao = ConnectionPool(db_path, max_connections=1, timeout=self.MANUTENCAO_TIMEOUT_S)
+    
+    def _init_db(self):
+        """Inicializa banco com índices otimizados"""
+        with self.writer.get_connection() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS alunos (
+                    id INTEGER PRIMARY KEY,
+                    nome TEXT NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    numero_sorte INTEGER UNIQUE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                CREATE TABLE IF NOT EXISTS sorteios (
+                    id INTEGER PRIMARY KEY,
+                    sessao_id TEXT NOT NULL,
+                    aluno_id INTEGER,
+                    numero_sorte INTEGER,
+                    posicao INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (aluno_id) REFERENCES alunos (id)
+                );
+                
+                CREATE TABLE IF NOT EXISTS sessao (
+                    id INTEGER PRIMARY KEY DEFAULT 1,
+                    ativa BOOLEAN DEFAULT FALSE,
+                    sessao_id TEXT,
+                    sorteios_count INTEGER DEFAULT 0,
+                    created_at TIMESTAMP,
+                    ended_at TIMESTAMP
+                );
+                
+                CREATE TABLE IF NOT EXISTS sessoes_sorteio (
+                    sessao_id TEXT PRIMARY KEY,
+                    seed TEXT NOT NULL,
+                    seed_hash TEXT NOT NULL,
+                    participantes BLOB NOT NULL,
+                    participantes_hash TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    revelada BOOLEAN DEFAULT FALSE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    ended_at TIMESTAMP
+                );
+                
+                CREATE TABLE IF NOT EXISTS notificacoes (
+                    id INTEGER PRIMARY KEY,
+                    destinatario TEXT NOT NULL,
+                    assunto TEXT NOT NULL,
+                    corpo TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pendente',
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    proxima_tentativa REAL NOT NULL DEFAULT 0,
+                    ultimo_erro TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finalizada_at TIMESTAMP
+                );
+                
+                -- Arquivo: sorteios de sessões antigas (com nome e email da época) e
+                -- participantes de eventos passados, fora das tabelas quentes
+                CREATE TABLE IF NOT EXISTS sorteios_arquivo (
+                    id INTEGER PRIMARY KEY,
+                    sessao_id TEXT NOT NULL,
+                    aluno_id INTEGER,
+                    nome TEXT,
+                    email TEXT,
+                    numero_sorte INTEGER,
+                    posicao INTEGER,
+                    created_at TIMESTAMP,
+                    arquivado_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                CREATE TABLE IF NOT EXISTS alunos_arquivo (
+                    id INTEGER PRIMARY KEY,
+                    aluno_id INTEGER NOT NULL,
+                    nome TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    numero_sorte INTEGER NOT NULL,
+                    created_at TIMESTAMP,
+                    arquivado_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                -- Até onde cada tabela de sorteios já passou pela verificação de integridade
+                CREATE TABLE IF NOT EXISTS integridade_checkpoint (
+                    tabela TEXT PRIMARY KEY,
+                    ultimo_id INTEGER NOT NULL DEFAULT 0,
+                    verificado_at TIMESTAMP
+                );
+                INSERT OR IGNORE INTO integridade_checkpoint (tabela) VALUES ('sorteios'), ('sorteios_arquivo');
+                
+                -- Número de shards de participantes (só usado por ShardedSQLiteStorage)
+                CREATE TABLE IF NOT EXISTS shards (
+                    id INTEGER PRIMARY KEY DEFAULT 1,
+                    total INTEGER NOT NULL
+                );
+                
+                CREATE TABLE IF NOT EXISTS admin_security (
+                    id INTEGER PRIMARY KEY DEFAULT 1,
+                    password_hash TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                -- Índices para performance
+                -- email e numero_sorte já têm os índices automáticos das restrições UNIQUE
+                DROP INDEX IF EXISTS idx_alunos_email;
+                DROP INDEX IF EXISTS idx_alunos_numero;
+                CREATE INDEX IF NOT EXISTS idx_sorteios_sessao ON sorteios(sessao_id);
+                CREATE INDEX IF NOT EXISTS idx_sorteios_aluno ON sorteios(aluno_id);
+                CREATE INDEX IF NOT EXISTS idx_sorteios_arquivo_sessao ON sorteios_arquivo(sessao_id, posicao);
+                CREATE INDEX IF NOT EXISTS idx_notificacoes_fila ON notificacoes(status, proxima_tentativa);
+                
+                INSERT OR IGNORE INTO sessao (id) VALUES (1);
+                
+                -- Contador de geração compartilhado entre processos
+                CREATE TABLE IF NOT EXISTS geracao (
+                    escopo TEXT PRIMARY KEY,
+                    valor INTEGER NOT NULL DEFAULT 0
+                );
+                INSERT OR IGNORE INTO geracao (escopo) VALUES ('alunos'), ('sorteios'), ('sessao');
+                
+                CREATE TRIGGER IF NOT EXISTS trg_geracao_alunos_ins AFTER INSERT ON alunos
+                BEGIN UPDATE geracao SET valor = valor + 1 WHERE escopo = 'alunos'; END;
+                CREATE TRIGGER IF NOT EXISTS trg_geracao_alunos_upd AFTER UPDATE ON alunos
+                BEGIN UPDATE geracao SET valor = valor + 1 WHERE escopo = 'alunos'; END;
+                CREATE TRIGGER IF NOT EXISTS trg_geracao_alunos_del AFTER DELETE ON alunos
+                BEGIN UPDATE geracao SET valor = valor + 1 WHERE escopo = 'alunos'; END;
+                CREATE TRIGGER IF NOT EXISTS trg_geracao_sorteios_ins AFTER INSERT ON sorteios
+                BEGIN UPDATE geracao SET valor = valor + 1 WHERE escopo = 'sorteios'; END;
+                CREATE TRIGGER IF NOT EXISTS trg_geracao_sorteios_upd AFTER UPDATE ON sorteios
+                BEGIN UPDATE geracao SET valor = valor + 1 WHERE escopo = 'sorteios'; END;
+                CREATE TRIGGER IF NOT EXISTS trg_geracao_sorteios_del AFTER DELETE ON sorteios
+                BEGIN UPDATE geracao SET valor = valor + 1 WHERE escopo = 'sorteios'; END;
+                CREATE TRIGGER IF NOT EXISTS trg_geracao_sessao_upd AFTER UPDATE ON sessao
+                BEGIN UPDATE geracao SET valor = valor + 1 WHERE escopo = 'sessao'; END;
+            """)
+            
+            # Uma posição por sessão; substitui o antigo índice não único
+            try:
+                conn.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS idx_sorteios_sessao_posicao ON sorteios(sessao_id, posicao)"
+                )
+                conn.execute("DROP INDEX IF EXISTS idx_sorteios_posicao")
+                conn.commit()
+            except sqlite3.IntegrityError:
+                # Banco antigo com posições duplicadas: sem o índice único nada impede
+                # novas duplicatas, então o app não sobe até os dados serem corrigidos
+                conn.rollback()
+                duplicadas = conn.execute(
+                    "SELECT sessao_id, posicao, COUNT(*) FROM sorteios GROUP BY sessao_id, posicao "
+                    "HAVING COUNT(*) > 1 LIMIT 5"
+                ).fetchall()
+                raise RuntimeError(
+                    f"{self.db_path}: sorteios com posição repetida na mesma sessão impedem o índice único "
+                    f"idx_sorteios_sessao_posicao; corrija (sessao_id, posicao, quantidade): {duplicadas}"
+                ) from None
+            
+            self._init_estatisticas(conn)
+    
+    def _registrar_total_shards(self):
+        """Recusa abrir sem shards um banco cujos participantes estão em shards"""
+        with self.writer.get_connection() as conn:
+            row = conn.execute(SQL["total_shards"]).fetchone()
+        if row is not None and row[0] != 1:
+            raise ValueError(f"Banco criado com {row[0]} shards; abra-o com SHARDS = {row[0]}")
+    
+    def _init_estatisticas(self, conn: sqlite3.Connection):
+        """Contadores mantidos por triggers: leituras O(1), sem COUNT(*)
+        
+        Na primeira criação, as tabelas são preenchidas a partir dos dados
+        existentes, na mesma transação que cria os triggers.
+        """
+        conn.executescript("""
+            BEGIN IMMEDIATE;
+            
+            CREATE TABLE IF NOT EXISTS estatisticas (
+                chave TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS cadastros_por_minuto (
+                minuto TEXT PRIMARY KEY,
+                total INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS sorteios_por_sessao (
+                sessao_id TEXT PRIMARY KEY,
+                total INTEGER NOT NULL DEFAULT 0
+            );
+            
+            -- Carga inicial, só quando as estatísticas ainda não existem
+            INSERT OR IGNORE INTO cadastros_por_minuto (minuto, total)
+                SELECT strftime('%Y-%m-%d %H:%M', created_at, 'localtime'), COUNT(*) FROM alunos
+                WHERE NOT EXISTS (SELECT 1 FROM estatisticas) GROUP BY 1;
+            INSERT OR IGNORE INTO sorteios_por_sessao (sessao_id, total)
+                SELECT sessao_id, COUNT(*) FROM sorteios
+                WHERE NOT EXISTS (SELECT 1 FROM estatisticas) GROUP BY sessao_id;
+            INSERT OR IGNORE INTO estatisticas (chave, valor)
+                SELECT 'alunos_total', COUNT(*) FROM alunos
+                WHERE NOT EXISTS (SELECT 1 FROM estatisticas WHERE chave = 'alunos_total');
+            INSERT OR IGNORE INTO estatisticas (chave, valor)
+                SELECT 'sorteios_total', COUNT(*) FROM sorteios
+                WHERE NOT EXISTS (SELECT 1 FROM estatisticas WHERE chave = 'sorteios_total');
+            INSERT OR IGNORE INTO estatisticas (chave, valor)
+                SELECT 'alunos_arquivados', COUNT(*) FROM alunos_arquivo
+                WHERE NOT EXISTS (SELECT 1 FROM estatisticas WHERE chave = 'alunos_arquivados');
+            
+            -- Bancos de antes dos triggers do arquivo: devolve uma única vez aos totais
+            -- os sorteios que o arquivamento já tinha descontado
+            UPDATE estatisticas SET valor = valor + (SELECT COUNT(*) FROM sorteios_arquivo)
+                WHERE chave = 'sorteios_total'
+                AND NOT EXISTS (SELECT 1 FROM sqlite_master WHERE name = 'trg_stats_sorteios_arquivo_ins');
+            INSERT INTO sorteios_por_sessao (sessao_id, total)
+                SELECT sessao_id, COUNT(*) FROM sorteios_arquivo
+                WHERE NOT EXISTS (SELECT 1 FROM sqlite_master WHERE name = 'trg_stats_sorteios_arquivo_ins')
+                GROUP BY sessao_id
+                ON CONFLICT(sessao_id) DO UPDATE SET total = total + excluded.total;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_stats_alunos_ins AFTER INSERT ON alunos
+            BEGIN
+                UPDATE estatisticas SET valor = valor + 1 WHERE chave = 'alunos_total';
+                INSERT INTO cadastros_por_minuto (minuto, total)
+                VALUES (strftime('%Y-%m-%d %H:%M', 'now', 'localtime'), 1)
+                ON CONFLICT(minuto) DO UPDATE SET total = total + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_stats_alunos_del AFTER DELETE ON alunos
+            BEGIN
+                UPDATE estatisticas SET valor = valor - 1 WHERE chave = 'alunos_total';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_stats_sorteios_ins AFTER INSERT ON sorteios
+            BEGIN
+                UPDATE estatisticas SET valor = valor + 1 WHERE chave = 'sorteios_total';
+                INSERT INTO sorteios_por_sessao (sessao_id, total) VALUES (NEW.sessao_id, 1)
+                ON CONFLICT(sessao_id) DO UPDATE SET total = total + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_stats_sorteios_del AFTER DELETE ON sorteios
+            BEGIN
+                UPDATE estatisticas SET valor = valor - 1 WHERE chave = 'sorteios_total';
+                UPDATE sorteios_por_sessao SET total = total - 1 WHERE sessao_id = OLD.sessao_id;
+            END;
+            -- Arquivar move a linha (insere no arquivo e apaga da tabela quente): os
+            -- sorteios arquivados continuam contando; os participantes arquivados
+            -- saem de alunos_total (que acompanha o snapshot) e contam à parte
+            CREATE TRIGGER IF NOT EXISTS trg_stats_sorteios_arquivo_ins AFTER INSERT ON sorteios_arquivo
+            BEGIN
+                UPDATE estatisticas SET valor = valor + 1 WHERE chave = 'sorteios_total';
+                INSERT INTO sorteios_por_sessao (sessao_id, total) VALUES (NEW.sessao_id, 1)
+                ON CONFLICT(sessao_id) DO UPDATE SET total = total + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_stats_alunos_arquivo_ins AFTER INSERT ON alunos_arquivo
+            BEGIN
+                UPDATE estatisticas SET valor = valor + 1 WHERE chave = 'alunos_arquivados';
+            END;
+            
+            COMMIT;
+        """)
+    
+    def get_geracoes(self) -> Dict[str, int]:
+        with self.readers.get_connection() as conn:
+            return dict(conn.execute(SQL["geracoes"]).fetchall())
+    
+    def email_cadastrado(self, email: str) -> bool:
+        with self.readers.get_connection() as conn:
+            return conn.execute(SQL["email_cadastrado"], (email,)).fetchone() is not None
+    
+    def numero_em_uso(self, numero: int) -> bool:
+        with self.readers.get_connection() as conn:
+            return conn.execute(SQL["numero_em_uso"], (numero,)).fetchone() is not None
+    
+    def inserir_aluno(self, nome: str, email: str, numero: int) -> Tuple[int, int]:
+        with self.writer.get_connection() as conn:
+            try:
+                aluno_id = conn.execute(SQL["inserir_aluno"], (nome, email, numero)).lastrowid
+                geracao = conn.execute(SQL["geracao_alunos"]).fetchone()[0]
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return aluno_id, geracao
+    
+    def listar_alunos(self) -> Tuple[int, List[Tuple]]:
+        with self.readers.get_connection() as conn:
+            # Geração e linhas lidas na mesma transação de leitura
+            conn.execute("BEGIN")
+            try:
+                geracao = conn.execute(SQL["geracao_alunos"]).fetchone()[0]
+                rows = conn.execute(SQL["listar_alunos"]).fetchall()
+            finally:
+                conn.rollback()
+            return geracao, rows
+    
+    def alunos_desde(self, max_ids: Sequence[int]) -> Tuple[int, List[Tuple], int]:
+        with self.readers.get_connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                geracao = conn.execute(SQL["geracao_alunos"]).fetchone()[0]
+                novos = conn.execute(SQL["alunos_desde"], (max_ids[0],)).fetchall()
+                total = conn.execute(SQL["total_alunos"]).fetchone()[0]
+            finally:
+                conn.rollback()
+            return geracao, novos, total
+    
+    def get_estatisticas(self, minutos: int = 30, sessoes: int = 10) -> Dict:
+        with self.readers.get_connection() as conn:
+            totais = dict(conn.execute(SQL["estatisticas"]).fetchall())
+            por_minuto = conn.execute(SQL["cadastros_por_minuto"], (minutos,)).fetchall()
+            por_sessao = conn.execute(SQL["sorteios_por_sessao"], (sessoes,)).fetchall()
+        return {
+            "alunos_total": totais.get("alunos_total", 0),
+            "alunos_arquivados": totais.get("alunos_arquivados", 0),
+            "sorteios_total": totais.get("sorteios_total", 0),
+            "cadastros_por_minuto": por_minuto[::-1],
+            "sorteios_por_sessao": por_sessao
+        }
+    
+    def get_sessao(self) -> Dict:
+        with self.readers.get_connection() as conn:
+            row = conn.execute(SQL["sessao_atual"]).fetchone()
+        return {
+            "ativa": bool(row[0]) if row else False,
+            "sessao_id": row[1] if row else None,
+            "sorteios_count": row[2] if row else 0
+        }
+    
+    def abrir_sessao(self, sessao_id: str, compromisso: Dict):
+        with self.writer.get_connection() as conn:
+            try:
+                conn.execute(SQL["inserir_compromisso"], (
+                    sessao_id, compromisso["seed"], compromisso["seed_hash"], compromisso["participantes"],
+                    compromisso["participantes_hash"], compromisso["total"]
+                ))
+                conn.execute(SQL["abrir_sessao"], (sessao_id,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def fechar_sessao(self):
+        with self.writer.get_connection() as conn:
+            try:
+                conn.execute(SQL["revelar_sessao"])
+                conn.execute(SQL["fechar_sessao"])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def get_compromisso(self, sessao_id: str) -> Optional[Dict]:
+        with self.readers.get_connection() as conn:
+            row = conn.execute(SQL["compromisso"], (sessao_id,)).fetchone()
+        if not row:
+            return None
+        return {
+            "sessao_id": sessao_id, "seed": row[0], "seed_hash": row[1], "participantes": bytes(row[2]),
+            "participantes_hash": row[3], "total": row[4], "revelada": bool(row[5])
+        }
+    
+    def listar_sessoes_reveladas(self) -> List[str]:
+        with self.readers.get_connection() as conn:
+            return [r[0] for r in conn.execute(SQL["sessoes_reveladas"])]
+    
+    def listar_sessoes(self, limite: int = 20) -> List[Dict]:
+        with self.readers.get_connection() as conn:
+            rows = conn.execute(SQL["sessoes_recentes"], (limite,)).fetchall()
+        return [{"sessao_id": r[0], "created_at": r[1], "ended_at": r[2], "participantes": r[3]} for r in rows]
+    
+    def numeros_sorteados(self, sessao_id: str) -> List[int]:
+        with self.readers.get_connection() as conn:
+            return [row[1] for row in conn.execute(SQL["numeros_sorteados"], (sessao_id, sessao_id))]
+    
+    def exportar_sorteios(self) -> List[Tuple]:
+        with self.readers.get_connection() as conn:
+            return conn.execute(SQL["exportar_sorteios"]).fetchall()
+    
+    @staticmethod
+    def _ocupado(erro: sqlite3.OperationalError) -> bool:
+        """SQLITE_BUSY/SQLITE_LOCKED: outro processo segura o lock de escrita"""
+        mensagem = str(erro)
+        return "locked" in mensagem or "busy" in mensagem
+    
+    def registrar_proximo_sorteio(self, sessao_id: str, escolher: Callable[[int, set], Optional[Tuple[int, int]]],
+                                  max_sorteios: int = 3,
+                                  aviso: Optional[Callable[[Dict, int], Tuple[str, str, str]]] = None
+                                  ) -> Optional[Tuple[int, int, int]]:
+        with self.writer.get_connection() as conn:
+            # Espera curta no SQLite; quem controla a espera é o backoff abaixo
+            conn.execute(f"PRAGMA busy_timeout = {self.SORTEIO_BUSY_TIMEOUT_MS}")
+            try:
+                inicio = time.perf_counter()
+                for tentativa in range(1, self.SORTEIO_MAX_TENTATIVAS + 1):
+                    try:
+                        conn.execute("BEGIN IMMEDIATE")
+                    except sqlite3.OperationalError as e:
+                        if not self._ocupado(e) or tentativa == self.SORTEIO_MAX_TENTATIVAS:
+                            raise
+                        self._metrica("incrementar", "sorteio.ocupado")
+                        # Backoff exponencial com jitter total
+                        time.sleep(random.uniform(0, self.SORTEIO_BACKOFF_S * 2 ** (tentativa - 1)))
+                        continue
+                    adquirido = time.perf_counter()
+                    self._metrica("registrar_tempo", "sorteio.espera_lock", adquirido - inicio)
+                    
+                    try:
+                        row = conn.execute(SQL["sessao_atual"]).fetchone()
+                        if not row or not row[0] or row[1] != sessao_id:
+                            conn.rollback()
+                            return None
+                        # Posição pelos sorteios gravados, não só pelo contador: um contador
+                        # atrasado repetiria uma posição já usada
+                        gravadas = conn.execute(SQL["maior_posicao_sessao"], (sessao_id,)).fetchone()[0] or 0
+                        posicao = max(row[2], gravadas) + 1
+                        if posicao > max_sorteios:
+                            conn.rollback()
+                            return None
+                        
+                        sorteados = {r[0] for r in conn.execute(SQL["sorteados_sessao"], (sessao_id,))}
+                        escolhido = escolher(posicao, sorteados)
+                        if escolhido is None:
+                            conn.rollback()
+                            return None
+                        
+                        conn.execute(SQL["inserir_sorteio"], (sessao_id, escolhido[0], escolhido[1], posicao))
+                        conn.execute(SQL["atualizar_contagem"], (posicao,))
+                        if aviso is not None:
+                            # Participante lido pelo get_aluno (nos shards ele mora em outro arquivo)
+                            aluno = self.get_aluno(escolhido[0])
+                            if aluno is not None:
+                                conn.execute(SQL["enfileirar_notificacao"], (*aviso(aluno, posicao), time.time()))
+                        conn.commit()
+                        self._metrica("registrar_tempo", "sorteio.transacao", time.perf_counter() - adquirido)
+                        return posicao, escolhido[0], escolhido[1]
+                    except sqlite3.IntegrityError:
+                        # Com o lock de escrita e a posição relida, um conflito é um bug: sem nova tentativa
+                        conn.rollback()
+                        self._metrica("incrementar", "sorteio.conflitos")
+                        raise
+                    except Exception:
+                        conn.rollback()
+                        raise
+                return None
+            finally:
+                conn.execute(f"PRAGMA busy_timeout = {int(self.writer.timeout * 1000)}")
+    
+    def _metrica(self, operacao: str, nome: str, *args):
+        if self.metrics is not None:
+            getattr(self.metrics, operacao)(nome, *args)
+    
+    def listar_vencedores(self, sessao_id: str) -> List[Dict]:
+        with self.readers.get_connection() as conn:
+            rows = conn.execute(SQL["vencedores"], (sessao_id, sessao_id)).fetchall()
+        return [{"posicao": r[0], "nome": r[1], "numero_sorte": r[2]} for r in rows]
+    
+    def listar_sorteios(self, sessao_id: str) -> List[Tuple[int, int, int]]:
+        with self.readers.get_connection() as conn:
+            return conn.execute(SQL["listar_sorteios"], (sessao_id, sessao_id)).fetchall()
+    
+    def get_aluno(self, aluno_id: int) -> Optional[Dict]:
+        with self.readers.get_connection() as conn:
+            row = conn.execute(SQL["aluno_por_id"], (aluno_id,)).fetchone()
+        return {"id": row[0], "nome": row[1], "email": row[2], "numero_sorte": row[3]} if row else None
+    
+    def buscar_aluno_por_email(self, email: str) -> Optional[Dict]:
+        with self.readers.get_connection() as conn:
+            row = conn.execute(SQL["aluno_por_email"], (email,)).fetchone()
+        return {"id": row[0], "nome": row[1], "email": row[2], "numero_sorte": row[3]} if row else None
+    
+    def contar_alunos(self) -> int:
+        """Total de participantes pelo contador mantido por trigger (O(1))"""
+        with self.readers.get_connection() as conn:
+            return conn.execute(SQL["total_alunos"]).fetchone()[0]
+    
+    def faixa_ids(self) -> Tuple[Optional[int], Optional[int]]:
+        """(menor id, maior id) dos participantes; (None, None) sem participantes"""
+        with self.readers.get_connection() as conn:
+            return conn.execute(SQL["faixa_ids_alunos"]).fetchone()
+    
+    def enfileirar_notificacao(self, destinatario: str, assunto: str, corpo: str):
+        with self.writer.get_connection() as conn:
+            conn.execute(SQL["enfileirar_notificacao"], (destinatario, assunto, corpo, time.time()))
+            conn.commit()
+    
+    def reservar_notificacoes(self, limite: int, agora: float, prazo_s: float) -> List[Dict]:
+        with self.writer.get_connection() as conn:
+            rows = conn.execute(SQL["reservar_notificacoes"], (agora + prazo_s, agora, limite)).fetchall()
+            conn.commit()
+        # RETURNING não garante ordem
+        return [{"id": r[0], "destinatario": r[1], "assunto": r[2], "corpo": r[3], "tentativas": r[4]}
+                for r in sorted(rows)]
+    
+    def adiar_notificacao(self, notificacao_id: int, proxima_tentativa: float, erro: str):
+        with self.writer.get_connection() as conn:
+            conn.execute(SQL["adiar_notificacao"], (proxima_tentativa, erro, notificacao_id))
+            conn.commit()
+    
+    def finalizar_notificacao(self, notificacao_id: int, enviada: bool, erro: Optional[str] = None):
+        with self.writer.get_connection() as conn:
+            conn.execute(SQL["finalizar_notificacao"], ("enviada" if enviada else "falha", erro, notificacao_id))
+            conn.commit()
+    
+    def resumo_notificacoes(self) -> Dict[str, int]:
+        with self.readers.get_connection() as conn:
+            return dict(conn.execute(SQL["resumo_notificacoes"]).fetchall())
+    
+    def get_password_hash(self) -> Optional[str]:
+        with self.readers.get_connection() as conn:
+            row = conn.execute(SQL["hash_senha"]).fetchone()
+        return row[0] if row else None
+    
+    def init_password_hash(self, password_hash: str):
+        with self.writer.get_connection() as conn:
+            conn.execute(SQL["iniciar_hash_senha"], (password_hash,))
+            conn.commit()
+    
+    def set_password_hash(self, password_hash: str):
+        with self.writer.get_connection() as conn:
+            conn.execute(SQL["trocar_hash_senha"], (password_hash,))
+            conn.commit()
+    
+    def podar_estatisticas(self, antes_de: str) -> int:
+        with self.writer.get_connection() as conn:
+            removidos = conn.execute(SQL["podar_cadastros_por_minuto"], (antes_de,)).rowcount
+            conn.commit()
+            return removidos
+    
+    def arquivar_sessoes(self, corte: str, lote: int = 50) -> int:
+        with self.writer.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                sessoes = [row[0] for row in conn.execute(SQL["sessoes_para_arquivar"], (corte, lote))]
+                for sessao_id in sessoes:
+                    for posicao, aluno_id, numero, created_at in conn.execute(
+                        SQL["sorteios_da_sessao"], (sessao_id,)
+                    ).fetchall():
+                        # Nome e email copiados: o participante pode ser arquivado (ou o id reusado) depois
+                        aluno = self.get_aluno(aluno_id) or {}
+                        conn.execute(SQL["inserir_sorteio_arquivo"], (
+                            sessao_id, aluno_id, aluno.get("nome"), aluno.get("email"), numero, posicao, created_at
+                        ))
+                    conn.execute(SQL["remover_sorteios_sessao"], (sessao_id,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return len(sessoes)
+    
+    def arquivar_alunos(self, corte: str, apos_id: int = 0, lote: int = 500) -> Tuple[int, Optional[int]]:
+        with self.writer.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Sessão aberta: a lista congelada pode sortear qualquer participante
+                if conn.execute(SQL["sessao_atual"]).fetchone()[0]:
+                    conn.rollback()
+                    return 0, None
+                ate_id = conn.execute(SQL["limite_alunos_para_arquivar"], (apos_id, corte, lote)).fetchone()[0]
+                if ate_id is None:
+                    conn.rollback()
+                    return 0, None
+                conn.execute(SQL["arquivar_alunos"], (apos_id, ate_id, corte))
+                arquivados = conn.execute(SQL["remover_alunos_arquivados"], (apos_id, ate_id, corte)).rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return arquivados, ate_id
+    
+    def estatisticas_statements(self) -> Dict[str, int]:
+        """Cache de statements dos dois pools"""
+        escrita, leitura = self.writer.estatisticas_statements(), self.readers.estatisticas_statements()
+        return {chave: escrita[chave] + leitura[chave] for chave in escrita}
+    
+    def checkpoint_wal(self) -> Tuple[int, int, int]:
+        """Copia o WAL para o banco e trunca o arquivo -wal"""
+        with self.manutencao.get_connection() as conn:
+            return tuple(conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+    
+    def otimizar(self):
+        """Atualiza estatísticas do planejador de consultas"""
+        with self.manutencao.get_connection() as conn:
+            if conn.execute(SQL["estatisticas_planejador"]).fetchone() is None:
+                conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+    
+    def vacuum_incremental(self, paginas: int = 200) -> int:
+        """Devolve até `paginas` páginas livres ao sistema de arquivos"""
+        with self.manutencao.get_connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+                return 0
+            livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if livres:
+                # executescript executa o pragma até o fim (execute liberaria só uma página)
+                conn.executescript(f"PRAGMA incremental_vacuum({int(paginas)});")
+            return min(livres, paginas)
+    
+    def arquivos_banco(self) -> List[str]:
+        """Arquivos SQLite deste armazenamento, o principal primeiro (conjunto do backup)"""
+        return [self.db_path]
+    
+    def quick_check(self) -> List[str]:
+        with self.readers.get_connection() as conn:
+            return [linha for (linha,) in conn.execute("PRAGMA quick_check") if linha != "ok"]
+    
+    def _sorteios_orfaos(self, conn: sqlite3.Connection, apos_id: int, ate_id: int) -> List[Tuple]:
+        """Sorteios da faixa cujo participante não existe (foreign_keys não é ativado)"""
+        return conn.execute(SQL["sorteios_orfaos"], (apos_id, ate_id)).fetchall()
+    
+    @staticmethod
+    def _problemas_orfaos(orfaos: List[Tuple]) -> List[str]:
+        return [f"Sorteio {sorteio_id} da sessão {sessao_id} aponta para o participante {aluno_id}, que não existe"
+                for sorteio_id, sessao_id, aluno_id in orfaos]
+    
+    def verificar_orfaos(self) -> Dict:
+        with self.readers.get_connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                maior = conn.execute(SQL["maior_id_sorteios"]).fetchone()[0] or 0
+                orfaos = self._sorteios_orfaos(conn, 0, maior)
+            finally:
+                conn.rollback()
+        return {"problemas": self._problemas_orfaos(orfaos), "sessoes": sorted({row[1] for row in orfaos}),
+                "linhas": maior}
+    
+    def verificar_integridade(self) -> Dict:
+        problemas = []
+        sessoes = set()
+        with self.readers.get_connection() as conn:
+            # Uma transação de leitura: todas as consultas veem o mesmo instante
+            conn.execute("BEGIN")
+            try:
+                checkpoint = dict(conn.execute(SQL["checkpoint_integridade"]).fetchall())
+                maior = {
+                    "sorteios": conn.execute(SQL["maior_id_sorteios"]).fetchone()[0] or 0,
+                    "sorteios_arquivo": conn.execute(SQL["maior_id_sorteios_arquivo"]).fetchone()[0] or 0,
+                }
+                # Sem AUTOINCREMENT, o arquivamento pode liberar ids de `sorteios` para reuso
+                if maior["sorteios"] < checkpoint["sorteios"]:
+                    checkpoint["sorteios"] = 0
+                faixa = (checkpoint["sorteios"], maior["sorteios"])
+                faixa_arquivo = (checkpoint["sorteios_arquivo"], maior["sorteios_arquivo"])
+                
+                orfaos = self._sorteios_orfaos(conn, *faixa)
+                problemas += self._problemas_orfaos(orfaos)
+                sessoes.update(row[1] for row in orfaos)
+                # Sessões tocadas: posições 1..n, sem repetição, somando as tabelas viva e de arquivo
+                for (sessao_id,) in conn.execute(SQL["sessoes_na_faixa"], faixa + faixa_arquivo).fetchall():
+                    posicoes = [row[0] for row in conn.execute(SQL["listar_sorteios"], (sessao_id, sessao_id))]
+                    if posicoes != list(range(1, len(posicoes) + 1)):
+                        sessoes.add(sessao_id)
+                        problemas.append(f"Sessão {sessao_id}: posições {posicoes} fora da sequência 1..{len(posicoes)}")
+                
+                contagem = conn.execute(SQL["contagem_sessao_atual"]).fetchone()
+            finally:
+                conn.rollback()
+        
+        # Problemas de linha seguram o checkpoint: continuam sendo apontados até serem corrigidos
+        if not problemas and maior != checkpoint:
+            with self.writer.get_connection() as conn:
+                conn.executemany(SQL["gravar_checkpoint_integridade"], [(ultimo, tabela) for tabela, ultimo in maior.items()])
+                conn.commit()
+        if contagem and contagem[1] != contagem[2]:
+            sessoes.add(contagem[0])
+            problemas.append(f"Sessão {contagem[0]}: sorteios_count = {contagem[1]}, mas há {contagem[2]} sorteios gravados")
+        return {
+            "problemas": problemas, "sessoes": sorted(sessoes),
+            "linhas": (faixa[1] - faixa[0]) + (faixa_arquivo[1] - faixa_arquivo[0])
+        }
+    
+    def close(self):
+        self.readers.close_all()
+        self.writer.close_all()
+        self.manutencao.close_all()
+
+class ShardedSQLiteStorage(SQLiteStorage):
+    """Participantes particionados em N arquivos SQLite pelo hash do email.
+    
+    O arquivo principal (`db_path`) guarda sessões, sorteios, notificações e
+    credenciais; cada shard (`sorteio.shard<i>.db`) tem a própria tabela
+    `alunos` e o próprio escritor, então cadastros em shards diferentes não
+    disputam o mesmo lock. O id global é `id_local * N + i`, e o shard i só
+    emite números da sorte com `numero % N == i`, o que os mantém únicos sem
+    coordenação entre escritores. O número de shards fica gravado no arquivo
+    principal e não pode mudar depois; um banco que já tem participantes no
+    arquivo principal não pode passar a usar shards.
+    """
+    
+    def __init__(self, db_path: str = "sorteio.db", shards: int = 4, max_connections: int = 10,
+                 faixa: Tuple[int, int] = (100_000, 999_999)):
+        self.n = shards
+        self.particoes_id = shards
+        self.FAIXA_NUMEROS = faixa
+        super().__init__(db_path, max_connections)
+        base, extensao = os.path.splitext(db_path)
+        self.shards = [SQLiteStorage(f"{base}.shard{i}{extensao}", max_connections) for i in range(shards)]
+    
+    def _registrar_total_shards(self):
+        with self.writer.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(SQL["total_shards"]).fetchone()
+                if row is None:
+                    # Os participantes do arquivo principal ficariam invisíveis, e os
+                    # sorteios apontam para os ids deles: migrar exigiria renumerar tudo
+                    participantes = conn.execute(SQL["total_alunos"]).fetchone()[0]
+                    if participantes:
+                        raise ValueError(
+                            f"{self.db_path} já tem {participantes} participantes sem shards; "
+                            f"não é possível abri-lo com {self.n} shards"
+                        )
+                    conn.execute("INSERT INTO shards (id, total) VALUES (1, ?)", (self.n,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        total = row[0] if row is not None else self.n
+        if total != self.n:
+            raise ValueError(f"Banco criado com {total} shards; não é possível abri-lo com {self.n}")
+    
+    def shard_do_email(self, email: str) -> int:
+        """Shard do email; hash estável entre processos (o hash() do Python não é)"""
+        return int.from_bytes(hashlib.sha256(email.encode("utf-8")).digest()[:8], "big") % self.n
+    
+    def _id_global(self, shard: int, id_local: int) -> int:
+        return id_local * self.n + shard
+    
+    def _aluno_global(self, shard: int, aluno: Optional[Dict]) -> Optional[Dict]:
+        if aluno is not None:
+            aluno["id"] = self._id_global(shard, aluno["id"])
+        return aluno
+    
+    def get_geracoes(self) -> Dict[str, int]:
+        geracoes = super().get_geracoes()
+        # Soma das gerações dos shards: cresce a cada escrita em qualquer um deles
+        geracoes["alunos"] = sum(shard.get_geracoes()["alunos"] for shard in self.shards)
+        return geracoes
+    
+    def gerar_numero(self, email: str) -> int:
+        shard = self.shard_do_email(email)
+        minimo, maximo = self.FAIXA_NUMEROS
+        primeiro = minimo + (shard - minimo) % self.n
+        return primeiro + self.n * random.randrange((maximo - primeiro) // self.n + 1)
+    
+    def email_cadastrado(self, email: str) -> bool:
+        return self.shards[self.shard_do_email(email)].email_cadastrado(email)
+    
+    def numero_em_uso(self, numero: int) -> bool:
+        return self.shards[numero % self.n].numero_em_uso(numero)
+    
+    def inserir_aluno(self, nome: str, email: str, numero: int) -> Tuple[int, int]:
+        i = self.shard_do_email(email)
+        if numero % self.n != i:
+            raise ValueError("Número da sorte fora da faixa do shard do email")
+        id_local, geracao = self.shards[i].inserir_aluno(nome, email, numero)
+        geracao += sum(shard.get_geracoes()["alunos"] for j, shard in enumerate(self.shards) if j != i)
+        return self._id_global(i, id_local), geracao
+    
+    def listar_alunos(self) -> Tuple[int, List[Tuple]]:
+        geracao = 0
+        listas = []
+        for i, shard in enumerate(self.shards):
+            geracao_shard, rows = shard.listar_alunos()
+            geracao += geracao_shard
+            listas.append([(self._id_global(i, row[0]),) + tuple(row[1:]) for row in rows])
+        # Cada shard já vem ordenado por nome: intercalação em O(n log N)
+        return geracao, list(heapq.merge(*listas, key=lambda row: row[1]))
+    
+    def alunos_desde(self, max_ids: Sequence[int]) -> Tuple[int, List[Tuple], int]:
+        geracao = total = 0
+        novos = []
+        for i, shard in enumerate(self.shards):
+            # Partição i = shard i: o cursor de cada shard é o maior id local já visto nele
+            geracao_shard, rows, total_shard = shard.alunos_desde([(max_ids[i] - i) // self.n])
+            geracao += geracao_shard
+            total += total_shard
+            novos.extend((self._id_global(i, row[0]),) + tuple(row[1:]) for row in rows)
+        novos.sort()
+        return geracao, novos, total
+    
+    def get_estatisticas(self, minutos: int = 30, sessoes: int = 10) -> Dict:
+        estatisticas = super().get_estatisticas(minutos, sessoes)
+        total = arquivados = 0
+        por_minuto: Dict[str, int] = {}
+        for shard in self.shards:
+            do_shard = shard.get_estatisticas(minutos, 0)
+            total += do_shard["alunos_total"]
+            arquivados += do_shard["alunos_arquivados"]
+            for minuto, cadastros in do_shard["cadastros_por_minuto"]:
+                por_minuto[minuto] = por_minuto.get(minuto, 0) + cadastros
+        estatisticas["alunos_total"] = total
+        estatisticas["alunos_arquivados"] = arquivados
+        estatisticas["cadastros_por_minuto"] = sorted(por_minuto.items())[-minutos:] if minutos else []
+        return estatisticas
+    
+    def podar_estatisticas(self, antes_de: str) -> int:
+        return super().podar_estatisticas(antes_de) + sum(shard.podar_estatisticas(antes_de) for shard in self.shards)
+    
+    def listar_vencedores(self, sessao_id: str) -> List[Dict]:
+        vencedores = []
+        for posicao, aluno_id, numero in self.listar_sorteios(sessao_id):
+            aluno = self.get_aluno(aluno_id)
+            vencedores.append({"posicao": posicao, "nome": aluno["nome"] if aluno else "", "numero_sorte": numero})
+        return vencedores
+    
+    def get_aluno(self, aluno_id: int) -> Optional[Dict]:
+        i = aluno_id % self.n
+        return self._aluno_global(i, self.shards[i].get_aluno(aluno_id // self.n))
+    
+    def buscar_aluno_por_email(self, email: str) -> Optional[Dict]:
+        i = self.shard_do_email(email)
+        return self._aluno_global(i, self.shards[i].buscar_aluno_por_email(email))
+    
+    def contar_alunos(self) -> int:
+        return sum(shard.contar_alunos() for shard in self.shards)
+    
+    def exportar_sorteios(self) -> List[Tuple]:
+        # Sorteios vivos não acham o participante no arquivo principal: nome e email vêm do shard
+        linhas = []
+        for linha in super().exportar_sorteios():
+            if linha[2] is None:
+                aluno = self.get_aluno(linha[6]) or {}
+                linha = linha[:2] + (aluno.get("nome"), aluno.get("email")) + linha[4:]
+            linhas.append(linha)
+        return linhas
+    
+    def arquivar_alunos(self, corte: str, apos_id: int = 0, lote: int = 500) -> Tuple[int, Optional[int]]:
+        """Arquiva um lote de um shard por vez; o cursor é o id global do último visto.
+        
+        Os sorteios ficam no arquivo principal, fora do alcance do NOT EXISTS do
+        shard: os candidatos do shard são conferidos no principal, que fica em
+        BEGIN IMMEDIATE durante o lote para que nenhuma sessão abra no meio.
+        O cursor de um shard ainda não visitado é o próprio índice (id local 0).
+        """
+        i, apos_local = apos_id % self.n, apos_id // self.n
+        shard = self.shards[i]
+        with self.writer.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Sessão aberta: a lista congelada pode sortear qualquer participante
+                if conn.execute(SQL["sessao_atual"]).fetchone()[0]:
+                    return 0, None
+                with shard.writer.get_connection() as conn_shard:
+                    conn_shard.execute("BEGIN IMMEDIATE")
+                    try:
+                        locais = [row[0] for row in conn_shard.execute(SQL["ids_alunos_para_arquivar"],
+                                                                       (apos_local, corte, lote))]
+                        if not locais:
+                            conn_shard.rollback()
+                            return 0, (i + 1 if i + 1 < self.n else None)
+                        globais = [local * self.n + i for local in locais]
+                        com_sorteio = {row[0] for row in conn.execute(SQL["alunos_com_sorteio"], (json.dumps(globais),))}
+                        livres = json.dumps([local for local, global_id in zip(locais, globais)
+                                             if global_id not in com_sorteio])
+                        conn_shard.execute(SQL["arquivar_alunos_ids"], (livres,))
+                        arquivados = conn_shard.execute(SQL["remover_alunos_ids"], (livres,)).rowcount
+                        conn_shard.commit()
+                    except Exception:
+                        conn_shard.rollback()
+                        raise
+                return arquivados, globais[-1]
+            finally:
+                # O principal só foi lido: o BEGIN IMMEDIATE serviu de trava contra novas sessões
+                conn.rollback()
+    
+    def amostrar_participante(self, excluidos: set, rng: random.Random = None) -> Optional[Tuple[int, int]]:
+        """Coordenador do sorteio: escolhe o shard com peso proporcional ao seu
+        tamanho e um participante uniforme dentro dele, o que dá a mesma chance
+        a cada participante sem carregar a lista completa. Números em
+        `excluidos` são rejeitados e sorteados de novo; depois de 32 rejeições
+        o sorteio é feito sobre a lista filtrada, como em ParticipantSnapshot.sample.
+        """
+        rng = rng or random
+        tamanhos = [shard.contar_alunos() for shard in self.shards]
+        if not any(tamanhos):
+            return None
+        for _ in range(32):
+            i = rng.choices(range(self.n), weights=tamanhos)[0]
+            escolhido = self._amostrar_no_shard(i, rng)
+            if escolhido is not None and escolhido[1] not in excluidos:
+                return escolhido
+        
+        disponiveis = [(self._id_global(i, row[0]), row[3])
+                       for i, shard in enumerate(self.shards) for row in shard.alunos_desde([0])[1]
+                       if row[3] not in excluidos]
+        return rng.choice(disponiveis) if disponiveis else None
+    
+    def _amostrar_no_shard(self, i: int, rng, tentativas: int = 64) -> Optional[Tuple[int, int]]:
+        """(id global, numero) uniforme no shard i: id aleatório entre o menor e o maior,
+        rejeitado se caiu numa lacuna; esgotadas as tentativas, escolhe na lista do shard
+        """
+        shard = self.shards[i]
+        menor, maior = shard.faixa_ids()
+        if menor is None:
+            return None
+        for _ in range(tentativas):
+            aluno = shard.get_aluno(rng.randint(menor, maior))
+            if aluno is not None:
+                return self._id_global(i, aluno["id"]), aluno["numero_sorte"]
+        rows = shard.alunos_desde([0])[1]
+        if not rows:
+            return None
+        row = rng.choice(rows)
+        return self._id_global(i, row[0]), row[3]
+    
+    def estatisticas_statements(self) -> Dict[str, int]:
+        total = super().estatisticas_statements()
+        for shard in self.shards:
+            do_shard = shard.estatisticas_statements()
+            total = {chave: total[chave] + do_shard[chave] for chave in total}
+        return total
+    
+    def checkpoint_wal(self) -> Tuple[int, int, int]:
+        for shard in self.shards:
+            shard.checkpoint_wal()
+        return super().checkpoint_wal()
+    
+    def otimizar(self):
+        for shard in self.shards:
+            shard.otimizar()
+        super().otimizar()
+    
+    def vacuum_incremental(self, paginas: int = 200) -> int:
+        return super().vacuum_incremental(paginas) + sum(shard.vacuum_incremental(paginas) for shard in self.shards)
+    
+    def arquivos_banco(self) -> List[str]:
+        return super().arquivos_banco() + [shard.db_path for shard in self.shards]
+    
+    def quick_check(self) -> List[str]:
+        problemas = super().quick_check()
+        for i, shard in enumerate(self.shards):
+            problemas += [f"shard {i}: {linha}" for linha in shard.quick_check()]
+        return problemas
+    
+    def _sorteios_orfaos(self, conn: sqlite3.Connection, apos_id: int, ate_id: int) -> List[Tuple]:
+        # Participantes ficam nos shards: consulta um a um (a faixa incremental é pequena e a
+        # busca em todos os sorteios só roda em calmaria)
+        return [row for row in conn.execute(SQL["sorteios_na_faixa"], (apos_id, ate_id)).fetchall()
+                if self.get_aluno(row[2]) is None]
+    
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        super().close()
+
+class MemoryStorage(SorteioStorage):
+    """Armazenamento puramente em memória para testes, carga e eventos efêmeros"""
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._alunos: Dict[int, Tuple] = {}
+        self._por_email: Dict[str, int] = {}
+        self._numeros: set = set()
+        self._sorteios: List[Dict] = []
+        self._sessao = {"ativa": False, "sessao_id": None, "sorteios_count": 0}
+        self._compromissos: Dict[str, Dict] = {}
+        self._password_hash: Optional[str] = None
+        self._geracoes = {"alunos": 0, "sorteios": 0, "sessao": 0}
+        self._next_id = 1
+        self._cadastros_por_minuto: Dict[str, int] = {}
+        self._notificacoes: Dict[int, Dict] = {}
+        self._sorteios_por_sessao: Dict[str, int] = {}
+    
+    def get_geracoes(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._geracoes)
+    
+    def email_cadastrado(self, email: str) -> bool:
+        return email in self._por_email
+    
+    def numero_em_uso(self, numero: int) -> bool:
+        return numero in self._numeros
+    
+    def inserir_aluno(self, nome: str, email: str, numero: int) -> Tuple[int, int]:
+        with self._lock:
+            if email in self._por_email:
+                raise ValueError("UNIQUE constraint failed: alunos.email")
+            if numero in self._numeros:
+                raise ValueError("UNIQUE constraint failed: alunos.numero_sorte")
+            aluno_id = self._next_id
+            self._next_id += 1
+            self._alunos[aluno_id] = (aluno_id, nome, email, numero)
+            self._por_email[email] = aluno_id
+            self._numeros.add(numero)
+            minuto = datetime.now().strftime("%Y-%m-%d %H:%M")
+            self._cadastros_por_minuto[minuto] = self._cadastros_por_minuto.get(minuto, 0) + 1
+            self._geracoes["alunos"] += 1
+            return aluno_id, self._geracoes["alunos"]
+    
+    def listar_alunos(self) -> Tuple[int, List[Tuple]]:
+        with self._lock:
+            rows = sorted(self._alunos.values(), key=lambda r: r[1])
+            return self._geracoes["alunos"], rows
+    
+    def alunos_desde(self, max_ids: Sequence[int]) -> Tuple[int, List[Tuple], int]:
+        with self._lock:
+            novos = [self._alunos[i] for i in sorted(self._alunos) if i > max_ids[0]]
+            return self._geracoes["alunos"], novos, len(self._alunos)
+    
+    def get_estatisticas(self, minutos: int = 30, sessoes: int = 10) -> Dict:
+        with self._lock:
+            return {
+                "alunos_total": len(self._alunos),
+                "alunos_arquivados": 0,
+                "sorteios_total": len(self._sorteios),
+                "cadastros_por_minuto": sorted(self._cadastros_por_minuto.items())[-minutos:],
+                "sorteios_por_sessao": list(self._sorteios_por_sessao.items())[::-1][:sessoes]
+            }
+    
+    def podar_estatisticas(self, antes_de: str) -> int:
+        with self._lock:
+            antigos = [minuto for minuto in self._cadastros_por_minuto if minuto < antes_de]
+            for minuto in antigos:
+                del self._cadastros_por_minuto[minuto]
+            return len(antigos)
+    
+    def get_sessao(self) -> Dict:
+        with self._lock:
+            return dict(self._sessao)
+    
+    def abrir_sessao(self, sessao_id: str, compromisso: Dict):
+        with self._lock:
+            self._compromissos[sessao_id] = dict(compromisso, sessao_id=sessao_id, revelada=False,
+                                                 created_at=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+                                                 ended_at=None)
+            self._sessao = {"ativa": True, "sessao_id": sessao_id, "sorteios_count": 0}
+            self._geracoes["sessao"] += 1
+    
+    def fechar_sessao(self):
+        with self._lock:
+            if self._sessao["ativa"] and self._sessao["sessao_id"] in self._compromissos:
+                self._compromissos[self._sessao["sessao_id"]].update(
+                    revelada=True, ended_at=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+                )
+            self._sessao["ativa"] = False
+            self._geracoes["sessao"] += 1
+    
+    def get_compromisso(self, sessao_id: str) -> Optional[Dict]:
+        with self._lock:
+            compromisso = self._compromissos.get(sessao_id)
+            return dict(compromisso) if compromisso else None
+    
+    def listar_sessoes_reveladas(self) -> List[str]:
+        with self._lock:
+            return [sid for sid, c in self._compromissos.items() if c["revelada"]]
+    
+    def listar_sessoes(self, limite: int = 20) -> List[Dict]:
+        with self._lock:
+            recentes = sorted(self._compromissos.values(), key=lambda c: c["created_at"], reverse=True)[:limite]
+            return [{"sessao_id": c["sessao_id"], "created_at": c["created_at"], "ended_at": c["ended_at"],
+                     "participantes": c["total"]} for c in recentes]
+    
+    def numeros_sorteados(self, sessao_id: str) -> List[int]:
+        with self._lock:
+            return [s["numero_sorte"] for s in sorted(self._sorteios, key=lambda s: s["posicao"])
+                    if s["sessao_id"] == sessao_id]
+    
+    def exportar_sorteios(self) -> List[Tuple]:
+        with self._lock:
+            linhas = []
+            for s in self._sorteios:
+                aluno = self._alunos.get(s["aluno_id"])
+                linhas.append((s["sessao_id"], s["posicao"], aluno[1] if aluno else None, aluno[2] if aluno else None,
+                               s["numero_sorte"], s["created_at"], s["aluno_id"]))
+            return sorted(linhas, key=lambda linha: (linha[5], linha[1]))
+    
+    def registrar_proximo_sorteio(self, sessao_id: str, escolher: Callable[[int, set], Optional[Tuple[int, int]]],
+                                  max_sorteios: int = 3,
+                                  aviso: Optional[Callable[[Dict, int], Tuple[str, str, str]]] = None
+                                  ) -> Optional[Tuple[int, int, int]]:
+        with self._lock:
+            sessao = self._sessao
+            if not sessao["ativa"] or sessao["sessao_id"] != sessao_id or sessao["sorteios_count"] >= max_sorteios:
+                return None
+            
+            posicao = sessao["sorteios_count"] + 1
+            sorteados = {s["numero_sorte"] for s in self._sorteios if s["sessao_id"] == sessao_id}
+            escolhido = escolher(posicao, sorteados)
+            if escolhido is None:
+                return None
+            
+            self._sorteios.append({
+                "sessao_id": sessao_id, "aluno_id": escolhido[0], "numero_sorte": escolhido[1], "posicao": posicao,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+            })
+            sessao["sorteios_count"] = posicao
+            self._sorteios_por_sessao[sessao_id] = self._sorteios_por_sessao.get(sessao_id, 0) + 1
+            aluno = self.get_aluno(escolhido[0]) if aviso is not None else None
+            if aluno is not None:
+                self.enfileirar_notificacao(*aviso(aluno, posicao))
+            self._geracoes["sorteios"] += 1
+            self._geracoes["sessao"] += 1
+            return posicao, escolhido[0], escolhido[1]
+    
+    def listar_vencedores(self, sessao_id: str) -> List[Dict]:
+        with self._lock:
+            return [
+                {"posicao": s["posicao"], "nome": self._alunos[s["aluno_id"]][1], "numero_sorte": s["numero_sorte"]}
+                for s in sorted(self._sorteios, key=lambda s: s["posicao"])
+                if s["sessao_id"] == sessao_id and s["aluno_id"] in self._alunos
+            ]
+    
+    def listar_sorteios(self, sessao_id: str) -> List[Tuple[int, int, int]]:
+        with self._lock:
+            return [(s["posicao"], s["aluno_id"], s["numero_sorte"])
+                    for s in sorted(self._sorteios, key=lambda s: s["posicao"]) if s["sessao_id"] == sessao_id]
+    
+    def get_aluno(self, aluno_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._alunos.get(aluno_id)
+        return {"id": row[0], "nome": row[1], "email": row[2], "numero_sorte": row[3]} if row else None
+    
+    def buscar_aluno_por_email(self, email: str) -> Optional[Dict]:
+        with self._lock:
+            aluno_id = self._por_email.get(email)
+        return self.get_aluno(aluno_id) if aluno_id is not None else None
+    
+    def enfileirar_notificacao(self, destinatario: str, assunto: str, corpo: str):
+        with self._lock:
+            notificacao_id = len(self._notificacoes) + 1
+            self._notificacoes[notificacao_id] = {
+                "id": notificacao_id, "destinatario": destinatario, "assunto": assunto, "corpo": corpo,
+                "status": "pendente", "tentativas": 0, "proxima_tentativa": time.time(), "ultimo_erro": None
+            }
+    
+    def reservar_notificacoes(self, limite: int, agora: float, prazo_s: float) -> List[Dict]:
+        with self._lock:
+            vencidas = sorted(
+                (n for n in self._notificacoes.values()
+                 if n["status"] in ("pendente", "enviando") and n["proxima_tentativa"] <= agora),
+                key=lambda n: n["proxima_tentativa"]
+            )[:limite]
+            for n in vencidas:
+                n.update(status="enviando", proxima_tentativa=agora + prazo_s)
+            return [{k: n[k] for k in ("id", "destinatario", "assunto", "corpo", "tentativas")}
+                    for n in sorted(vencidas, key=lambda n: n["id"])]
+    
+    def adiar_notificacao(self, notificacao_id: int, proxima_tentativa: float, erro: str):
+        with self._lock:
+            notificacao = self._notificacoes[notificacao_id]
+            notificacao.update(status="pendente", tentativas=notificacao["tentativas"] + 1,
+                               proxima_tentativa=proxima_tentativa, ultimo_erro=erro)
+    
+    def finalizar_notificacao(self, notificacao_id: int, enviada: bool, erro: Optional[str] = None):
+        with self._lock:
+            notificacao = self._notificacoes[notificacao_id]
+            notificacao.update(status="enviada" if enviada else "falha", tentativas=notificacao["tentativas"] + 1,
+                               ultimo_erro=erro)
+    
+    def resumo_notificacoes(self) -> Dict[str, int]:
+        with self._lock:
+            resumo: Dict[str, int] = {}
+            for notificacao in self._notificacoes.values():
+                resumo[notificacao["status"]] = resumo.get(notificacao["status"], 0) + 1
+            return resumo
+    
+    def get_password_hash(self) -> Optional[str]:
+        return self._password_hash
+    
+    def init_password_hash(self, password_hash: str):
+        with self._lock:
+            if self._password_hash is None:
+                self._password_hash = password_hash
+    
+    def set_password_hash(self, password_hash: str):
+        with self._lock:
+            self._password_hash = password_hash
+
+class OptimizedSorteioSystem:
+    """Sistema otimizado de sorteio com pooling e cache"""
+    
+    def __init__(self, db_path="sorteio.db", storage: Optional[SorteioStorage] = None):
+        self.db_path = db_path
+        if storage is None:
+            shards = int(get_config("SHARDS", 1))
+            storage = ShardedSQLiteStorage(db_path, shards) if shards > 1 else SQLiteStorage(db_path)
+        self.storage = storage
+        self.cache = CacheManager()
+        self.metrics = MetricsRegistry()
+        if self.storage.metrics is None:
+            self.storage.metrics = self.metrics
+        self.render = RenderCache(self.cache, self.metrics)
+        self.security = SecurityManager(self.storage, self.metrics)
+        self.atividade = ActivityMonitor()
+        self.scheduler: Optional[MaintenanceScheduler] = None
+        self.backup: Optional[BackupManager] = None
+        if isinstance(self.storage, SQLiteStorage):
+            self.backup = BackupManager(self.storage.arquivos_banco(), self.metrics)
+        self.notificador = NotificationWorker.from_config(self.storage, self.metrics)
+        self.retencao = RetentionManager.from_config(self.storage, self.metrics)
+        self.integridade = IntegrityMonitor(self.storage, self.metrics)
+        self.api: Optional[JsonApiServer] = None
+        self._last_action_time = {}
+        self._snapshot: Optional[ParticipantSnapshot] = None
+        self._snapshot_lock = threading.Lock()
+        self._ordens: Dict[str, SeededDrawOrder] = {}
+        # Por cliente o limite geral é folgado, já que um IP pode ser o NAT de um evento
+        # inteiro; consultas sem resultado (o que uma enumeração de emails gera) têm um
+        # orçamento apertado à parte
+        self.limite_consultas_cliente = RateLimiter(
+            capacidade=30, por_minuto=float(get_config("CONSULTA_LIMITE_POR_MINUTO", 120)))
+        self.limite_consultas_vazias = RateLimiter(
+            capacidade=5, por_minuto=float(get_config("CONSULTA_VAZIAS_POR_MINUTO", 3)))
+        self._consultas: "OrderedDict[str, Tuple[int, Optional[Dict]]]" = OrderedDict()
+        self._consultas_lock = threading.Lock()
+        self._consultas_max = 512
+        self.memoria = MemoryAccountant(
+            self.metrics,
+            orcamento_bytes=int(float(get_config("MEMORIA_ORCAMENTO_MB", 256)) * 1024 * 1024),
+            tracemalloc_top=int(get_config("MEMORIA_TRACEMALLOC_TOP", 0))
+        )
+        self._registrar_memoria()
+        self._geracoes_cache = {}
+        self._geracoes_lidas_em = 0.0
+        self._geracao_intervalo = 0.25  # segundos entre leituras da geração
+        self._debounce_delay = 1.0  # segundos
+    
+    def get_geracoes(self, force: bool = False) -> Dict[str, int]:
+        """Gerações atuais dos dados, compartilhadas por todos os processos.
+        
+        A leitura é uma consulta por chave primária e é reaproveitada por
+        alguns milissegundos para não repetir o acesso várias vezes no mesmo rerun.
+        """
+        now = time.time()
+        if not force and now - self._geracoes_lidas_em < self._geracao_intervalo:
+            return self._geracoes_cache
+        
+        geracoes = self.storage.get_geracoes()
+        
+        self._geracoes_cache = geracoes
+        self._geracoes_lidas_em = now
+        return geracoes
+    
+    def _marcar_escrita_local(self):
+        """Força a próxima leitura da geração após uma escrita deste processo"""
+        self._geracoes_lidas_em = 0.0
+    
+    def registrar_atividade(self):
+        """Registra uma requisição (rerun) para a detecção de calmaria"""
+        self.atividade.registrar()
     
     def _debounce_action(self, action_key: str) -> bool:
         """Implementa debouncing para evitar spam de ações"""
@@ -415,12 +3396,7 @@ class OptimizedSorteioSystem:
         self._last_action_time[action_key] = now
         return True
     
-    def _get_prepared_statement(self, conn, key: str, query: str):
-        """Cache de prepared statements"""
-        if key not in self._prepared_statements:
-            self._prepared_statements[key] = query
-        return conn.execute(query)
-    
+    @cronometrado("motor.cadastrar_aluno")
     def cadastrar_aluno(self, nome: str, email: str) -> Tuple[bool, str, int]:
         """Cadastra novo aluno com debouncing"""
         if not self._debounce_action(f"cadastro_{email}"):
@@ -429,86 +3405,143 @@ class OptimizedSorteioSystem:
         try:
             nome, email = nome.strip(), email.strip().lower()
             
-            with self.pool.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Verificar email existente com índice otimizado
-                if cursor.execute("SELECT 1 FROM alunos WHERE email = ? LIMIT 1", (email,)).fetchone():
-                    return False, "Email já cadastrado!", 0
-                
-                # Gerar número único eficientemente
-                max_attempts = 100
-                for _ in range(max_attempts):
-                    numero = random.randint(1000, 9999)
-                    if not cursor.execute("SELECT 1 FROM alunos WHERE numero_sorte = ? LIMIT 1", (numero,)).fetchone():
-                        break
-                else:
-                    return False, "Erro ao gerar número único. Tente novamente.", 0
-                
-                # Inserir aluno
-                cursor.execute("INSERT INTO alunos (nome, email, numero_sorte) VALUES (?, ?, ?)", 
-                             (nome, email, numero))
-                conn.commit()
-                
-                # Invalidar caches relacionados
-                self.cache.invalidate("alunos")
-                
-                return True, "Cadastrado com sucesso!", numero
-                
+            # Verificar email existente com índice otimizado
+            if self.storage.email_cadastrado(email):
+                return False, "Email já cadastrado!", 0
+            
+            # Gerar número único eficientemente
+            max_attempts = 100
+            for _ in range(max_attempts):
+                numero = self.storage.gerar_numero(email)
+                if not self.storage.numero_em_uso(numero):
+                    break
+            else:
+                return False, "Erro ao gerar número único. Tente novamente.", 0
+            
+            # Inserir aluno
+            aluno_id, geracao = self.storage.inserir_aluno(nome, email, numero)
+            
+            # Atualizar snapshot incrementalmente se ninguém mais escreveu no meio
+            self._marcar_escrita_local()
+            snapshot = self._snapshot
+            if snapshot is not None:
+                snapshot.adicionar(aluno_id, nome, email, numero, versao=geracao)
+            
+            return True, "Cadastrado com sucesso!", numero
+            
         except Exception as e:
             return False, f"Erro: {str(e)}", 0
     
-    @lru_cache(maxsize=1)
-    def _get_alunos_count(self) -> int:
-        """Cache do total de alunos"""
-        with self.pool.get_connection() as conn:
-            return conn.execute("SELECT COUNT(*) FROM alunos").fetchone()[0]
-    
-    def get_alunos(self, force_refresh: bool = False) -> List[Dict]:
-        """Lista alunos com cache inteligente"""
-        cache_key = "alunos_list"
-        
-        if not force_refresh:
-            cached = self.cache.get(cache_key, ttl_seconds=300)  # 5 min cache
-            if cached is not None:
-                return cached
+    @cronometrado("motor.get_snapshot")
+    def get_snapshot(self, force_refresh: bool = False) -> ParticipantSnapshot:
+        """Snapshot compacto compartilhado, construído uma vez por geração dos dados"""
+        geracao = self.get_geracoes(force=force_refresh)["alunos"]
+        snapshot = self._snapshot
+        if snapshot is not None and not force_refresh and snapshot.versao == geracao:
+            return snapshot
         
-        with self.pool.get_connection() as conn:
-            cursor = conn.cursor()
-            rows = cursor.execute(
-                "SELECT id, nome, email, numero_sorte FROM alunos ORDER BY nome"
-            ).fetchall()
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if snapshot is not None and not force_refresh and snapshot.versao == geracao:
+                return snapshot
             
-            result = [{"id": r[0], "nome": r[1], "email": r[2], "numero_sorte": r[3]} for r in rows]
+            if snapshot is not None and not force_refresh:
+                # Outro processo apenas inseriu? Aplica só as linhas novas. Cada inserção
+                # avança a geração em 1: se ela andou mais, houve UPDATE ou DELETE no meio
+                versao_anterior = snapshot.versao
+                geracao, novos, total = self.storage.alunos_desde(list(snapshot.max_ids))
+                if geracao - versao_anterior == len(novos) and total == len(snapshot) + len(novos):
+                    snapshot.aplicar(novos, geracao)
+                    return snapshot
             
-        self.cache.set(cache_key, result)
+            geracao, rows = self.storage.listar_alunos()
+            snapshot = ParticipantSnapshot.from_rows(rows, geracao, self.storage.particoes_id)
+            
+            self._snapshot = snapshot
+            return snapshot
+    
+    def get_alunos(self, force_refresh: bool = False) -> List[Dict]:
+        """Lista alunos a partir do snapshot compartilhado"""
+        return self.get_snapshot(force_refresh).as_dicts()
+    
+    @cronometrado("motor.get_estatisticas")
+    def get_estatisticas(self) -> Dict:
+        """Estatísticas do painel, lidas dos contadores mantidos pelo banco"""
+        geracoes = self.get_geracoes()
+        versao = (geracoes["alunos"], geracoes["sorteios"])
+        cached = self.cache.get("estatisticas", ttl_seconds=60, geracao=versao)
+        if cached is not None:
+            return cached
+        
+        result = self.storage.get_estatisticas()
+        self.cache.set("estatisticas", result, geracao=versao)
         return result
     
+    @cronometrado("motor.consultar_numero")
+    def consultar_numero(self, email: str, cliente: str) -> Tuple[bool, str, Optional[Dict]]:
+        """Consulta pública "qual é o meu número?" com limite por cliente
+        
+        Devolve só o número da sorte, nunca o nome. Cada consulta sem resultado
+        gasta o orçamento apertado de `limite_consultas_vazias` do cliente; sem
+        orçamento, a consulta é recusada antes de tocar no banco, o que limita a
+        enumeração de emails cadastrados.
+        
+        Responde pelo índice único de email através de um LRU pequeno de chaves
+        quentes. Cada resultado vale só para a geração de 'alunos' em que foi
+        obtido: um participante arquivado ou excluído deixa de aparecer.
+        """
+        email = email.strip().lower()
+        espera = self.limite_consultas_vazias.espera(cliente)
+        if espera == 0 and not self.limite_consultas_cliente.permitir(cliente):
+            espera = self.limite_consultas_cliente.espera(cliente)
+        if espera > 0:
+            self.metrics.incrementar("consulta.bloqueadas")
+            return False, f"Muitas consultas. Tente novamente em {math.ceil(espera)} s.", None
+        
+        geracao = self.get_geracoes()["alunos"]
+        
+        with self._consultas_lock:
+            entrada = self._consultas.get(email)
+            if entrada is not None and entrada[0] == geracao:
+                self._consultas.move_to_end(email)
+                self.metrics.incrementar("consulta.hits")
+                resultado = entrada[1]
+            else:
+                entrada = None
+        
+        if entrada is None:
+            self.metrics.incrementar("consulta.misses")
+            aluno = self.storage.buscar_aluno_por_email(email)
+            resultado = {"numero_sorte": aluno["numero_sorte"]} if aluno else None
+            with self._consultas_lock:
+                self._consultas[email] = (geracao, resultado)
+                self._consultas.move_to_end(email)
+                while len(self._consultas) > self._consultas_max:
+                    self._consultas.popitem(last=False)
+        
+        if resultado is None:
+            self.metrics.incrementar("consulta.vazias")
+            self.limite_consultas_vazias.permitir(cliente)
+        return True, "", resultado
+    
+    @cronometrado("motor.get_status_sessao")
     def get_status_sessao(self, use_cache: bool = True) -> Dict:
         """Status da sessão com cache"""
         cache_key = "status_sessao"
+        geracao = self.get_geracoes()["sessao"]
         
         if use_cache:
-            cached = self.cache.get(cache_key, ttl_seconds=30)  # 30s cache
+            cached = self.cache.get(cache_key, ttl_seconds=300, geracao=geracao)
             if cached is not None:
                 return cached
         
-        with self.pool.get_connection() as conn:
-            cursor = conn.cursor()
-            row = cursor.execute(
-                "SELECT ativa, sessao_id, sorteios_count FROM sessao WHERE id = 1"
-            ).fetchone()
-            
-            result = {
-                "ativa": bool(row[0]) if row else False,
-                "sessao_id": row[1] if row else None,
-                "sorteios_count": row[2] if row else 0
-            }
+        result = self.storage.get_sessao()
         
         if use_cache:
-            self.cache.set(cache_key, result)
+            self.cache.set(cache_key, result, geracao=geracao)
         return result
     
+    @cronometrado("motor.iniciar_sessao")
     def iniciar_sessao(self) -> str:
         """Inicia nova sessão com cache invalidation"""
         if not self._debounce_action("iniciar_sessao"):
@@ -516,78 +3549,149 @@ class OptimizedSorteioSystem:
         
         sessao_id = hashlib.md5(str(datetime.now()).encode()).hexdigest()[:8]
         
-        with self.pool.get_connection() as conn:
-            conn.execute("""
-                UPDATE sessao SET ativa = TRUE, sessao_id = ?, sorteios_count = 0, 
-                created_at = CURRENT_TIMESTAMP, ended_at = NULL WHERE id = 1
-            """, (sessao_id,))
-            conn.commit()
+        # Congela os elegíveis e compromete a sessão com o hash de uma semente secreta
+        self.get_geracoes(force=True)
+        ids, numeros = self.get_snapshot().congelar()
+        participantes = SeededDrawOrder.codificar_participantes(ids, numeros)
+        seed = SeededDrawOrder.gerar_seed()
+        compromisso = {
+            "seed": seed,
+            "seed_hash": SeededDrawOrder.hash_seed(seed),
+            "participantes": participantes,
+            "participantes_hash": hashlib.sha256(participantes).hexdigest(),
+            "total": len(ids)
+        }
+        self.storage.abrir_sessao(sessao_id, compromisso)
+        self._ordens = {sessao_id: SeededDrawOrder(seed, ids, numeros)}
         
         # Invalidar caches
+        self._marcar_escrita_local()
         self.cache.invalidate("status_sessao")
         self.cache.invalidate("vencedores")
         
         return sessao_id
     
+    @cronometrado("motor.sortear")
     def sortear(self) -> Tuple[bool, Dict]:
         """Realiza sorteio otimizado"""
         if not self._debounce_action("sortear"):
             return False, {}
         
-        status = self.get_status_sessao(use_cache=False)  # Força refresh
-        
-        if not status["ativa"] or status["sorteios_count"] >= 3:
-            return False, {}
-        
-        with self.pool.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Query otimizada para números já sorteados
-            sorteados_query = """
-                SELECT numero_sorte FROM sorteios 
-                WHERE sessao_id = ? 
-                ORDER BY posicao
-            """
-            sorteados = [row[0] for row in cursor.execute(sorteados_query, (status["sessao_id"],))]
-            
-            # Query otimizada para vencedor com LIMIT
-            if sorteados:
-                placeholders = ",".join("?" * len(sorteados))
-                query = f"""
-                    SELECT id, nome, numero_sorte FROM alunos 
-                    WHERE numero_sorte NOT IN ({placeholders}) 
-                    ORDER BY RANDOM() LIMIT 1
-                """
-                vencedor = cursor.execute(query, sorteados).fetchone()
-            else:
-                vencedor = cursor.execute(
-                    "SELECT id, nome, numero_sorte FROM alunos ORDER BY RANDOM() LIMIT 1"
-                ).fetchone()
+        with self.atividade.operacao_critica():
+            status = self.get_status_sessao(use_cache=False)  # Força refresh
             
-            if not vencedor:
+            if not status["ativa"] or status["sorteios_count"] >= 3:
                 return False, {}
             
-            # Inserir resultado em transação única
-            posicao = status["sorteios_count"] + 1
-            cursor.execute("""
-                INSERT INTO sorteios (sessao_id, aluno_id, numero_sorte, posicao) 
-                VALUES (?, ?, ?, ?)
-            """, (status["sessao_id"], vencedor[0], vencedor[2], posicao))
+            sessao_id = status["sessao_id"]
+            ordem = self._get_ordem(sessao_id)
             
-            cursor.execute("UPDATE sessao SET sorteios_count = ? WHERE id = 1", (posicao,))
-            conn.commit()
+            def escolher(posicao: int, sorteados: set) -> Optional[Tuple[int, int]]:
+                if ordem is not None:
+                    # Próxima posição da ordem pré-comprometida: O(1)
+                    return ordem.vencedor(posicao)
+                # Sessão sem compromisso (aberta antes desta versão): amostra
+                if isinstance(self.storage, ShardedSQLiteStorage):
+                    return self.storage.amostrar_participante(sorteados)
+                amostra = self.get_snapshot().sample(sorteados)
+                return (amostra["id"], amostra["numero_sorte"]) if amostra else None
+            
+            # Posição, escolha, gravação e aviso ao vencedor na mesma transação exclusiva
+            aviso = self._aviso_vencedor if self.notificador is not None else None
+            resultado = self.storage.registrar_proximo_sorteio(sessao_id, escolher, max_sorteios=3, aviso=aviso)
+            if resultado is None:
+                return False, {}
+            posicao, aluno_id, numero = resultado
+            aluno = self.storage.get_aluno(aluno_id)
+            if aviso is not None:
+                self.metrics.incrementar("notificacoes.enfileiradas")
+                self.notificador.acordar()
             
             # Invalidar caches
+            self._marcar_escrita_local()
             self.cache.invalidate("status_sessao")
             self.cache.invalidate("vencedores")
             
             return True, {
-                "id": vencedor[0], 
-                "nome": vencedor[1], 
-                "numero_sorte": vencedor[2], 
+                "sessao_id": sessao_id,
+                "id": aluno_id, 
+                "nome": aluno["nome"] if aluno else "", 
+                "numero_sorte": numero, 
                 "posicao": posicao
             }
     
+    @staticmethod
+    def _aviso_vencedor(aluno: Dict, posicao: int) -> Tuple[str, str, str]:
+        """(destinatario, assunto, corpo) do aviso ao vencedor; o envio fica com o worker"""
+        return (
+            aluno["email"],
+            f"🎉 Você foi sorteado(a) em {posicao}º lugar!",
+            f"Olá, {aluno['nome']}!\n\n"
+            f"Seu número da sorte {aluno['numero_sorte']:04d} foi sorteado em {posicao}º lugar "
+            f"no Sorteio Eletrônico.\n\nParabéns!"
+        )
+    
+    def _get_ordem(self, sessao_id: str) -> Optional[SeededDrawOrder]:
+        """Ordem pré-comprometida da sessão (carregada uma vez por processo)"""
+        ordem = self._ordens.get(sessao_id)
+        if ordem is None:
+            compromisso = self.storage.get_compromisso(sessao_id)
+            if compromisso is None:
+                return None
+            ordem = SeededDrawOrder.from_compromisso(compromisso)
+            self._ordens = {sessao_id: ordem}
+        return ordem
+    
+    def get_compromisso_publico(self, sessao_id: str) -> Optional[Dict]:
+        """Dados publicáveis do compromisso; a semente só aparece após o encerramento"""
+        geracao = self.get_geracoes()["sessao"]
+        cache_key = f"compromisso_{sessao_id}"
+        cached = self.cache.get(cache_key, ttl_seconds=3600, geracao=geracao)
+        if cached is not None:
+            return cached
+        
+        compromisso = self.storage.get_compromisso(sessao_id)
+        if compromisso is None:
+            return None
+        result = {
+            "sessao_id": sessao_id,
+            "seed_hash": compromisso["seed_hash"],
+            "participantes_hash": compromisso["participantes_hash"],
+            "total": compromisso["total"],
+            "seed": compromisso["seed"] if compromisso["revelada"] else None
+        }
+        self.cache.set(cache_key, result, geracao=geracao)
+        return result
+    
+    def verificar_sessao(self, sessao_id: str, seed: Optional[str] = None) -> Dict:
+        """Refaz a ordem da sessão a partir da semente revelada e confere os sorteios gravados"""
+        compromisso = self.storage.get_compromisso(sessao_id)
+        if compromisso is None:
+            return {"sessao_id": sessao_id, "ok": False, "erros": ["Sessão sem compromisso registrado"]}
+        
+        seed = seed if seed is not None else (compromisso["seed"] if compromisso["revelada"] else None)
+        if seed is None:
+            return {"sessao_id": sessao_id, "ok": False, "erros": ["Semente ainda não revelada"]}
+        
+        erros = []
+        if SeededDrawOrder.hash_seed(seed) != compromisso["seed_hash"]:
+            erros.append("Semente não confere com o hash publicado")
+        if hashlib.sha256(compromisso["participantes"]).hexdigest() != compromisso["participantes_hash"]:
+            erros.append("Lista de participantes não confere com o hash publicado")
+        
+        ordem = SeededDrawOrder(seed, *SeededDrawOrder.decodificar_participantes(compromisso["participantes"]))
+        sorteios = self.storage.listar_sorteios(sessao_id)
+        for posicao, aluno_id, numero in sorteios:
+            if ordem.vencedor(posicao) != (aluno_id, numero):
+                erros.append(f"{posicao}º lugar não corresponde à ordem comprometida")
+        
+        return {"sessao_id": sessao_id, "ok": not erros, "erros": erros, "sorteios": len(sorteios)}
+    
+    def verificar_sessoes(self) -> List[Dict]:
+        """Verificação em lote de todas as sessões com semente revelada"""
+        return [self.verificar_sessao(sessao_id) for sessao_id in self.storage.listar_sessoes_reveladas()]
+    
+    @cronometrado("motor.encerrar_sessao")
     def encerrar_sessao(self) -> List[Dict]:
         """Encerra sessão otimizada"""
         if not self._debounce_action("encerrar_sessao"):
@@ -597,137 +3701,505 @@ class OptimizedSorteioSystem:
         if not status["ativa"]:
             return []
         
-        with self.pool.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Query otimizada com JOIN
-            vencedores = cursor.execute("""
-                SELECT s.posicao, a.nome, s.numero_sorte
-                FROM sorteios s 
-                INNER JOIN alunos a ON s.aluno_id = a.id
-                WHERE s.sessao_id = ? 
-                ORDER BY s.posicao
-            """, (status["sessao_id"],)).fetchall()
-            
-            # Encerrar sessão
-            cursor.execute(
-                "UPDATE sessao SET ativa = FALSE, ended_at = CURRENT_TIMESTAMP WHERE id = 1"
-            )
-            conn.commit()
-            
-            # Invalidar caches
-            self.cache.invalidate()
-            
-            return [{"posicao": r[0], "nome": r[1], "numero_sorte": r[2]} for r in vencedores]
+        vencedores = self.storage.listar_vencedores(status["sessao_id"])
+        
+        # Encerrar sessão
+        self.storage.fechar_sessao()
+        
+        # Invalidar caches
+        self._marcar_escrita_local()
+        self.cache.invalidate()
+        
+        return vencedores
     
+    @cronometrado("motor.get_vencedores_sessao_atual")
     def get_vencedores_sessao_atual(self, use_cache: bool = True) -> List[Dict]:
         """Vencedores com cache"""
         status = self.get_status_sessao()
         if not status["sessao_id"]:
             return []
-        
-        cache_key = f"vencedores_{status['sessao_id']}"
+        return self.get_vencedores_sessao(status["sessao_id"], use_cache)
+    
+    def get_vencedores_sessao(self, sessao_id: str, use_cache: bool = True) -> List[Dict]:
+        """Vencedores de uma sessão qualquer, compartilhados entre todos os espectadores"""
+        cache_key = f"vencedores_{sessao_id}"
+        geracao = self.get_geracoes()["sorteios"]
         
         if use_cache:
-            cached = self.cache.get(cache_key, ttl_seconds=60)
+            cached = self.cache.get(cache_key, ttl_seconds=3600, geracao=geracao)
             if cached is not None:
                 return cached
         
-        with self.pool.get_connection() as conn:
-            cursor = conn.cursor()
-            rows = cursor.execute("""
-                SELECT s.posicao, a.nome, s.numero_sorte
-                FROM sorteios s 
-                INNER JOIN alunos a ON s.aluno_id = a.id
-                WHERE s.sessao_id = ? 
-                ORDER BY s.posicao
-            """, (status["sessao_id"],)).fetchall()
-            
-            result = [{"posicao": r[0], "nome": r[1], "numero_sorte": r[2]} for r in rows]
+        result = self.storage.listar_vencedores(sessao_id)
         
         if use_cache:
-            self.cache.set(cache_key, result)
+            self.cache.set(cache_key, result, geracao=geracao)
         return result
     
+    def get_sessoes_anteriores(self, limite: int = 10) -> List[Dict]:
+        """Sessões já encerradas, das mais recentes para as mais antigas, com os vencedores"""
+        cache_key = "sessoes_anteriores"
+        geracao = self.get_geracoes()["sessao"]
+        sessoes = self.cache.get(cache_key, ttl_seconds=300, geracao=geracao)
+        if sessoes is None:
+            sessoes = [s for s in self.storage.listar_sessoes(limite + 1) if s["ended_at"]][:limite]
+            self.cache.set(cache_key, sessoes, geracao=geracao)
+        return [dict(s, vencedores=self.get_vencedores_sessao(s["sessao_id"])) for s in sessoes]
+    
+    @staticmethod
+    def _celula_csv(valor):
+        # Texto iniciado por = + - @ (ou tab/CR, que algumas planilhas descartam antes) vira fórmula
+        if isinstance(valor, str) and valor[:1] in ("=", "+", "-", "@", "\t", "\r"):
+            return "'" + valor
+        return valor
+    
+    def exportar_historico_csv(self) -> str:
+        """Todos os sorteios (vivos e arquivados) em CSV"""
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(["sessao_id", "posicao", "nome", "email", "numero_sorte", "sorteado_em_utc"])
+        for linha in self.storage.exportar_sorteios():
+            escritor.writerow([self._celula_csv(valor) for valor in linha[:6]])
+        return buffer.getvalue()
+    
     def cleanup_resources(self):
         """Limpa recursos para economia de memória"""
         self.cache.cleanup_expired()
-        self._prepared_statements.clear()
         
         # Limpa ações antigas
         current_time = time.time()
         old_actions = [
-            k for k, t in self._last_action_time.items() 
+            k for k, t in list(self._last_action_time.items()) 
             if current_time - t > 3600  # 1 hora
         ]
         for key in old_actions:
-            del self._last_action_time[key]
+            self._last_action_time.pop(key, None)
+    
+    def _registrar_memoria(self):
+        """Estruturas em processo medidas pela contabilidade de memória (menor prioridade sai primeiro)"""
+        tamanho = MemoryAccountant.tamanho_profundo
+        
+        def medir_cache() -> int:
+            with self.cache._lock:
+                return tamanho([self.cache._cache, self.cache._timestamps, self.cache._geracoes])
+        
+        def medir_consultas() -> int:
+            with self._consultas_lock:
+                return tamanho(self._consultas)
+        
+        def liberar_consultas():
+            with self._consultas_lock:
+                self._consultas.clear()
+        
+        def liberar_acoes():
+            # Ações mais antigas que o debounce não bloqueiam mais nada
+            limite = time.time() - self._debounce_delay
+            for key, t in list(self._last_action_time.items()):
+                if t < limite:
+                    self._last_action_time.pop(key, None)
+        
+        def medir_snapshot() -> int:
+            # Medido a cada minuto pelo agendador: estimativa em vez do percurso completo
+            snapshot = self._snapshot
+            return snapshot.tamanho_aproximado() if snapshot is not None else 0
+        
+        def liberar_snapshot():
+            with self._snapshot_lock:
+                self._snapshot = None
+        
+        self.memoria.registrar("cache", medir_cache, self.cache.invalidate, prioridade=10)
+        self.memoria.registrar("consultas_email", medir_consultas, liberar_consultas, prioridade=20)
+        self.memoria.registrar("acoes_debounce", lambda: tamanho(dict(self._last_action_time)), liberar_acoes, prioridade=30)
+        self.memoria.registrar("ordens_sorteio", lambda: tamanho(dict(self._ordens)))
+        self.memoria.registrar("snapshot_participantes", medir_snapshot, liberar_snapshot, prioridade=90)
+        self.memoria.registrar("metricas", lambda: tamanho(self.metrics.snapshot()) + tamanho(dict(self.metrics._amostras)))
+    
+    def atualizar_metricas_sql(self) -> Dict[str, float]:
+        """Publica nas métricas o aproveitamento do cache de statements"""
+        cache = self.storage.estatisticas_statements()
+        total = cache["acertos"] + cache["falhas"]
+        cache["taxa_acerto"] = round(cache["acertos"] / total, 4) if total else 0.0
+        for chave, valor in cache.items():
+            self.metrics.definir(f"sql.statements_{chave}", valor)
+        return cache
+    
+    def podar_estatisticas(self, horas: float = 24) -> int:
+        """Descarta os cadastros por minuto com mais de `horas` (o painel mostra só os últimos 30 min)"""
+        antes_de = (datetime.now() - timedelta(hours=horas)).strftime("%Y-%m-%d %H:%M")
+        removidos = self.storage.podar_estatisticas(antes_de)
+        self.metrics.incrementar("estatisticas.minutos_podados", removidos)
+        return removidos
+    
+    def iniciar_manutencao(self) -> MaintenanceScheduler:
+        """Cria e inicia o agendador de manutenção com as tarefas padrão"""
+        if self.scheduler is not None:
+            return self.scheduler
+        
+        scheduler = MaintenanceScheduler(self.atividade, self.metrics)
+        scheduler.adicionar("wal_checkpoint", self.storage.checkpoint_wal, intervalo=120)
+        scheduler.adicionar("otimizar_consultas", self.storage.otimizar, intervalo=1800)
+        scheduler.adicionar("limpeza_caches", self.cleanup_resources, intervalo=300, exige_calmaria=False)
+        scheduler.adicionar("memoria", self.memoria.verificar, intervalo=60, exige_calmaria=False)
+        scheduler.adicionar("vacuum_incremental", self.storage.vacuum_incremental, intervalo=900)
+        scheduler.adicionar("podar_estatisticas", self.podar_estatisticas, intervalo=3600)
+        if isinstance(self.storage, SQLiteStorage):
+            scheduler.adicionar("metricas_sql", self.atualizar_metricas_sql, intervalo=60, exige_calmaria=False)
+        if self.backup is not None:
+            scheduler.adicionar("backup", self.backup.executar_agendado, intervalo=3600)
+        if self.retencao is not None:
+            scheduler.adicionar("retencao", self.retencao.executar, intervalo=3600)
+        scheduler.adicionar("integridade", self.integridade.executar, intervalo=30, exige_calmaria=False)
+        scheduler.adicionar("integridade_completa", self.integridade.executar_completa,
+                            intervalo=self.integridade.intervalo_completo)
+        scheduler.iniciar()
+        if self.notificador is not None:
+            self.notificador.iniciar()
+        
+        self.scheduler = scheduler
+        return scheduler
+
+class _JsonApiHandler(BaseHTTPRequestHandler):
+    """Repasse HTTP/1.1 (keep-alive) para JsonApiServer.responder"""
+    
+    protocol_version = "HTTP/1.1"
+    server_version = "SorteioAPI/1.0"
+    # Cabeçalhos e corpo saem em escritas separadas; sem TCP_NODELAY o Nagle
+    # segura a segunda até o ACK atrasado do cliente (~40 ms por resposta)
+    disable_nagle_algorithm = True
+    
+    def _atender(self, metodo: str):
+        corpo = b""
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            tamanho = -1
+        if tamanho < 0:
+            # Sem tamanho confiável não dá para achar o fim do corpo: responde e fecha
+            self.close_connection = True
+            status, cabecalhos, dados = 400, {}, JsonApiServer._json({"erro": "Content-Length inválido"})
+        elif tamanho > JsonApiServer.MAX_CORPO:
+            self.close_connection = True
+            status, cabecalhos, dados = 413, {}, b'{"erro": "Corpo muito grande"}'
+        else:
+            if tamanho:
+                corpo = self.rfile.read(tamanho)
+            status, cabecalhos, dados = self.server.api.responder(
+                metodo, self.path, corpo, self.headers.get("If-None-Match"), self.client_address[0]
+            )
+        self.send_response(status)
+        if dados or status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        for nome, valor in cabecalhos.items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+    
+    def do_GET(self):
+        self._atender("GET")
+    
+    def do_POST(self):
+        self._atender("POST")
+    
+    def log_message(self, format, *args):
+        pass
+
+class JsonApiServer:
+    """API JSON enxuta sobre o motor, sem passar pelos reruns do Streamlit.
+    
+    GET /api/sessao e GET /api/vencedores respondem com ETag derivada das
+    gerações dos dados: um If-None-Match igual recebe 304 sem tocar no banco,
+    e o JSON de cada geração é serializado uma única vez. POST /api/cadastro
+    recebe {"nome", "email"} e devolve o número da sorte.
+    """
+    
+    MAX_CORPO = 4096
+    # Mensagens de erro de cadastrar_aluno -> status HTTP
+    STATUS_CADASTRO = {
+        "Email já cadastrado!": 409,
+        "Aguarde um momento antes de tentar novamente": 429,
+    }
+    
+    def __init__(self, sistema: "OptimizedSorteioSystem", host: str = "127.0.0.1", porta: int = 8502):
+        self.sistema = sistema
+        self.metrics = sistema.metrics
+        self.host = host
+        self.porta = porta
+        self.limite_cadastros = RateLimiter(capacidade=10, por_minuto=30)
+        self._respostas: Dict[str, Tuple[str, bytes]] = {}  # rota -> (etag, json)
+        self._servidor: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def iniciar(self):
+        if self._servidor is not None:
+            return
+        self._servidor = ThreadingHTTPServer((self.host, self.porta), _JsonApiHandler)
+        self._servidor.daemon_threads = True
+        self._servidor.api = self
+        self.porta = self._servidor.server_address[1]
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="sorteio-api", daemon=True)
+        self._thread.start()
+    
+    def parar(self):
+        servidor, self._servidor = self._servidor, None
+        if servidor is not None:
+            servidor.shutdown()
+            servidor.server_close()
+    
+    @staticmethod
+    def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+        """If-None-Match com lista de ETags ou "*"; a comparação é fraca (ignora o prefixo W/)"""
+        if not if_none_match:
+            return False
+        alvo = etag[2:] if etag.startswith("W/") else etag
+        for candidata in if_none_match.split(","):
+            candidata = candidata.strip()
+            if candidata == "*" or (candidata[2:] if candidata.startswith("W/") else candidata) == alvo:
+                return True
+        return False
+    
+    @staticmethod
+    def _json(dados) -> bytes:
+        return json.dumps(dados, ensure_ascii=False, separators=(",", ":")).encode()
+    
+    def responder(self, metodo: str, caminho: str, corpo: bytes, if_none_match: Optional[str],
+                  cliente: str) -> Tuple[int, Dict[str, str], bytes]:
+        rota = caminho.split("?", 1)[0].rstrip("/")
+        # Conta para a calmaria como um rerun: um quiosque cadastrando não é período ocioso
+        self.sistema.registrar_atividade()
+        self.metrics.incrementar("api.requisicoes")
+        if metodo == "GET" and rota in ("/api/sessao", "/api/vencedores"):
+            with self.metrics.cronometrar("api" + rota.replace("/api/", ".")):
+                return self._consulta(rota, if_none_match)
+        if metodo == "POST" and rota == "/api/cadastro":
+            with self.metrics.cronometrar("api.cadastro"):
+                return self._cadastro(corpo, cliente)
+        return 404, {}, self._json({"erro": "Rota não encontrada"})
+    
+    def _consulta(self, rota: str, if_none_match: Optional[str]) -> Tuple[int, Dict[str, str], bytes]:
+        geracoes = self.sistema.get_geracoes()
+        if rota == "/api/sessao":
+            etag = f'"s{geracoes["sessao"]}"'
+        else:
+            etag = f'"v{geracoes["sessao"]}.{geracoes["sorteios"]}"'
+        cabecalhos = {"ETag": etag, "Cache-Control": "no-cache", "Access-Control-Allow-Origin": "*"}
+        if self.etag_confere(if_none_match, etag):
+            self.metrics.incrementar("api.nao_modificado")
+            return 304, cabecalhos, b""
+        
+        em_cache = self._respostas.get(rota)
+        if em_cache is not None and em_cache[0] == etag:
+            return 200, cabecalhos, em_cache[1]
+        
+        status = self.sistema.get_status_sessao()
+        if rota == "/api/sessao":
+            dados = self._json(status)
+        else:
+            dados = self._json({
+                "sessao_id": status["sessao_id"],
+                "vencedores": self.sistema.get_vencedores_sessao_atual()
+            })
+        self._respostas[rota] = (etag, dados)
+        return 200, cabecalhos, dados
+    
+    def _cadastro(self, corpo: bytes, cliente: str) -> Tuple[int, Dict[str, str], bytes]:
+        if not self.limite_cadastros.permitir(cliente):
+            espera = math.ceil(self.limite_cadastros.espera(cliente))
+            return 429, {"Retry-After": str(espera)}, self._json({"erro": f"Muitas tentativas. Aguarde {espera} s."})
+        try:
+            dados = json.loads(corpo or b"{}")
+            nome, email = str(dados.get("nome", "")).strip(), str(dados.get("email", "")).strip()
+        except (ValueError, AttributeError):
+            return 400, {}, self._json({"erro": "JSON inválido"})
+        if not nome or not email:
+            return 400, {}, self._json({"erro": "Preencha todos os campos!"})
+        if "@" not in email:
+            return 400, {}, self._json({"erro": "Email inválido!"})
+        
+        sucesso, msg, numero = self.sistema.cadastrar_aluno(nome, email)
+        if not sucesso:
+            return self.STATUS_CADASTRO.get(msg, 503), {}, self._json({"erro": msg})
+        self.metrics.incrementar("api.cadastros")
+        return 201, {}, self._json({"mensagem": msg, "numero_sorte": numero})
+
+class ManagedStateStore:
+    """Estados com expiração de uma sessão do navegador.
+    
+    Mantém um heap ordenado por instante de expiração: a limpeza de cada
+    rerun só toca nas entradas vencidas. Também contabiliza o tamanho
+    aproximado dos valores para limitar a memória por sessão; as chaves
+    `protegidas` só saem ao expirar, nunca pelo limite.
+    """
+    
+    def __init__(self, max_bytes: int = 256 * 1024, protegidas: frozenset = frozenset()):
+        self.max_bytes = max_bytes
+        self.protegidas = protegidas
+        self.total_bytes = 0
+        self._valores: Dict[str, Tuple] = {}  # key -> (value, expira_em, tamanho, seq)
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+    
+    @staticmethod
+    def estimar_tamanho(value) -> int:
+        """Tamanho aproximado em bytes de estruturas simples"""
+        size = sys.getsizeof(value)
+        if isinstance(value, dict):
+            size += sum(ManagedStateStore.estimar_tamanho(k) + ManagedStateStore.estimar_tamanho(v)
+                        for k, v in value.items())
+        elif isinstance(value, (list, tuple, set)):
+            size += sum(ManagedStateStore.estimar_tamanho(v) for v in value)
+        return size
+    
+    def set(self, key: str, value, expire_after: int = 3600):
+        self._remover(key)
+        self._seq += 1
+        expira_em = time.time() + expire_after
+        tamanho = self.estimar_tamanho(value)
+        self._valores[key] = (value, expira_em, tamanho, self._seq)
+        heapq.heappush(self._heap, (expira_em, self._seq, key))
+        self.total_bytes += tamanho
+        self.aplicar_limite(preservar=key)
+    
+    def get(self, key: str, default=None):
+        entry = self._valores.get(key)
+        if entry is None:
+            return default
+        if entry[1] <= time.time():
+            self._remover(key)
+            return default
+        return entry[0]
+    
+    def discard(self, key: str):
+        self._remover(key)
+    
+    def _remover(self, key: str):
+        # Entradas antigas no heap ficam órfãs e são ignoradas pelo seq
+        entry = self._valores.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+    
+    def cleanup_expired(self, now: Optional[float] = None) -> int:
+        """Remove entradas vencidas; custo proporcional ao que expirou"""
+        now = now if now is not None else time.time()
+        removidos = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._valores.get(key)
+            if entry is not None and entry[3] == seq:
+                self._remover(key)
+                removidos += 1
+        
+        # Compacta o heap se acumulou muitas entradas órfãs
+        if len(self._heap) > 4 * len(self._valores) + 32:
+            self._heap = [(e[1], e[3], k) for k, e in self._valores.items()]
+            heapq.heapify(self._heap)
+        return removidos
+    
+    def aplicar_limite(self, preservar: Optional[str] = None) -> int:
+        """Descarta as entradas que expiram primeiro até caber no limite; retorna quantas"""
+        removidos = 0
+        lote = 8
+        while self.total_bytes > self.max_bytes:
+            # Só as próximas a expirar, em lotes crescentes, sem ordenar o heap inteiro
+            candidatos = heapq.nsmallest(lote, self._heap)
+            for _, seq, key in candidatos:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                entry = self._valores.get(key)
+                if key != preservar and key not in self.protegidas and entry is not None and entry[3] == seq:
+                    self._remover(key)
+                    removidos += 1
+            if len(candidatos) < lote:
+                break
+            lote *= 2
+        return removidos
+    
+    def __len__(self) -> int:
+        return len(self._valores)
 
 # Estados otimizados para session_state
 class SessionStateManager:
     """Gerenciador otimizado de estados"""
     
+    STORE_KEY = "_managed_state"
+    
+    # Estado da apresentação no telão: descartá-lo pelo limite de memória some com o pódio
+    CHAVES_PROTEGIDAS = frozenset({"ultimo_vencedor", "mostrar_vencedor", "podium_sessao", "mostrar_podium"})
+    
     @staticmethod
-    def get_compressed_state(key: str, default=None):
-        """Recupera estado de forma compactada"""
-        return st.session_state.get(key, default)
+    def _store() -> ManagedStateStore:
+        store = st.session_state.get(SessionStateManager.STORE_KEY)
+        if store is None:
+            store = ManagedStateStore(protegidas=SessionStateManager.CHAVES_PROTEGIDAS)
+            st.session_state[SessionStateManager.STORE_KEY] = store
+            # Visível para a contabilidade de memória sem impedir a coleta da sessão
+            sistema.memoria.sessoes.add(store)
+        return store
     
     @staticmethod
     def set_compressed_state(key: str, value, expire_after: int = 3600):
         """Define estado com expiração"""
-        st.session_state[key] = {
-            'value': value,
-            'timestamp': time.time(),
-            'expire_after': expire_after
-        }
+        SessionStateManager._store().set(key, value, expire_after)
     
     @staticmethod
     def cleanup_expired_states():
-        """Limpa estados expirados"""
-        current_time = time.time()
-        keys_to_remove = []
-        
-        for key, state_data in st.session_state.items():
-            if isinstance(state_data, dict) and 'timestamp' in state_data:
-                if current_time - state_data['timestamp'] > state_data.get('expire_after', 3600):
-                    keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del st.session_state[key]
+        """Limpa estados expirados (apenas os vencidos, via heap) e aplica o limite da sessão"""
+        store = SessionStateManager._store()
+        store.cleanup_expired()
+        store.aplicar_limite()
     
     @staticmethod
     def get_state_value(key: str, default=None):
         """Recupera valor do estado gerenciado"""
-        state_data = st.session_state.get(key)
-        if isinstance(state_data, dict) and 'value' in state_data:
-            current_time = time.time()
-            if current_time - state_data['timestamp'] <= state_data.get('expire_after', 3600):
-                return state_data['value']
-            else:
-                # Expirado
-                if key in st.session_state:
-                    del st.session_state[key]
-        return default
+        return SessionStateManager._store().get(key, default)
+    
+    @staticmethod
+    def clear_states(keys: List[str]):
+        """Remove estados gerenciados"""
+        store = SessionStateManager._store()
+        for key in keys:
+            store.discard(key)
+    
+    @staticmethod
+    def get_state_size() -> int:
+        """Tamanho aproximado (bytes) dos estados desta sessão"""
+        return SessionStateManager._store().total_bytes
 
 # Sistema global com cleanup automático
 @st.cache_resource
 def get_sistema():
     sistema = OptimizedSorteioSystem()
     
-    # Cleanup periódico em background
-    def periodic_cleanup():
-        import threading
-        timer = threading.Timer(300.0, periodic_cleanup)  # 5 min
-        timer.daemon = True
-        timer.start()
-        sistema.cleanup_resources()
+    # Manutenção periódica em background (checkpoint, estatísticas, caches, vacuum)
+    sistema.iniciar_manutencao()
     
-    periodic_cleanup()
+    # API JSON opcional para quiosques e apps (API_PORTA em st.secrets)
+    if get_config("API_PORTA"):
+        sistema.api = JsonApiServer(sistema, host=get_config("API_HOST", "127.0.0.1"), porta=int(get_config("API_PORTA")))
+        try:
+            sistema.api.iniciar()
+        except OSError:
+            # Porta ocupada (outro processo já serve a API): segue só com a interface
+            sistema.api = None
     return sistema
 
 sistema = get_sistema()
+sistema.metrics.definir("rerun.bytes_estilo", _BYTES_ESTILO)
 state_manager = SessionStateManager()
 
+# Profiler opcional do rerun (PROFILING = true em st.secrets)
+perfil: Optional[RenderProfiler] = None
+if get_config_bool("PROFILING", False):
+    perfil = RenderProfiler.iniciar_rerun(
+        modo=str(get_config("PROFILING_MODE", "")),
+        diretorio=str(get_config("PROFILING_DIR", "profiles")),
+        inicio=_RERUN_INICIO
+    )
+    perfil.adicionar_secao("css_global", _CSS_GLOBAL_S)
+    perfil.adicionar_secao("carga_modulo", time.perf_counter() - _RERUN_INICIO - _CSS_GLOBAL_S)
+
 def sidebar_alunos():
     """Sidebar otimizada com lazy loading"""
     with st.sidebar:
@@ -735,31 +4207,31 @@ def sidebar_alunos():
         
         # Lazy loading - só carrega quando necessário
         if st.sidebar.button("🔄 Atualizar Lista", key="refresh_sidebar"):
-            alunos = sistema.get_alunos(force_refresh=True)
+            alunos = sistema.get_snapshot(force_refresh=True)
         else:
-            alunos = sistema.get_alunos()
+            alunos = sistema.get_snapshot()
         
-        if alunos:
-            st.markdown(f"**Total: {len(alunos)} pessoas**")
+        total = len(alunos)
+        if total:
+            st.markdown(f"**Total: {total} pessoas**")
             
-            # Paginação para listas grandes
+            # Paginação para listas grandes: só a página visível é materializada
             items_per_page = 10
-            total_pages = max(1, (len(alunos) + items_per_page - 1) // items_per_page)
+            total_pages = max(1, (total + items_per_page - 1) // items_per_page)
             
             if total_pages > 1:
                 page = st.selectbox("Página", range(1, total_pages + 1), key="sidebar_page") - 1
                 start_idx = page * items_per_page
-                end_idx = min(start_idx + items_per_page, len(alunos))
-                alunos_page = alunos[start_idx:end_idx]
+                end_idx = min(start_idx + items_per_page, total)
             else:
-                alunos_page = alunos
+                start_idx, end_idx = 0, total
             
-            for aluno in alunos_page:
+            for aluno in alunos.page(start_idx, end_idx):
                 st.markdown(f"""
                 <div class="student-item">
-                    <strong>{aluno['nome']}</strong><br>
+                    <strong>{html.escape(aluno['nome'])}</strong><br>
                     <small>🎯 Nº {aluno['numero_sorte']}</small><br>
-                    <small>📧 {aluno['email']}</small>
+                    <small>📧 {html.escape(aluno['email'])}</small>
                 </div>
                 """, unsafe_allow_html=True)
         else:
@@ -809,6 +4281,34 @@ def area_cadastro():
                     st.rerun()
                 else:
                     st.error(f"❌ {msg}")
+    
+    # Consulta self-service do número, sem precisar da lista completa
+    with st.expander("🔎 Esqueci meu número"):
+        with st.form("consulta_numero", clear_on_submit=True):
+            email_consulta = st.text_input("Email cadastrado", placeholder="seu.email@exemplo.com")
+            consultar = st.form_submit_button("Consultar", use_container_width=True)
+        
+        if consultar and email_consulta:
+            permitido, msg, resultado = sistema.consultar_numero(email_consulta, identificar_cliente())
+            if not permitido:
+                st.warning(f"⏳ {msg}")
+            elif resultado is None:
+                st.info("Nenhum cadastro encontrado para este email.")
+            else:
+                st.markdown(f"""
+                <div class="winner-card">
+                    <h3>🎯 Seu número é</h3>
+                    <h1 style="font-size: 3rem; margin: 0;">{resultado['numero_sorte']:04d}</h1>
+                </div>
+                """, unsafe_allow_html=True)
+
+def identificar_cliente() -> str:
+    """Chave do cliente para limites de taxa: o IP quando disponível
+    
+    Sem IP, todos os clientes dividem a mesma chave: uma chave por sessão do
+    navegador seria renovada só abrindo outra aba.
+    """
+    return getattr(st.context, "ip_address", None) or "sem-ip"
 
 def show_password_change_form():
     """Formulário para alteração de senha"""
@@ -867,13 +4367,14 @@ def area_admin():
             login_btn = st.form_submit_button("Entrar")
             
             if login_btn:
-                if sistema.security.verify_password(senha):
+                autenticado, msg = sistema.security.autenticar(senha, identificar_cliente())
+                if autenticado:
                     st.session_state.admin_logged = True
-                    st.success("Login realizado!")
+                    st.success(msg)
                     time.sleep(0.5)
                     st.rerun()
                 else:
-                    st.error("Senha incorreta!")
+                    st.error(msg)
         return
     
     # Verificar se deve mostrar formulário de alteração de senha
@@ -890,6 +4391,17 @@ def area_admin():
         </div>
         """, unsafe_allow_html=True)
     
+    # Alerta de integridade do banco (verificação em background)
+    if sistema.integridade.alertas:
+        itens = "".join(f"<li>{html.escape(problema)}</li>" for problema in sistema.integridade.alertas[:10])
+        st.markdown(f"""
+        <div class="security-panel">
+            <h4>🛑 ALERTA DE INTEGRIDADE</h4>
+            <p><strong>O banco tem dados inconsistentes.</strong> Confira antes de exibir resultados no telão.</p>
+            <ul>{itens}</ul>
+        </div>
+        """, unsafe_allow_html=True)
+    
     # Interface admin otimizada
     status = sistema.get_status_sessao()
     
@@ -904,6 +4416,9 @@ def area_admin():
     </div>
     """, unsafe_allow_html=True)
     
+    if status['sessao_id']:
+        exibir_compromisso(status['sessao_id'])
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
@@ -923,7 +4438,13 @@ def area_admin():
                 sucesso, vencedor = sistema.sortear()
             
             if sucesso:
-                state_manager.set_compressed_state("ultimo_vencedor", vencedor, expire_after=1800)
+                # Confere o sorteio recém-gravado; problema nesta sessão deixa o resultado no
+                # painel (com o alerta) em vez do telão. Problemas antigos só geram o alerta
+                sistema.integridade.executar()
+                if sistema.integridade.afeta_sessao(vencedor["sessao_id"]):
+                    state_manager.set_compressed_state("mostrar_vencedor", False)
+                    st.rerun()
+                state_manager.set_compressed_state("ultimo_vencedor", referencia_vencedor(vencedor), expire_after=1800)
                 state_manager.set_compressed_state("mostrar_vencedor", True, expire_after=1800)
                 st.rerun()
             else:
@@ -935,11 +4456,136 @@ def area_admin():
                 vencedores = sistema.encerrar_sessao()
             
             if vencedores:
-                state_manager.set_compressed_state("vencedores_finais", vencedores, expire_after=1800)
+                state_manager.set_compressed_state("podium_sessao", status['sessao_id'], expire_after=1800)
                 state_manager.set_compressed_state("mostrar_podium", True, expire_after=1800)
                 state_manager.set_compressed_state("mostrar_vencedor", False)
                 st.rerun()
     
+    # Painel de estatísticas ao vivo
+    with st.expander("📈 Estatísticas"):
+        estatisticas = sistema.get_estatisticas()
+        col_e1, col_e2, col_e3 = st.columns(3)
+        arquivados = estatisticas.get("alunos_arquivados", 0)
+        col_e1.metric("Participantes", estatisticas["alunos_total"],
+                      help=f"Mais {arquivados} no arquivo (retenção)" if arquivados else None)
+        col_e2.metric("Sorteios", estatisticas["sorteios_total"])
+        ultimos = estatisticas["cadastros_por_minuto"]
+        col_e3.metric("Cadastros no último minuto", ultimos[-1][1] if ultimos and ultimos[-1][0] == datetime.now().strftime("%Y-%m-%d %H:%M") else 0)
+        
+        if ultimos:
+            st.caption("Cadastros por minuto")
+            st.bar_chart({"cadastros": {minuto[-5:]: total for minuto, total in ultimos}})
+        if estatisticas["sorteios_por_sessao"]:
+            st.caption("Sorteios por sessão: " + " · ".join(
+                f"`{sessao_id}` {total}" for sessao_id, total in estatisticas["sorteios_por_sessao"]
+            ))
+    
+    # Manutenção em background
+    if sistema.scheduler is not None:
+        with st.expander("🛠️ Manutenção"):
+            st.caption(f"Requisições/s: {sistema.atividade.taxa():.1f} · "
+                       f"{'calmaria' if sistema.atividade.em_calmaria() else 'movimento'}")
+            st.dataframe(sistema.scheduler.status(), use_container_width=True, hide_index=True)
+            
+            metricas = sistema.metrics.snapshot()
+            espera = metricas["tempos"].get("sorteio.espera_lock", {})
+            st.caption(f"Sorteios sob disputa: {metricas['contadores'].get('sorteio.ocupado', 0)} banco ocupado · "
+                       f"{metricas['contadores'].get('sorteio.conflitos', 0)} conflitos · "
+                       f"espera máx. {espera.get('max', 0) * 1000:.1f} ms")
+    
+    # Planos das consultas SQL
+    with st.expander("🔍 Planos de consulta"):
+        st.caption(f"{len(SQL)} consultas registradas; os planos são conferidos por tests/test_planos_sql.py.")
+        if isinstance(sistema.storage, SQLiteStorage):
+            cache = sistema.atualizar_metricas_sql()
+            st.caption(f"Cache de statements ({ConnectionPool.tamanho_cache_statements()} por conexão): "
+                       f"{cache['taxa_acerto']:.1%} de acertos · {cache['falhas']} compilações")
+    
+    # Integridade do banco
+    with st.expander("🩺 Integridade"):
+        st.caption("A cada 30 s (e após cada sorteio) confere só os sorteios novos desde o último checkpoint; "
+                   "o PRAGMA quick_check e a busca de órfãos em todos os sorteios rodam a cada 15 min, em calmaria.")
+        if st.button("Verificação completa", use_container_width=True):
+            with st.spinner("Verificando o banco..."):
+                sistema.integridade.executar_completa()
+                sistema.integridade.executar()
+        if sistema.integridade.ultimo:
+            st.dataframe([sistema.integridade.ultimo], use_container_width=True, hide_index=True)
+        if sistema.integridade.alertas:
+            for problema in sistema.integridade.alertas:
+                st.error(problema)
+        elif sistema.integridade.ultimo:
+            st.success("✅ Nenhum problema encontrado")
+    
+    # Memória em processo
+    with st.expander("🧠 Memória"):
+        medicao = sistema.memoria.ultima_medicao or sistema.memoria.medir()
+        total = sum(medicao.values())
+        st.caption(f"Total aproximado: {total / 1024:.0f} KB de {sistema.memoria.orcamento_bytes / 1024 / 1024:.0f} MB "
+                   f"· despejos: {sistema.metrics.snapshot()['contadores'].get('memoria.despejos', 0)}")
+        st.dataframe(
+            [{"estrutura": nome, "kb": round(tamanho / 1024, 1)} for nome, tamanho in
+             sorted(medicao.items(), key=lambda item: -item[1])],
+            use_container_width=True, hide_index=True
+        )
+        if sistema.memoria.top_alocacoes:
+            st.caption("Maiores alocações (tracemalloc)")
+            st.dataframe(sistema.memoria.top_alocacoes, use_container_width=True, hide_index=True)
+        st.download_button("⬇️ Exportar métricas", sistema.metrics.exportar(), file_name="metricas.prom",
+                           mime="text/plain", use_container_width=True)
+    
+    # Avisos aos vencedores por email
+    if sistema.notificador is not None:
+        with st.expander("📧 Notificações"):
+            resumo = sistema.storage.resumo_notificacoes()
+            col_n1, col_n2, col_n3 = st.columns(3)
+            col_n1.metric("Pendentes", resumo.get("pendente", 0) + resumo.get("enviando", 0))
+            col_n2.metric("Enviadas", resumo.get("enviada", 0))
+            col_n3.metric("Falhas", resumo.get("falha", 0))
+            envio = sistema.metrics.snapshot()["tempos"].get("notificacoes.envio")
+            if envio:
+                st.caption(f"Envio médio: {envio['total'] / envio['count'] * 1000:.0f} ms · "
+                           f"servidor {sistema.notificador.host}:{sistema.notificador.port}")
+    
+    # Retenção, arquivo e exportação do histórico
+    with st.expander("🗄️ Retenção e histórico"):
+        if sistema.retencao is None:
+            st.caption("Retenção desativada (defina RETENCAO_DIAS em st.secrets para arquivar dados antigos).")
+        else:
+            st.caption(f"Sessões encerradas e participantes com mais de {sistema.retencao.dias:g} dias "
+                       f"vão para as tabelas de arquivo a cada hora, em períodos de calmaria.")
+            if st.button("🗄️ Arquivar agora", use_container_width=True):
+                with st.spinner("Arquivando..."):
+                    relatorio = sistema.retencao.executar()
+                st.success(f"✅ {relatorio['sessoes']} sessão(ões) e {relatorio['alunos']} participante(s) "
+                           f"arquivados em {relatorio['duracao_s']} s")
+            if sistema.retencao.historico:
+                st.dataframe(list(sistema.retencao.historico)[:5], use_container_width=True, hide_index=True)
+        if st.button("Gerar CSV do histórico", use_container_width=True):
+            st.download_button("⬇️ Baixar histórico (CSV)", sistema.exportar_historico_csv(),
+                               file_name="historico_sorteios.csv", mime="text/csv", use_container_width=True)
+    
+    # Backups a quente
+    if sistema.backup is not None:
+        with st.expander("💾 Backups"):
+            if sistema.backup.em_andamento:
+                st.info("Backup em andamento...")
+            elif st.button("💾 Fazer backup agora", use_container_width=True):
+                sistema.backup.iniciar_assincrono()
+                st.success("Backup iniciado em segundo plano")
+            
+            for relatorio in list(sistema.backup.historico)[:5]:
+                if relatorio.get("erro"):
+                    st.error(f"Falha no backup: {relatorio['erro']}")
+                    continue
+                arquivos = f" (+{relatorio['arquivos'] - 1} shards)" if relatorio.get("arquivos", 1) > 1 else ""
+                linhas = [f"**{relatorio['arquivo']}**{arquivos} · {relatorio['duracao_s']} s · "
+                          f"{relatorio['passos']} passos · {relatorio['tamanho_kb']} KB"]
+                for operacao, dados in relatorio["impacto"].items():
+                    if dados["amostras_durante"]:
+                        linhas.append(f"{operacao}: {dados['durante_ms']} ms durante / {dados['antes_ms']} ms antes")
+                st.markdown("  \n".join(linhas))
+    
     st.markdown("---")
     
     # Área de configurações de segurança
@@ -956,22 +4602,79 @@ def area_admin():
             st.session_state.show_password_form = False
             st.rerun()
 
+def referencia_vencedor(vencedor: Dict) -> Dict:
+    """Guarda na sessão do navegador só a referência ao vencedor, não os dados"""
+    return {"sessao_id": vencedor["sessao_id"], "posicao": vencedor["posicao"]}
+
+def html_cartao_vencedor(vencedor: Dict) -> str:
+    """Cartão do vencedor recém-sorteado"""
+    return f"""
+    <div class="big-winner">
+        🎉 VENCEDOR SORTEADO! 🎉<br>
+        {html.escape(vencedor['nome'])}<br>
+        Número: {vencedor['numero_sorte']:04d}<br>
+        {vencedor['posicao']}º Lugar
+    </div>
+    """
+
+def html_podium(vencedores: List[Dict]) -> str:
+    """Cartões do pódio final, em ordem de posição"""
+    cartoes = []
+    for vencedor in sorted(vencedores, key=lambda x: x['posicao']):
+        pos = vencedor['posicao']
+        emoji = "🥇" if pos == 1 else "🥈" if pos == 2 else "🥉"
+        cor = "#FFD700" if pos == 1 else "#C0C0C0" if pos == 2 else "#CD7F32"
+        
+        cartoes.append(f"""
+        <div class="podium-card" style="background: linear-gradient(135deg, {cor}, {cor});">
+            <div style="font-size: 3rem; margin-bottom: 10px;">{emoji}</div>
+            <div style="font-size: 1.5rem; margin-bottom: 10px;">{pos}º LUGAR</div>
+            <div style="font-size: 1.8rem; margin: 15px 0;">{html.escape(vencedor['nome'])}</div>
+            <div style="font-size: 1.2rem;">Número: {vencedor['numero_sorte']:04d}</div>
+        </div>
+        """)
+    return "".join(cartoes)
+
+def html_classificacao(vencedores: List[Dict]) -> str:
+    """Classificação parcial da sessão em andamento"""
+    cartoes = []
+    for vencedor in vencedores:
+        pos = vencedor['posicao']
+        emoji = "🥇" if pos == 1 else "🥈" if pos == 2 else "🥉"
+        
+        cartoes.append(f"""
+        <div class="winner-card">
+            <h3>{emoji} {pos}º Lugar</h3>
+            <h2>{html.escape(vencedor['nome'])}</h2>
+            <p>Número: {vencedor['numero_sorte']:04d}</p>
+        </div>
+        """)
+    return "".join(cartoes)
+
+def html_sessao(tipo: str, sessao_id: str, montar: Callable[[List[Dict]], str]) -> str:
+    """HTML compartilhado da sessão: montado uma vez por versão dos sorteios para todos os espectadores"""
+    versao = sistema.get_geracoes()["sorteios"]
+    return sistema.render.obter(tipo, sessao_id, versao, lambda: montar(sistema.get_vencedores_sessao(sessao_id)))
+
 def exibir_vencedor():
     """Exibe vencedor atual otimizado"""
-    vencedor = state_manager.get_state_value("ultimo_vencedor")
+    referencia = state_manager.get_state_value("ultimo_vencedor")
     
-    if not vencedor:
+    if not referencia:
         st.error("Dados do vencedor não encontrados")
         return
     
-    st.markdown(f"""
-    <div class="big-winner">
-        🎉 VENCEDOR SORTEADO! 🎉<br>
-        {vencedor['nome']}<br>
-        Número: {vencedor['numero_sorte']:04d}<br>
-        {vencedor['posicao']}º Lugar
-    </div>
-    """, unsafe_allow_html=True)
+    posicao = referencia['posicao']
+    fragmento = html_sessao(
+        f"vencedor_{posicao}", referencia['sessao_id'],
+        lambda vencedores: "".join(html_cartao_vencedor(v) for v in vencedores if v['posicao'] == posicao)
+    )
+    
+    if not fragmento:
+        st.error("Dados do vencedor não encontrados")
+        return
+    
+    st.markdown(fragmento, unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
     with col1:
@@ -984,7 +4687,13 @@ def exibir_vencedor():
                 sucesso, vencedor = sistema.sortear()
             
             if sucesso:
-                state_manager.set_compressed_state("ultimo_vencedor", vencedor, expire_after=1800)
+                # Confere o sorteio recém-gravado; problema nesta sessão deixa o resultado no
+                # painel (com o alerta) em vez do telão. Problemas antigos só geram o alerta
+                sistema.integridade.executar()
+                if sistema.integridade.afeta_sessao(vencedor["sessao_id"]):
+                    state_manager.set_compressed_state("mostrar_vencedor", False)
+                    st.rerun()
+                state_manager.set_compressed_state("ultimo_vencedor", referencia_vencedor(vencedor), expire_after=1800)
                 state_manager.set_compressed_state("mostrar_vencedor", True, expire_after=1800)
                 st.rerun()
             else:
@@ -999,7 +4708,7 @@ def exibir_vencedor():
                 vencedores = sistema.encerrar_sessao()
             
             if vencedores:
-                state_manager.set_compressed_state("vencedores_finais", vencedores, expire_after=1800)
+                state_manager.set_compressed_state("podium_sessao", referencia['sessao_id'], expire_after=1800)
                 state_manager.set_compressed_state("mostrar_podium", True, expire_after=1800)
                 state_manager.set_compressed_state("mostrar_vencedor", False)
                 st.rerun()
@@ -1008,26 +4717,15 @@ def exibir_podium():
     """Exibe pódio final otimizado"""
     st.header("🏆 PÓDIO FINAL")
     
-    vencedores = state_manager.get_state_value("vencedores_finais")
+    sessao_id = state_manager.get_state_value("podium_sessao")
+    fragmento = html_sessao("podium", sessao_id, html_podium) if sessao_id else ""
     
-    if not vencedores:
+    if not fragmento:
         st.error("Dados do pódio não encontrados")
         return
     
     # Exibir vencedores com animação CSS
-    for vencedor in sorted(vencedores, key=lambda x: x['posicao']):
-        pos = vencedor['posicao']
-        emoji = "🥇" if pos == 1 else "🥈" if pos == 2 else "🥉"
-        cor = "#FFD700" if pos == 1 else "#C0C0C0" if pos == 2 else "#CD7F32"
-        
-        st.markdown(f"""
-        <div class="podium-card" style="background: linear-gradient(135deg, {cor}, {cor});">
-            <div style="font-size: 3rem; margin-bottom: 10px;">{emoji}</div>
-            <div style="font-size: 1.5rem; margin-bottom: 10px;">{pos}º LUGAR</div>
-            <div style="font-size: 1.8rem; margin: 15px 0;">{vencedor['nome']}</div>
-            <div style="font-size: 1.2rem;">Número: {vencedor['numero_sorte']:04d}</div>
-        </div>
-        """, unsafe_allow_html=True)
+    st.markdown(fragmento, unsafe_allow_html=True)
     
     st.markdown("---")
     
@@ -1035,10 +4733,8 @@ def exibir_podium():
     with col1:
         if st.button("🔄 Nova Sessão", use_container_width=True, type="primary"):
             # Limpar estados otimizado
-            keys_to_clear = ['mostrar_podium', 'vencedores_finais', 'ultimo_vencedor', 'mostrar_vencedor']
-            for key in keys_to_clear:
-                if key in st.session_state:
-                    del st.session_state[key]
+            keys_to_clear = ['mostrar_podium', 'podium_sessao', 'ultimo_vencedor', 'mostrar_vencedor']
+            state_manager.clear_states(keys_to_clear)
             
             with st.spinner("Iniciando nova sessão..."):
                 sessao_id = sistema.iniciar_sessao()
@@ -1051,12 +4747,30 @@ def exibir_podium():
     with col2:
         if st.button("🎊 Finalizar Apresentação", use_container_width=True):
             # Limpar todos os estados
-            keys_to_clear = ['mostrar_podium', 'vencedores_finais', 'ultimo_vencedor', 'mostrar_vencedor']
-            for key in keys_to_clear:
-                if key in st.session_state:
-                    del st.session_state[key]
+            keys_to_clear = ['mostrar_podium', 'podium_sessao', 'ultimo_vencedor', 'mostrar_vencedor']
+            state_manager.clear_states(keys_to_clear)
             st.rerun()
 
+def exibir_compromisso(sessao_id: str):
+    """Exibe o compromisso público da sessão e, após a revelação, a verificação"""
+    compromisso = sistema.get_compromisso_publico(sessao_id)
+    if not compromisso:
+        return
+    
+    st.caption(f"🔒 Compromisso da semente: `{compromisso['seed_hash']}` · "
+               f"{compromisso['total']} participantes (`{compromisso['participantes_hash'][:16]}…`)")
+    
+    if compromisso['seed']:
+        with st.expander("🔍 Verificar sorteio"):
+            st.markdown(f"Semente revelada: `{compromisso['seed']}`")
+            if st.button("Verificar", key=f"verificar_{sessao_id}"):
+                resultado = sistema.verificar_sessao(sessao_id)
+                if resultado["ok"]:
+                    st.success(f"✅ {resultado['sorteios']} sorteio(s) conferem com o compromisso publicado")
+                else:
+                    for erro in resultado["erros"]:
+                        st.error(erro)
+
 def area_resultados():
     """Área de resultados otimizada"""
     st.header("📊 Resultados da Sessão Atual")
@@ -1067,22 +4781,14 @@ def area_resultados():
     if vencedores:
         st.markdown("### 🏆 Classificação Atual")
         
-        for vencedor in vencedores:
-            pos = vencedor['posicao']
-            emoji = "🥇" if pos == 1 else "🥈" if pos == 2 else "🥉"
-            
-            st.markdown(f"""
-            <div class="winner-card">
-                <h3>{emoji} {pos}º Lugar</h3>
-                <h2>{vencedor['nome']}</h2>
-                <p>Número: {vencedor['numero_sorte']:04d}</p>
-            </div>
-            """, unsafe_allow_html=True)
+        status = sistema.get_status_sessao()
+        st.markdown(html_sessao("classificacao", status['sessao_id'], html_classificacao), unsafe_allow_html=True)
         
         # Estatísticas adicionais
-        status = sistema.get_status_sessao()
         if status['ativa']:
             st.info(f"📈 Sorteios restantes: {3 - status['sorteios_count']}")
+        if status['sessao_id']:
+            exibir_compromisso(status['sessao_id'])
         
     else:
         st.info("Nenhum sorteio realizado ainda.")
@@ -1097,17 +4803,33 @@ def area_resultados():
                 <p>Aguardando primeiro sorteio...</p>
             </div>
             """, unsafe_allow_html=True)
+            exibir_compromisso(status['sessao_id'])
+    
+    # Sessões anteriores (inclusive as já arquivadas)
+    anteriores = sistema.get_sessoes_anteriores()
+    if anteriores:
+        with st.expander("📜 Sessões anteriores"):
+            for sessao in anteriores:
+                vencedores = " · ".join(f"{v['posicao']}º {html.escape(v['nome'] or '—')} ({v['numero_sorte']:04d})"
+                                        for v in sessao["vencedores"]) or "sem sorteios"
+                st.markdown(f"**`{sessao['sessao_id']}`** · {sessao['created_at']} UTC · "
+                            f"{sessao['participantes']} participantes  \n{vencedores}")
 
 def main():
     """Função principal otimizada"""
+    # Taxa de requisições alimenta a detecção de calmaria da manutenção
+    sistema.registrar_atividade()
+    
     # Cleanup automático de estados expirados
-    state_manager.cleanup_expired_states()
+    with secao_perfil("cleanup_estados"):
+        state_manager.cleanup_expired_states()
     
     st.title("🎲 Sorteio Eletrônico")
     st.markdown("---")
     
     # Sidebar com lazy loading
-    sidebar_alunos()
+    with secao_perfil("sidebar_alunos"):
+        sidebar_alunos()
     
     # Controle de fluxo otimizado
     mostrar_vencedor = state_manager.get_state_value("mostrar_vencedor", False)
@@ -1115,11 +4837,13 @@ def main():
     ultimo_vencedor = state_manager.get_state_value("ultimo_vencedor")
     
     if mostrar_vencedor and ultimo_vencedor:
-        exibir_vencedor()
+        with secao_perfil("exibir_vencedor"):
+            exibir_vencedor()
         return
     
     if mostrar_podium:
-        exibir_podium()
+        with secao_perfil("exibir_podium"):
+            exibir_podium()
         return
     
     # Menu principal com estado persistente
@@ -1139,20 +4863,15 @@ def main():
     
     # Roteamento otimizado
     if menu == "👤 Cadastro":
-        area_cadastro()
+        with secao_perfil("area_cadastro"):
+            area_cadastro()
     elif menu == "🎯 Administração":
-        area_admin()
+        with secao_perfil("area_admin"):
+            area_admin()
     else:
-        area_resultados()
+        with secao_perfil("area_resultados"):
+            area_resultados()
     
-    # Cleanup periódico no final
-    if hasattr(sistema, 'cleanup_resources'):
-        # Fazer cleanup a cada 50 execuções para não impactar performance
-        cleanup_counter = st.session_state.get('cleanup_counter', 0) + 1
-        st.session_state.cleanup_counter = cleanup_counter
-        
-        if cleanup_counter % 50 == 0:
-            sistema.cleanup_resources()
 
 # Função de inicialização otimizada
 @st.cache_data(ttl=3600)  # Cache por 1 hora
@@ -1173,7 +4892,7 @@ def handle_app_errors():
         st.error("⚠️ Ocorreu um erro inesperado. Recarregue a página.")
         
         # Log do erro (em produção, usar logging apropriado)
-        if st.secrets.get("DEBUG", False):
+        if get_config_bool("DEBUG", False):
             st.exception(e)
         
         # Opção de reset
@@ -1191,6 +4910,12 @@ if __name__ == "__main__":
         # Executar aplicação
         handle_app_errors()
         
+    except (RerunException, StopException):
+        # st.rerun()/st.stop() (caminho normal após cada ação) pulam o rodapé:
+        # o perfil é fechado e gravado aqui, sem o expander
+        if perfil is not None:
+            perfil.finalizar()
+        raise
     except Exception as e:
         st.error("❌ Falha crítica na inicialização da aplicação")
         st.code(f"Erro: {str(e)}")
@@ -1198,37 +4923,7 @@ if __name__ == "__main__":
         if st.button("🔄 Tentar Novamente"):
             st.rerun()
 
-st.markdown("""
-<style>
-    .main {
-        background-color: #ffffff;
-        color: #333333;
-    }
-    .block-container {
-        padding-top: 1rem;
-        padding-bottom: 0rem;
-    }
-    /* Esconde completamente todos os elementos da barra padrão do Streamlit */
-    header {display: none !important;}
-    footer {display: none !important;}
-    #MainMenu {display: none !important;}
-    /* Remove qualquer espaço em branco adicional */
-    div[data-testid="stAppViewBlockContainer"] {
-        padding-top: 0 !important;
-        padding-bottom: 0 !important;
-    }
-    div[data-testid="stVerticalBlock"] {
-        gap: 0 !important;
-        padding-top: 0 !important;
-        padding-bottom: 0 !important;
-    }
-    /* Remove quaisquer margens extras */
-    .element-container {
-        margin-top: 0 !important;
-        margin-bottom: 0 !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+_RODAPE_INICIO = time.perf_counter()
 st.markdown("---")
 st.markdown("""
 <div style="text-align: center;">
@@ -1236,4 +4931,10 @@ st.markdown("""
     Por 🎲<strong>Ary Ribeiro</strong>: <a href="mailto:aryribeiro@gmail.com">aryribeiro@gmail.com</a><br>
     <em>Obs.: o web app foi testado apenas em computador.</em>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+if perfil is not None:
+    perfil.adicionar_secao("rodape", time.perf_counter() - _RODAPE_INICIO)
+    perfil.finalizar()
+    with st.expander(f"⏱️ Perfil do rerun: {perfil.duracao * 1000:.1f} ms"):
+        st.dataframe(perfil.breakdown(), use_container_width=True, hide_index=True)
+        st.caption("Dump: " + ", ".join(perfil.arquivos))
@@ -0,0 +1,76 @@
+"""Bytes enviados pelo websocket a cada rerun, como o navegador os recebe
+    
+    streamlit run app.py --server.headless true &
+    python benchmarks/rerun_bytes.py --url ws://localhost:8501/_stcore/stream --reruns 5
+
+Abre uma sessão, pede reruns seguidos e soma o tamanho dos frames recebidos
+até o fim de cada execução. Como o navegador, guarda o hash das mensagens
+marcadas como cacheáveis e o devolve no pedido seguinte, então a partir do
+segundo rerun o servidor manda só a referência (ref_hash) das que não mudaram.
+A linha "estilo" é o frame do `<style>` global (inteiro ou a referência).
+"""
+import argparse
+import asyncio
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+
+def eh_estilo(msg: ForwardMsg, hash_estilo: set) -> bool:
+    if msg.WhichOneof("type") == "ref_hash":
+        return msg.ref_hash in hash_estilo
+    if msg.WhichOneof("type") != "delta" or msg.delta.WhichOneof("type") != "new_element":
+        return False
+    if msg.delta.new_element.markdown.body.startswith("<style>"):
+        hash_estilo.add(msg.hash)
+        return True
+    return False
+
+
+async def medir(url: str, reruns: int) -> list:
+    conexao = await websocket_connect(url, subprotocols=["streamlit"])
+    cache: set = set()
+    hash_estilo: set = set()
+    medidas = []
+    try:
+        for _ in range(reruns):
+            pedido = BackMsg()
+            pedido.rerun_script.query_string = ""
+            pedido.rerun_script.cached_message_hashes.extend(sorted(cache))
+            await conexao.write_message(pedido.SerializeToString(), binary=True)
+            total = estilo = frames = 0
+            while True:
+                frame = await asyncio.wait_for(conexao.read_message(), timeout=60)
+                if frame is None:
+                    raise ConnectionError("o servidor fechou o websocket")
+                msg = ForwardMsg()
+                msg.ParseFromString(frame)
+                total += len(frame)
+                frames += 1
+                if msg.metadata.cacheable:
+                    cache.add(msg.hash)
+                if eh_estilo(msg, hash_estilo):
+                    estilo = len(frame)
+                if msg.WhichOneof("type") == "script_finished":
+                    break
+            medidas.append({"bytes": total, "frames": frames, "estilo": estilo})
+    finally:
+        conexao.close()
+    return medidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="ws://localhost:8501/_stcore/stream")
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+    
+    medidas = asyncio.run(medir(args.url, args.reruns))
+    print(f"{'rerun':>5} {'frames':>7} {'bytes':>8} {'estilo':>7}")
+    for i, medida in enumerate(medidas, 1):
+        print(f"{i:>5} {medida['frames']:>7} {medida['bytes']:>8} {medida['estilo']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Velocidade do sorteio (sorteios/s) em cada camada, fora do app
+    
+    python benchmarks/sorteio.py --rodadas 100000 --sessoes 500
+
+Mede a ordem pré-comprometida, a amostragem do snapshot, o caminho do motor
+(abrir sessão, 3 sorteios gravados por registrar_proximo_sorteio, encerrar)
+sobre cada armazenamento e a amostragem do coordenador de shards. A justiça
+do sorteio é verificada em tests/test_justica_sorteio.py.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Importar o app.py executa a página em modo "bare" e abre o sorteio.db do
+# diretório atual: roda num diretório temporário
+os.chdir(tempfile.mkdtemp(prefix="sorteio-bench-"))
+
+import app  # noqa: E402
+
+POSICOES = 3
+
+
+def cronometrar(camada: str, sorteios) -> dict:
+    inicio = time.perf_counter()
+    total = sorteios()
+    duracao = time.perf_counter() - inicio
+    return {"camada": camada, "sorteios": total, "falhas": 0, "sorteios_s": round(total / duracao) if duracao else 0}
+
+
+def cadastrar(storage, participantes: int):
+    for i in range(participantes):
+        email = f"p{i}@bench"
+        numero = storage.gerar_numero(email)
+        while storage.numero_em_uso(numero):
+            numero = storage.gerar_numero(email)
+        storage.inserir_aluno(f"P{i}", email, numero)
+
+
+def bench_ordem(participantes: int, rodadas: int) -> dict:
+    ids = list(range(1, participantes + 1))
+    numeros = random.sample(range(1000, 10000), participantes)
+    
+    def sorteios():
+        for r in range(rodadas):
+            ordem = app.SeededDrawOrder(f"bench:{r}", ids, numeros)
+            for posicao in range(1, POSICOES + 1):
+                ordem.vencedor(posicao)
+        return rodadas * POSICOES
+    
+    return cronometrar("ordem comprometida", sorteios)
+
+
+def bench_snapshot(participantes: int, rodadas: int) -> dict:
+    numeros = random.sample(range(1000, 10000), participantes)
+    snapshot = app.ParticipantSnapshot.from_rows(
+        [(i, f"P{i}", f"p{i}@bench", numero) for i, numero in enumerate(numeros, start=1)]
+    )
+    
+    def sorteios():
+        for _ in range(rodadas):
+            sorteados = set()
+            for _ in range(POSICOES):
+                sorteados.add(snapshot.sample(sorteados)["numero_sorte"])
+        return rodadas * POSICOES
+    
+    return cronometrar("amostragem do snapshot", sorteios)
+
+
+def bench_motor(tipo: str, participantes: int, sessoes: int, diretorio: str) -> dict:
+    """Sessões completas com a ordem comprometida, como OptimizedSorteioSystem.sortear"""
+    if tipo == "sqlite":
+        storage = app.SQLiteStorage(os.path.join(diretorio, f"{tipo}.db"))
+    elif tipo == "shards":
+        storage = app.ShardedSQLiteStorage(os.path.join(diretorio, f"{tipo}.db"), shards=4)
+    else:
+        storage = app.MemoryStorage()
+    falhas = 0
+    try:
+        cadastrar(storage, participantes)
+        _, rows = storage.listar_alunos()
+        ids, numeros = app.ParticipantSnapshot.from_rows(rows).congelar()
+        participantes_codificados = app.SeededDrawOrder.codificar_participantes(ids, numeros)
+        
+        def sorteios():
+            nonlocal falhas
+            total = 0
+            for s in range(sessoes):
+                seed = f"bench:{s}"
+                storage.abrir_sessao(f"s{s}", {
+                    "seed": seed,
+                    "seed_hash": app.SeededDrawOrder.hash_seed(seed),
+                    "participantes": participantes_codificados,
+                    "participantes_hash": hashlib.sha256(participantes_codificados).hexdigest(),
+                    "total": len(ids),
+                })
+                ordem = app.SeededDrawOrder(seed, ids, numeros)
+                for _ in range(POSICOES):
+                    if storage.registrar_proximo_sorteio(f"s{s}", lambda posicao, _: ordem.vencedor(posicao)) is None:
+                        falhas += 1
+                    else:
+                        total += 1
+                storage.fechar_sessao()
+            return total
+        
+        resultado = cronometrar(f"motor + {tipo}", sorteios)
+        resultado["falhas"] = falhas
+        return resultado
+    finally:
+        storage.close()
+
+
+def bench_coordenador(participantes: int, rodadas: int, diretorio: str) -> dict:
+    storage = app.ShardedSQLiteStorage(os.path.join(diretorio, "coordenador.db"), shards=4)
+    try:
+        cadastrar(storage, participantes)
+        
+        def sorteios():
+            for _ in range(rodadas):
+                sorteados = set()
+                for _ in range(POSICOES):
+                    sorteados.add(storage.amostrar_participante(sorteados)[1])
+            return rodadas * POSICOES
+        
+        return cronometrar("coordenador (4 shards)", sorteios)
+    finally:
+        storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participantes", type=int, default=50)
+    parser.add_argument("--rodadas", type=int, default=100_000, help="rodadas das camadas em memória")
+    parser.add_argument("--sessoes", type=int, default=500, help="sessões do caminho do motor")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as diretorio:
+        resultados = [
+            bench_ordem(args.participantes, args.rodadas),
+            bench_snapshot(args.participantes, args.rodadas),
+            *(bench_motor(tipo, args.participantes, args.sessoes, diretorio) for tipo in ("memoria", "sqlite", "shards")),
+            bench_coordenador(args.participantes, max(1, args.sessoes), diretorio),
+        ]
+    
+    print(f"{'camada':<26}{'sorteios':>10}{'falhas':>8}{'sorteios/s':>12}")
+    for r in resultados:
+        print(f"{r['camada']:<26}{r['sorteios']:>10}{r['falhas']:>8}{r['sorteios_s']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Configuração comum dos testes: importa o app.py e fornece os armazenamentos"""
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# O app.py é um script Streamlit: importá-lo executa a página em modo "bare"
+# e abre o sorteio.db do diretório atual, que não deve ser o do repositório
+os.chdir(tempfile.mkdtemp(prefix="sorteio-testes-"))
+
+import app  # noqa: E402
+
+BACKENDS = ["sqlite", "memoria", "shards"]
+
+
+def criar_storage(tipo: str, diretorio: Path) -> "app.SorteioStorage":
+    if tipo == "sqlite":
+        return app.SQLiteStorage(str(diretorio / "sorteio.db"))
+    if tipo == "shards":
+        return app.ShardedSQLiteStorage(str(diretorio / "sorteio.db"), shards=3)
+    return app.MemoryStorage()
+
+
+@pytest.fixture(params=BACKENDS)
+def storage(request, tmp_path):
+    armazenamento = criar_storage(request.param, tmp_path)
+    yield armazenamento
+    armazenamento.close()
+
+
+@pytest.fixture
+def sistema():
+    """Motor completo sobre o MemoryStorage, sem debounce entre ações"""
+    motor = app.OptimizedSorteioSystem(storage=app.MemoryStorage())
+    motor._debounce_delay = 0
+    yield motor
+    motor.cleanup_resources()
+
+
+def cadastrar(storage: "app.SorteioStorage", nome: str, email: str) -> int:
+    """Insere um participante com número livre, como o motor faz; retorna o id"""
+    while True:
+        numero = storage.gerar_numero(email)
+        if not storage.numero_em_uso(numero):
+            return storage.inserir_aluno(nome, email, numero)[0]
+
+
+def abrir_sessao(storage: "app.SorteioStorage", sessao_id: str, seed: str = "semente") -> "app.SeededDrawOrder":
+    """Congela os participantes atuais e abre a sessão, como OptimizedSorteioSystem.iniciar_sessao"""
+    _, rows = storage.listar_alunos()
+    snapshot = app.ParticipantSnapshot.from_rows(rows)
+    ids, numeros = snapshot.congelar()
+    participantes = app.SeededDrawOrder.codificar_participantes(ids, numeros)
+    storage.abrir_sessao(sessao_id, {
+        "seed": seed,
+        "seed_hash": app.SeededDrawOrder.hash_seed(seed),
+        "participantes": participantes,
+        "participantes_hash": hashlib.sha256(participantes).hexdigest(),
+        "total": len(ids),
+    })
+    return app.SeededDrawOrder(seed, ids, numeros)
@@ -0,0 +1,103 @@
+"""API JSON: rotas, status, ETag, keep-alive e tratamento HTTP"""
+import http.client
+import json
+import socket
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def api(sistema):
+    servidor = app.JsonApiServer(sistema, porta=0)
+    servidor.iniciar()
+    yield servidor
+    servidor.parar()
+
+
+def pedir(conexao: http.client.HTTPConnection, metodo: str, rota: str, corpo=None, **cabecalhos):
+    dados = json.dumps(corpo).encode() if corpo is not None else None
+    conexao.request(metodo, rota, body=dados, headers=cabecalhos)
+    resposta = conexao.getresponse()
+    conteudo = resposta.read()
+    return resposta, json.loads(conteudo) if conteudo else None
+
+
+def test_cadastro_mapeia_status(api):
+    conexao = http.client.HTTPConnection(api.host, api.porta, timeout=5)
+    try:
+        resposta, dados = pedir(conexao, "POST", "/api/cadastro", {"nome": "Ana", "email": "ana@x.com"})
+        assert resposta.status == 201 and 0 <= dados["numero_sorte"] <= 9999
+        socket_inicial = conexao.sock
+        
+        resposta, dados = pedir(conexao, "POST", "/api/cadastro", {"nome": "Ana", "email": "ana@x.com"})
+        assert resposta.status == 409 and dados["erro"] == "Email já cadastrado!"
+        resposta, _ = pedir(conexao, "POST", "/api/cadastro", {"nome": "Ana"})
+        assert resposta.status == 400
+        
+        api.limite_cadastros = app.RateLimiter(capacidade=1, por_minuto=1)
+        assert pedir(conexao, "POST", "/api/cadastro", {"nome": "Bia", "email": "bia@x.com"})[0].status == 201
+        resposta, dados = pedir(conexao, "POST", "/api/cadastro", {"nome": "Caio", "email": "caio@x.com"})
+        assert resposta.status == 429 and int(resposta.getheader("Retry-After")) > 0
+        
+        # Todas as requisições na mesma conexão (keep-alive)
+        assert conexao.sock is socket_inicial
+    finally:
+        conexao.close()
+
+
+def test_vencedores_com_etag_e_invalidacao(api, sistema):
+    conexao = http.client.HTTPConnection(api.host, api.porta, timeout=5)
+    try:
+        for nome in ("Ana", "Bia", "Caio"):
+            assert pedir(conexao, "POST", "/api/cadastro", {"nome": nome, "email": f"{nome}@x.com"})[0].status == 201
+        sistema.iniciar_sessao()
+        
+        resposta, dados = pedir(conexao, "GET", "/api/vencedores")
+        etag = resposta.getheader("ETag")
+        assert resposta.status == 200 and dados["vencedores"] == [] and etag
+        resposta, dados = pedir(conexao, "GET", "/api/vencedores", **{"If-None-Match": etag})
+        assert resposta.status == 304 and dados is None
+        
+        # O sorteio muda a geração: a ETag antiga deixa de valer
+        sucesso, vencedor = sistema.sortear()
+        assert sucesso
+        resposta, dados = pedir(conexao, "GET", "/api/vencedores", **{"If-None-Match": etag})
+        assert resposta.status == 200 and resposta.getheader("ETag") != etag
+        assert [v["numero_sorte"] for v in dados["vencedores"]] == [vencedor["numero_sorte"]]
+        
+        resposta, dados = pedir(conexao, "GET", "/api/sessao")
+        assert resposta.status == 200 and dados["sessao_id"] == vencedor["sessao_id"]
+        assert pedir(conexao, "GET", "/api/nada")[0].status == 404
+    finally:
+        conexao.close()
+
+
+def test_requisicoes_contam_como_atividade(api, sistema):
+    conexao = http.client.HTTPConnection(api.host, api.porta, timeout=5)
+    try:
+        for _ in range(sistema.atividade.limite_calmaria * 3):
+            pedir(conexao, "GET", "/api/sessao")
+    finally:
+        conexao.close()
+    assert not sistema.atividade.em_calmaria()
+
+
+@pytest.mark.parametrize("tamanho", ["-1", "abc"])
+def test_content_length_invalido(api, tamanho):
+    with socket.create_connection((api.host, api.porta), timeout=5) as conexao:
+        conexao.sendall(f"POST /api/cadastro HTTP/1.1\r\nHost: x\r\nContent-Length: {tamanho}\r\n\r\n".encode())
+        resposta = http.client.HTTPResponse(conexao)
+        resposta.begin()
+        assert resposta.status == 400
+        assert resposta.getheader("Connection") == "close"
+
+
+def test_if_none_match():
+    confere = app.JsonApiServer.etag_confere
+    assert confere('"s1"', '"s1"')
+    assert confere('"v0.1", W/"s1"', '"s1"')
+    assert confere('*', '"s1"')
+    assert not confere('"s2", "s10"', '"s1"')
+    assert not confere(None, '"s1"')
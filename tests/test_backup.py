@@ -0,0 +1,33 @@
+"""Backups a quente: conjunto com o banco principal e os shards, e rotação por conjunto"""
+import sqlite3
+from contextlib import closing
+
+import app
+from conftest import cadastrar
+
+
+def test_backup_com_shards_copia_todos_os_bancos(tmp_path):
+    storage = app.ShardedSQLiteStorage(str(tmp_path / "sorteio.db"), shards=3)
+    try:
+        for i in range(12):
+            cadastrar(storage, f"P{i}", f"p{i}@x.com")
+        backup = app.BackupManager(storage.arquivos_banco(), app.MetricsRegistry(),
+                                   diretorio=str(tmp_path / "backups"), manter=1, pausa=0)
+        
+        relatorio = backup.executar()
+        prefixo = relatorio["arquivo"][:-len(".db")]
+        assert relatorio["arquivos"] == 4
+        assert sorted(p.name for p in (tmp_path / "backups").iterdir()) == sorted(
+            [f"{prefixo}.db"] + [f"{prefixo}.shard{i}.db" for i in range(3)])
+        total = 0
+        for i in range(3):
+            with closing(sqlite3.connect(tmp_path / "backups" / f"{prefixo}.shard{i}.db")) as copia:
+                total += copia.execute("SELECT COUNT(*) FROM alunos").fetchone()[0]
+        assert total == 12
+        
+        # A rotação remove o conjunto antigo inteiro, shards incluídos
+        segundo = backup.executar()
+        assert backup.listar() == [segundo["arquivo"]]
+        assert len(list((tmp_path / "backups").iterdir())) == 4
+    finally:
+        storage.close()
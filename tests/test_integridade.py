@@ -0,0 +1,55 @@
+"""Verificação de integridade: incremental, completa e quais sessões ficam fora do telão"""
+import app
+from conftest import abrir_sessao, cadastrar
+
+
+def test_orfao_antigo_so_bloqueia_a_propria_sessao(tmp_path):
+    storage = app.SQLiteStorage(str(tmp_path / "sorteio.db"))
+    try:
+        monitor = app.IntegrityMonitor(storage, app.MetricsRegistry())
+        ana = cadastrar(storage, "Ana", "ana@x.com")
+        bia = cadastrar(storage, "Bia", "bia@x.com")
+        abrir_sessao(storage, "s1")
+        storage.registrar_proximo_sorteio("s1", lambda posicao, sorteados: (ana, storage.get_aluno(ana)["numero_sorte"]))
+        monitor.executar()
+        assert monitor.alertas == [] and not monitor.afeta_sessao("s1")
+        
+        # Participante removido depois do checkpoint: a verificação incremental não vê
+        with storage.writer.get_connection() as conn:
+            conn.execute("DELETE FROM alunos WHERE id = ?", (ana,))
+            conn.commit()
+        monitor.executar()
+        assert monitor.alertas == []
+        
+        # A completa reconfere todos os sorteios
+        resumo = monitor.executar_completa()
+        assert resumo["completo"] and resumo["problemas"] == 1
+        assert "participante" in monitor.alertas[0] and monitor.afeta_sessao("s1")
+        
+        # O alerta continua, mas o sorteio de uma sessão nova vai para o telão
+        storage.fechar_sessao()
+        abrir_sessao(storage, "s2")
+        storage.registrar_proximo_sorteio("s2", lambda posicao, sorteados: (bia, storage.get_aluno(bia)["numero_sorte"]))
+        monitor.executar()
+        assert len(monitor.alertas) == 1
+        assert not monitor.afeta_sessao("s2")
+    finally:
+        storage.close()
+
+
+def test_posicoes_quebradas_afetam_a_sessao(tmp_path):
+    storage = app.SQLiteStorage(str(tmp_path / "sorteio.db"))
+    try:
+        monitor = app.IntegrityMonitor(storage, app.MetricsRegistry())
+        ana = cadastrar(storage, "Ana", "ana@x.com")
+        numero = storage.get_aluno(ana)["numero_sorte"]
+        abrir_sessao(storage, "s1")
+        with storage.writer.get_connection() as conn:
+            conn.execute("INSERT INTO sorteios (sessao_id, aluno_id, numero_sorte, posicao) VALUES ('s1', ?, ?, 2)",
+                         (ana, numero))
+            conn.commit()
+        assert monitor.executar()["problemas"] >= 1
+        assert monitor.afeta_sessao("s1") and not monitor.afeta_sessao("s2")
+        assert monitor.storage.quick_check() == []
+    finally:
+        storage.close()
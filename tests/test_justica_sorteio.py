@@ -0,0 +1,97 @@
+"""Justiça do sorteio: qui-quadrado das contagens por participante em cada posição
+
+Os ids têm lacunas para simular exclusões. As sementes são fixas, então o
+resultado é determinístico; uma implementação nova de sorteio deve passar aqui.
+"""
+import math
+import random
+
+import app
+from conftest import abrir_sessao, cadastrar
+
+LIMIAR_P = 1e-3
+POSICOES = 3
+PARTICIPANTES = 20
+
+
+def qui_quadrado(contagens):
+    esperado = sum(contagens) / len(contagens)
+    return sum((c - esperado) ** 2 for c in contagens) / esperado
+
+
+def p_valor(qui2: float, graus: int) -> float:
+    """P(X >= qui2) pela aproximação de Wilson–Hilferty (boa para graus >= 10)"""
+    z = ((qui2 / graus) ** (1 / 3) - (1 - 2 / (9 * graus))) / math.sqrt(2 / (9 * graus))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def assert_uniforme(contagens):
+    for posicao, por_participante in enumerate(contagens, start=1):
+        p = p_valor(qui_quadrado(por_participante), len(por_participante) - 1)
+        assert p > LIMIAR_P, f"{posicao}º lugar não uniforme (p = {p:.2e}): {por_participante}"
+
+
+def participantes_com_lacunas(rng: random.Random):
+    ids = sorted(rng.sample(range(1, PARTICIPANTES * 4), PARTICIPANTES))
+    numeros = rng.sample(range(1000, 10000), PARTICIPANTES)
+    return ids, numeros
+
+
+def test_ordem_comprometida():
+    ids, numeros = participantes_com_lacunas(random.Random(1))
+    indice = {aluno_id: i for i, aluno_id in enumerate(ids)}
+    contagens = [[0] * PARTICIPANTES for _ in range(POSICOES)]
+    for r in range(20_000):
+        ordem = app.SeededDrawOrder(f"semente-{r}", ids, numeros)
+        for posicao in range(1, POSICOES + 1):
+            contagens[posicao - 1][indice[ordem.vencedor(posicao)[0]]] += 1
+    assert_uniforme(contagens)
+
+
+def test_amostragem_do_snapshot(monkeypatch):
+    ids, numeros = participantes_com_lacunas(random.Random(2))
+    snapshot = app.ParticipantSnapshot.from_rows(
+        [(aluno_id, f"P{aluno_id}", f"p{aluno_id}@x.com", numero) for aluno_id, numero in zip(ids, numeros)]
+    )
+    monkeypatch.setattr(app.random, "randrange", random.Random(3).randrange)
+    indice = {aluno_id: i for i, aluno_id in enumerate(ids)}
+    contagens = [[0] * PARTICIPANTES for _ in range(POSICOES)]
+    for _ in range(20_000):
+        sorteados = set()
+        for posicao in range(POSICOES):
+            vencedor = snapshot.sample(sorteados)
+            sorteados.add(vencedor["numero_sorte"])
+            contagens[posicao][indice[vencedor["id"]]] += 1
+    assert_uniforme(contagens)
+
+
+def test_amostragem_dos_shards(tmp_path):
+    storage = app.ShardedSQLiteStorage(str(tmp_path / "sorteio.db"), shards=3)
+    try:
+        indice = {cadastrar(storage, f"P{i}", f"p{i}@x.com"): i for i in range(PARTICIPANTES)}
+        rng = random.Random(4)
+        contagens = [[0] * PARTICIPANTES for _ in range(POSICOES)]
+        for _ in range(3_000):
+            sorteados = set()
+            for posicao in range(POSICOES):
+                aluno_id, numero = storage.amostrar_participante(sorteados, rng)
+                sorteados.add(numero)
+                contagens[posicao][indice[aluno_id]] += 1
+    finally:
+        storage.close()
+    assert_uniforme(contagens)
+
+
+def test_sorteios_registrados(storage):
+    """O caminho do motor: ordem comprometida gravada por registrar_proximo_sorteio"""
+    indice = {cadastrar(storage, f"P{i}", f"p{i}@x.com"): i for i in range(PARTICIPANTES)}
+    contagens = [[0] * PARTICIPANTES for _ in range(POSICOES)]
+    for r in range(1_500):
+        ordem = abrir_sessao(storage, f"s{r}", seed=f"semente-{r}")
+        escolher = lambda posicao, sorteados: ordem.vencedor(posicao)
+        for posicao in range(POSICOES):
+            resultado = storage.registrar_proximo_sorteio(f"s{r}", escolher, max_sorteios=POSICOES)
+            assert resultado is not None and resultado[0] == posicao + 1
+            contagens[posicao][indice[resultado[1]]] += 1
+        storage.fechar_sessao()
+    assert_uniforme(contagens)
@@ -0,0 +1,32 @@
+"""Limite de memória e expiração dos estados de sessão (ManagedStateStore)"""
+import app
+
+
+def test_limite_descarta_primeiro_as_que_expiram_antes():
+    store = app.ManagedStateStore(max_bytes=5000)
+    for i in range(50):
+        store.set(f"k{i}", "x" * 200, expire_after=100 + i)
+    
+    assert store.total_bytes <= store.max_bytes
+    assert store.get("k49") is not None
+    assert store.get("k0") is None
+
+
+def test_chaves_protegidas_sobrevivem_ao_limite():
+    store = app.ManagedStateStore(max_bytes=5000, protegidas=app.SessionStateManager.CHAVES_PROTEGIDAS)
+    store.set("podium_sessao", "abc123", expire_after=1)
+    for i in range(50):
+        store.set(f"k{i}", "x" * 200, expire_after=100 + i)
+    store.aplicar_limite()
+    
+    assert store.get("podium_sessao") == "abc123"
+    assert store.total_bytes <= store.max_bytes
+
+
+def test_expiracao_remove_so_as_vencidas():
+    store = app.ManagedStateStore()
+    store.set("curta", 1, expire_after=10)
+    store.set("longa", 2, expire_after=1000)
+    
+    assert store.cleanup_expired(now=app.time.time() + 100) == 1
+    assert store.get("curta") is None and store.get("longa") == 2
@@ -0,0 +1,84 @@
+"""NotificationWorker contra um SMTP falso em processo: lote, retentativa e falha permanente"""
+import smtplib
+
+import pytest
+
+import app
+
+
+class SMTPFalso:
+    """smtplib.SMTP de mentira: "temp..." recebe 451, "perm..." recebe 550, "cai..." derruba a conexão"""
+    
+    conexoes = []
+    
+    def __init__(self, host, port, timeout=None):
+        self.enviadas = []
+        self.fechada = False
+        SMTPFalso.conexoes.append(self)
+    
+    def starttls(self):
+        pass
+    
+    def login(self, usuario, senha):
+        pass
+    
+    def send_message(self, mensagem):
+        destinatario = mensagem["To"]
+        if destinatario.startswith("temp"):
+            raise smtplib.SMTPRecipientsRefused({destinatario: (451, b"Tente mais tarde")})
+        if destinatario.startswith("perm"):
+            raise smtplib.SMTPRecipientsRefused({destinatario: (550, b"Caixa inexistente")})
+        if destinatario.startswith("cai"):
+            raise smtplib.SMTPServerDisconnected("Conexão encerrada")
+        self.enviadas.append((destinatario, mensagem["Subject"]))
+    
+    def quit(self):
+        self.fechada = True
+
+
+@pytest.fixture
+def worker(storage, monkeypatch):
+    SMTPFalso.conexoes = []
+    monkeypatch.setattr(app.smtplib, "SMTP", SMTPFalso)
+    return app.NotificationWorker(storage, app.MetricsRegistry(), host="smtp.teste", starttls=False,
+                                  backoff_s=30, max_tentativas=3)
+
+
+def contadores(worker):
+    return worker.metrics.snapshot()["contadores"]
+
+
+def test_lote_por_uma_conexao_com_retentativa_e_falha(worker, storage):
+    for destinatario in ("ana@x.com", "temp@x.com", "perm@x.com", "bia@x.com"):
+        storage.enfileirar_notificacao(destinatario, f"Para {destinatario}", "corpo")
+    agora = app.time.time() + 1
+    
+    assert worker.processar_lote(agora) == 4
+    assert len(SMTPFalso.conexoes) == 1
+    assert SMTPFalso.conexoes[0].enviadas == [("ana@x.com", "Para ana@x.com"), ("bia@x.com", "Para bia@x.com")]
+    assert storage.resumo_notificacoes() == {"enviada": 2, "pendente": 1, "falha": 1}
+    assert {chave: contadores(worker)[chave] for chave in (
+        "notificacoes.conexoes", "notificacoes.enviadas", "notificacoes.retentativas", "notificacoes.falhas")} == {
+        "notificacoes.conexoes": 1, "notificacoes.enviadas": 2, "notificacoes.retentativas": 1, "notificacoes.falhas": 1}
+    assert worker.metrics.snapshot()["tempos"]["notificacoes.envio"]["count"] == 2
+    
+    # 4xx: volta para a fila com backoff de 15 a 30 s (jitter) na primeira tentativa
+    assert storage.reservar_notificacoes(10, agora + 14, prazo_s=60) == []
+    assert worker.processar_lote(agora + 31) == 1
+    assert contadores(worker)["notificacoes.retentativas"] == 2
+    # Segunda retentativa dobra o atraso (30 a 60 s); a terceira tentativa esgota max_tentativas
+    assert worker.processar_lote(agora + 31 + 29) == 0
+    assert worker.processar_lote(agora + 31 + 61) == 1
+    assert storage.resumo_notificacoes() == {"enviada": 2, "falha": 2}
+    # A mesma conexão atendeu todos os lotes
+    assert len(SMTPFalso.conexoes) == 1 and not SMTPFalso.conexoes[0].fechada
+
+
+def test_queda_da_conexao_reabre_no_proximo_envio(worker, storage):
+    storage.enfileirar_notificacao("cai@x.com", "assunto", "corpo")
+    storage.enfileirar_notificacao("ana@x.com", "assunto", "corpo")
+    
+    assert worker.processar_lote(app.time.time() + 1) == 2
+    assert len(SMTPFalso.conexoes) == 2 and SMTPFalso.conexoes[0].fechada
+    assert SMTPFalso.conexoes[1].enviadas == [("ana@x.com", "assunto")]
+    assert storage.resumo_notificacoes() == {"pendente": 1, "enviada": 1}
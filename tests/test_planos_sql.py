@@ -0,0 +1,55 @@
+"""Planos das consultas do registro SQL contra o plano esperado em PLANOS_SQL
+
+Semeia um banco temporário (com ANALYZE) só pelo armazenamento e falha quando
+uma consulta passa a percorrer uma tabela inteira, deixa de usar o índice
+esperado ou cria uma B-tree temporária não prevista.
+"""
+import pytest
+
+import app
+from conftest import abrir_sessao
+
+PARTICIPANTES = 2000
+SESSOES = 20
+
+
+def plano(conn, sql: str):
+    # Parâmetros nulos bastam: o plano não depende dos valores
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, [None] * sql.count("?"))]
+
+
+def problemas(detalhes, esperado):
+    encontrados = []
+    if esperado["usa"] and not any(indice in d for d in detalhes for indice in esperado["usa"]):
+        encontrados.append("não usa " + " / ".join(esperado["usa"]))
+    for d in detalhes:
+        if d.startswith("SCAN ") and not d.startswith("SCAN CONSTANT ROW"):
+            tabela = d.split()[1]
+            if tabela not in esperado["scan"]:
+                encontrados.append(f"percorre {tabela} inteira")
+        elif d.startswith("USE TEMP B-TREE") and not esperado["temp"]:
+            encontrados.append("B-tree temporária")
+    return encontrados
+
+
+@pytest.fixture(scope="module")
+def banco_semeado(tmp_path_factory):
+    storage = app.SQLiteStorage(str(tmp_path_factory.mktemp("planos") / "planos.db"))
+    for i in range(PARTICIPANTES):
+        storage.inserir_aluno(f"P{i}", f"p{i}@planos", 1000 + i)
+    for s in range(SESSOES):
+        ordem = abrir_sessao(storage, f"s{s}", seed=f"planos-{s}")
+        for _ in range(3):
+            storage.registrar_proximo_sorteio(f"s{s}", lambda posicao, sorteados: ordem.vencedor(posicao))
+        storage.fechar_sessao()
+        storage.enfileirar_notificacao("p0@planos", "Planos", "Planos")
+    storage.otimizar()
+    yield storage
+    storage.close()
+
+
+@pytest.mark.parametrize("nome", sorted(app.SQL))
+def test_plano_esperado(banco_semeado, nome):
+    with banco_semeado.readers.get_connection() as conn:
+        detalhes = plano(conn, app.SQL[nome])
+    assert problemas(detalhes, app.PLANOS_SQL[nome]) == [], " · ".join(detalhes)
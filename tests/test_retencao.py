@@ -0,0 +1,96 @@
+"""Arquivo de sessões antigas e exportação do histórico"""
+import app
+from conftest import abrir_sessao, cadastrar
+
+
+def test_sessao_antiga_sem_compromisso_e_arquivada(tmp_path):
+    storage = app.SQLiteStorage(str(tmp_path / "sorteio.db"))
+    try:
+        ana = cadastrar(storage, "Ana", "ana@x.com")
+        numero = storage.get_aluno(ana)["numero_sorte"]
+        # Sessão de antes do compromisso: só existem os sorteios, sem linha em sessoes_sorteio
+        with storage.writer.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO sorteios (sessao_id, aluno_id, numero_sorte, posicao, created_at) "
+                "VALUES ('antiga', ?, ?, 1, '2020-01-01 10:00:00')", (ana, numero)
+            )
+            conn.commit()
+        # Sessão aberta não é arquivada, por mais antigo que seja o corte
+        ordem = abrir_sessao(storage, "aberta")
+        storage.registrar_proximo_sorteio("aberta", lambda posicao, sorteados: ordem.vencedor(posicao))
+        
+        assert storage.arquivar_sessoes("2021-01-01 00:00:00") == 1
+        with storage.readers.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sorteios WHERE sessao_id = 'antiga'").fetchone()[0] == 0
+        assert storage.listar_sorteios("antiga") == [(1, ana, numero)]
+        assert [linha[:5] for linha in storage.exportar_sorteios() if linha[0] == "antiga"] == [
+            ("antiga", 1, "Ana", "ana@x.com", numero)
+        ]
+        assert storage.arquivar_sessoes("2999-01-01 00:00:00") == 0
+        with storage.readers.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sorteios WHERE sessao_id = 'aberta'").fetchone()[0] == 1
+    finally:
+        storage.close()
+
+
+def test_celula_csv_neutraliza_formulas():
+    celula = app.OptimizedSorteioSystem._celula_csv
+    for valor in ("=1+1", "+1", "-1", "@SUM(A1)", "\t=1", "\r=1"):
+        assert celula(valor) == "'" + valor
+    assert celula("Ana") == "Ana"
+    assert celula(1234) == 1234
+
+
+def test_participantes_arquivados_com_shards(tmp_path):
+    storage = app.ShardedSQLiteStorage(str(tmp_path / "sorteio.db"), shards=3)
+    try:
+        ids = [cadastrar(storage, f"P{i}", f"p{i}@x.com") for i in range(9)]
+        ordem = abrir_sessao(storage, "s1")
+        _, vencedor, _ = storage.registrar_proximo_sorteio("s1", lambda posicao, sorteados: ordem.vencedor(posicao))
+        
+        def arquivar_todos() -> int:
+            total, apos_id = 0, 0
+            while apos_id is not None:
+                arquivados, apos_id = storage.arquivar_alunos("2999-01-01 00:00:00", apos_id, lote=2)
+                total += arquivados
+            return total
+        
+        # Sessão aberta: ninguém é arquivado
+        assert arquivar_todos() == 0
+        
+        # Só quem não tem sorteio vivo, percorrendo os três shards em lotes de 2
+        storage.fechar_sessao()
+        assert arquivar_todos() == 8
+        assert [aluno_id for aluno_id in ids if storage.get_aluno(aluno_id)] == [vencedor]
+        arquivados = 0
+        for shard in storage.shards:
+            with shard.readers.get_connection() as conn:
+                arquivados += conn.execute("SELECT COUNT(*) FROM alunos_arquivo").fetchone()[0]
+        assert arquivados == 8
+    finally:
+        storage.close()
+
+
+def test_estatisticas_sobrevivem_ao_arquivo_e_sao_podadas(tmp_path):
+    storage = app.SQLiteStorage(str(tmp_path / "sorteio.db"))
+    try:
+        for i in range(4):
+            cadastrar(storage, f"P{i}", f"p{i}@x.com")
+        ordem = abrir_sessao(storage, "s1")
+        for _ in range(2):
+            storage.registrar_proximo_sorteio("s1", lambda posicao, sorteados: ordem.vencedor(posicao))
+        storage.fechar_sessao()
+        
+        assert storage.arquivar_sessoes("2999-01-01 00:00:00") == 1
+        assert storage.arquivar_alunos("2999-01-01 00:00:00")[0] == 4
+        estatisticas = storage.get_estatisticas()
+        assert estatisticas["sorteios_total"] == 2 and estatisticas["sorteios_por_sessao"] == [("s1", 2)]
+        assert estatisticas["alunos_total"] == 0 and estatisticas["alunos_arquivados"] == 4
+        
+        with storage.writer.get_connection() as conn:
+            conn.execute("INSERT INTO cadastros_por_minuto (minuto, total) VALUES ('2000-01-01 10:00', 3)")
+            conn.commit()
+        assert storage.podar_estatisticas("2001-01-01 00:00") == 1
+        assert len(storage.get_estatisticas()["cadastros_por_minuto"]) == 1
+    finally:
+        storage.close()
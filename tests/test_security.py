@@ -0,0 +1,45 @@
+"""Login do administrador com a fila do bcrypt cheia e limites da consulta pública do número"""
+import pytest
+
+import app
+
+
+@pytest.fixture
+def seguranca():
+    manager = app.SecurityManager(app.MemoryStorage(), alvo_ms=1, max_pendentes=1)
+    yield manager
+    manager._executor.shutdown(wait=True)
+
+
+def test_fila_cheia_nao_propaga_excecao(seguranca):
+    seguranca._vagas.acquire()
+    try:
+        assert seguranca.is_default_password() is False
+        assert seguranca.change_password("admin123", "nova-senha")[0] is False
+        assert seguranca.autenticar("admin123", "cliente")[0] is False
+    finally:
+        seguranca._vagas.release()
+    
+    assert seguranca.is_default_password() is True
+    assert seguranca.change_password("admin123", "nova-senha") == (True, "Senha alterada com sucesso!")
+    assert seguranca.is_default_password() is False
+
+
+def test_consulta_de_numero_nao_revela_nome(sistema):
+    sistema.cadastrar_aluno("Ana Souza", "ana@x.com")
+    permitido, _, resultado = sistema.consultar_numero("ANA@x.com ", "cliente")
+    assert permitido and set(resultado) == {"numero_sorte"}
+
+
+def test_consultas_vazias_esgotam_o_orcamento_do_cliente(sistema):
+    sistema.cadastrar_aluno("Ana", "ana@x.com")
+    sistema.limite_consultas_vazias = app.RateLimiter(capacidade=3, por_minuto=1)
+    for i in range(3):
+        assert sistema.consultar_numero(f"chute{i}@x.com", "curioso") == (True, "", None)
+    
+    # Sem orçamento para consultas vazias, nem um email existente é respondido
+    permitido, msg, resultado = sistema.consultar_numero("ana@x.com", "curioso")
+    assert not permitido and resultado is None and "Tente novamente" in msg
+    # Outro cliente segue consultando, e acertos não gastam o orçamento
+    for _ in range(5):
+        assert sistema.consultar_numero("ana@x.com", "outro")[2] is not None
@@ -0,0 +1,40 @@
+"""Regras próprias do ShardedSQLiteStorage: número de shards fixo e amostragem"""
+import random
+
+import pytest
+
+import app
+from conftest import cadastrar
+
+
+def test_numero_de_shards_fixo(tmp_path):
+    caminho = str(tmp_path / "sorteio.db")
+    app.ShardedSQLiteStorage(caminho, shards=3).close()
+    with pytest.raises(ValueError):
+        app.ShardedSQLiteStorage(caminho, shards=2)
+    with pytest.raises(ValueError):
+        app.SQLiteStorage(caminho)
+
+
+def test_banco_com_participantes_nao_passa_a_usar_shards(tmp_path):
+    caminho = str(tmp_path / "sorteio.db")
+    storage = app.SQLiteStorage(caminho)
+    cadastrar(storage, "Ana", "ana@x.com")
+    storage.close()
+    with pytest.raises(ValueError):
+        app.ShardedSQLiteStorage(caminho, shards=3)
+    # A recusa não grava nada: o banco continua abrindo sem shards
+    app.SQLiteStorage(caminho).close()
+
+
+def test_amostragem_recai_na_lista_filtrada(tmp_path):
+    storage = app.ShardedSQLiteStorage(str(tmp_path / "sorteio.db"), shards=3)
+    try:
+        ids = [cadastrar(storage, f"P{i}", f"p{i}@x.com") for i in range(40)]
+        numeros = {aluno_id: storage.get_aluno(aluno_id)["numero_sorte"] for aluno_id in ids}
+        livre = ids[17]
+        excluidos = {numero for aluno_id, numero in numeros.items() if aluno_id != livre}
+        assert storage.amostrar_participante(excluidos, random.Random(1)) == (livre, numeros[livre])
+        assert storage.amostrar_participante(set(numeros.values()), random.Random(1)) is None
+    finally:
+        storage.close()
@@ -0,0 +1,152 @@
+"""Contrato comum dos armazenamentos: SQLiteStorage, MemoryStorage e ShardedSQLiteStorage"""
+import pytest
+
+import app
+from conftest import abrir_sessao, cadastrar
+
+
+def test_backend_incompleto_falha_ao_instanciar():
+    class Incompleto(app.SorteioStorage):
+        def get_geracoes(self):
+            return {}
+    
+    with pytest.raises(TypeError):
+        Incompleto()
+
+
+def test_cadastro_e_consultas_de_participantes(storage):
+    geracao_inicial = storage.get_geracoes()["alunos"]
+    ana = cadastrar(storage, "Ana", "ana@x.com")
+    bia = cadastrar(storage, "Bia", "bia@x.com")
+    
+    assert storage.get_geracoes()["alunos"] == geracao_inicial + 2
+    assert storage.email_cadastrado("ana@x.com")
+    assert not storage.email_cadastrado("outra@x.com")
+    
+    aluno = storage.get_aluno(ana)
+    assert (aluno["nome"], aluno["email"]) == ("Ana", "ana@x.com")
+    assert storage.numero_em_uso(aluno["numero_sorte"])
+    assert storage.buscar_aluno_por_email("bia@x.com")["id"] == bia
+    assert storage.buscar_aluno_por_email("outra@x.com") is None
+    assert storage.get_aluno(10 ** 9) is None
+
+
+def test_email_duplicado_e_rejeitado(storage):
+    cadastrar(storage, "Ana", "ana@x.com")
+    with pytest.raises(Exception):
+        cadastrar(storage, "Ana de novo", "ana@x.com")
+    assert len(storage.listar_alunos()[1]) == 1
+
+
+def test_listagem_ordenada_por_nome_e_incremental(storage):
+    for nome in ("Carla", "Ana", "Bia"):
+        cadastrar(storage, nome, f"{nome.lower()}@x.com")
+    
+    geracao, rows = storage.listar_alunos()
+    assert geracao == storage.get_geracoes()["alunos"]
+    assert [row[1] for row in rows] == ["Ana", "Bia", "Carla"]
+    
+    geracao, novos, total = storage.alunos_desde([0] * storage.particoes_id)
+    assert sorted(row[1] for row in novos) == ["Ana", "Bia", "Carla"]
+    assert total == 3
+    
+    # Só as linhas novas, com o cursor por partição de um snapshot (nos shards, um por shard)
+    snapshot = app.ParticipantSnapshot.from_rows(rows, geracao, storage.particoes_id)
+    for nome in ("Duda", "Eva", "Fabi", "Gil"):
+        cadastrar(storage, nome, f"{nome.lower()}@x.com")
+    geracao, novos, total = storage.alunos_desde(list(snapshot.max_ids))
+    assert geracao == storage.get_geracoes()["alunos"]
+    assert sorted(row[1] for row in novos) == ["Duda", "Eva", "Fabi", "Gil"]
+    assert [row[0] for row in novos] == sorted(row[0] for row in novos)
+    assert total == len(snapshot) + len(novos) == 7
+    assert storage.get_estatisticas()["alunos_total"] == 7
+
+
+def test_sessao_sorteios_e_revelacao(storage):
+    for i in range(5):
+        cadastrar(storage, f"P{i}", f"p{i}@x.com")
+    ordem = abrir_sessao(storage, "s1")
+    
+    sessao = storage.get_sessao()
+    assert sessao["ativa"] and sessao["sessao_id"] == "s1" and sessao["sorteios_count"] == 0
+    assert not storage.get_compromisso("s1")["revelada"]
+    
+    escolher = lambda posicao, sorteados: ordem.vencedor(posicao)
+    resultados = [storage.registrar_proximo_sorteio("s1", escolher, max_sorteios=3) for _ in range(4)]
+    assert [r[0] for r in resultados[:3]] == [1, 2, 3]
+    assert resultados[3] is None
+    assert storage.get_sessao()["sorteios_count"] == 3
+    
+    numeros = [r[2] for r in resultados[:3]]
+    assert storage.numeros_sorteados("s1") == numeros
+    assert [v["numero_sorte"] for v in storage.listar_vencedores("s1")] == numeros
+    assert [v["nome"] for v in storage.listar_vencedores("s1")] == [storage.get_aluno(r[1])["nome"] for r in resultados[:3]]
+    assert storage.listar_sorteios("s1") == [tuple(r) for r in resultados[:3]]
+    
+    storage.fechar_sessao()
+    assert not storage.get_sessao()["ativa"]
+    assert storage.get_compromisso("s1")["revelada"]
+    assert storage.listar_sessoes_reveladas() == ["s1"]
+    assert storage.registrar_proximo_sorteio("s1", escolher) is None
+    
+    sessoes = storage.listar_sessoes()
+    assert [s["sessao_id"] for s in sessoes] == ["s1"]
+    assert sessoes[0]["participantes"] == 5 and sessoes[0]["ended_at"]
+    
+    exportados = storage.exportar_sorteios()
+    assert sorted((linha[0], linha[1], linha[4]) for linha in exportados) == [("s1", p, n) for p, n in zip((1, 2, 3), numeros)]
+    assert all(linha[2] and linha[3] for linha in exportados)
+
+
+def test_sorteio_sem_participante_disponivel(storage):
+    abrir_sessao(storage, "vazia")
+    assert storage.registrar_proximo_sorteio("vazia", lambda posicao, sorteados: None) is None
+    assert storage.get_sessao()["sorteios_count"] == 0
+
+
+def test_caixa_de_saida_de_notificacoes(storage):
+    storage.enfileirar_notificacao("a@x.com", "assunto", "corpo")
+    storage.enfileirar_notificacao("b@x.com", "assunto", "corpo")
+    agora = app.time.time() + 1
+    
+    reservadas = storage.reservar_notificacoes(10, agora, prazo_s=60)
+    assert [n["destinatario"] for n in reservadas] == ["a@x.com", "b@x.com"]
+    # Reservadas não são entregues a outro worker dentro do prazo
+    assert storage.reservar_notificacoes(10, agora, prazo_s=60) == []
+    assert storage.resumo_notificacoes() == {"enviando": 2}
+    
+    storage.adiar_notificacao(reservadas[0]["id"], agora + 3600, "falha temporária")
+    storage.finalizar_notificacao(reservadas[1]["id"], enviada=True)
+    assert storage.reservar_notificacoes(10, agora, prazo_s=60) == []
+    assert storage.resumo_notificacoes() == {"pendente": 1, "enviada": 1}
+
+
+def test_reserva_vencida_volta_para_a_fila(storage):
+    storage.enfileirar_notificacao("a@x.com", "assunto", "corpo")
+    agora = app.time.time() + 1
+    assert len(storage.reservar_notificacoes(10, agora, prazo_s=60)) == 1
+    assert storage.reservar_notificacoes(10, agora + 30, prazo_s=60) == []
+    assert [n["destinatario"] for n in storage.reservar_notificacoes(10, agora + 61, prazo_s=60)] == ["a@x.com"]
+
+
+def test_aviso_gravado_junto_com_o_sorteio(storage):
+    ana = cadastrar(storage, "Ana", "ana@x.com")
+    abrir_sessao(storage, "s1")
+    aviso = lambda aluno, posicao: (aluno["email"], f"{posicao}º lugar", aluno["nome"])
+    
+    assert storage.registrar_proximo_sorteio("s1", lambda posicao, sorteados: None, aviso=aviso) is None
+    assert storage.resumo_notificacoes() == {}
+    
+    numero = storage.get_aluno(ana)["numero_sorte"]
+    assert storage.registrar_proximo_sorteio("s1", lambda posicao, sorteados: (ana, numero), aviso=aviso) == (1, ana, numero)
+    reservadas = storage.reservar_notificacoes(10, app.time.time() + 1, prazo_s=60)
+    assert [(n["destinatario"], n["assunto"], n["corpo"]) for n in reservadas] == [("ana@x.com", "1º lugar", "Ana")]
+
+
+def test_credenciais(storage):
+    assert storage.get_password_hash() is None
+    storage.init_password_hash("h1")
+    storage.init_password_hash("h2")
+    assert storage.get_password_hash() == "h1"
+    storage.set_password_hash("h3")
+    assert storage.get_password_hash() == "h3"